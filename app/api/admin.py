@@ -6,6 +6,12 @@ from pydantic import BaseModel
 
 from app.core.deps import get_db, get_current_user
 from app.db.models import User, APIKey, Document, UserPlan, Plan, Usage
+from app.api.chat import get_llm_call_counters
+from app.llm.coalesce import get_coalescer
+from app.llm.provider import llm_pool_stats, llm_routing_stats
+from app.rag.embeddings import get_embedding_cache, get_query_batcher
+from app.rag.purge import get_purger, purge_stats, tombstone_api_key
+from app.rag.retrieve import get_answer_cache, get_retrieval_cache, invalidate_caches
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -90,6 +96,28 @@ def get_admin_dashboard(
     )
 
 
+@router.get("/metrics")
+def get_metrics(admin: User = Depends(get_current_user)):
+    """Per-process cache and performance counters"""
+    if not is_admin(admin):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    embedding_cache = get_embedding_cache()
+    retrieval_cache = get_retrieval_cache()
+
+    return {
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "query_batcher": get_query_batcher().stats(),
+        "retrieval_cache": retrieval_cache.stats() if retrieval_cache else None,
+        "answer_cache": get_answer_cache().stats(),
+        "llm_calls": get_llm_call_counters().stats(),
+        "llm_pools": llm_pool_stats(),
+        "llm_routing": llm_routing_stats(),
+        "llm_coalescing": get_coalescer().stats(),
+        "vector_purges": purge_stats()
+    }
+
+
 @router.post("/users/{user_id}/toggle-active")
 def toggle_user_active(
     user_id: int,
@@ -124,8 +152,16 @@ def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Delete cascades through API keys -> documents -> vectors
+    # Delete cascades through API keys -> documents -> vectors (purged in the background)
+    keys = db.query(APIKey).filter(APIKey.user_id == user.id).all()
+    for key in keys:
+        tombstone_api_key(db, key)
+    db.query(UserPlan).filter(UserPlan.user_id == user.id).delete()
+    db.query(Usage).filter(Usage.user_id == user.id).delete()
     db.delete(user)
     db.commit()
+    for key in keys:
+        invalidate_caches(key.id)
+    get_purger().wake()
     
-    return {"message": "User deleted successfully"}
+    return {"message": "User deleted successfully", "api_keys_deleted": len(keys)}
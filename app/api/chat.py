@@ -1,13 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import re
+import threading
+from typing import AsyncIterator, Iterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from app.core.config import get_api_key_record
+from app.core.config import (
+    aget_api_key_record,
+    CHAT_BATCH_CONCURRENCY,
+    CHAT_BATCH_MAX_QUERIES,
+    CHAT_FALLBACK_ANSWER,
+    CONTEXT_CANDIDATES,
+    CONTEXT_TOKEN_BUDGET,
+    RETRIEVAL_MIN_SCORE,
+    SEMANTIC_CACHE_THRESHOLD,
+)
 from app.core.deps import get_db
-from app.core.usage import check_chat_quota, record_chat
-from app.rag.retrieve import retrieve_text
-from app.rag.prompt import build_prompt
+from app.core.usage import check_chat_quota, record_chat, acheck_chat_quota, arecord_chat
+from app.rag.embeddings import aembed_query, aembed_texts, embed_query
+from app.rag.retrieve import aretrieve_chunks, aretrieve_chunks_batch, get_answer_cache, retrieve_chunks
+from app.rag.vector_store import vector_store_for
+from app.rag.prompt import Prompt, aassemble_prompt, assemble_prompt
+from app.llm.coalesce import get_coalescer, prompt_key
 from app.llm.provider import get_llm_provider
 from app.db.models import APIKey
 
@@ -20,12 +37,158 @@ class ChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     answer: str
+    cached: bool = False
+    fallback: bool = False  # no context was relevant enough; the LLM was not called
+
+
+class ChatBatchRequest(BaseModel):
+    queries: list[str]
+
+
+class ChatBatchItem(BaseModel):
+    answer: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None
+    fallback: bool = False
+    prompt_tokens: Optional[int] = None  # None when no prompt was sent
+
+
+class ChatBatchResponse(BaseModel):
+    results: list[ChatBatchItem]
+
+
+class LLMCallCounters:
+    """Per-process count of LLM calls made and avoided, by reason"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.avoided = {"semantic_cache": 0, "no_relevant_context": 0, "coalesced": 0}
+
+    def call(self, shared: bool = False):
+        """An answer generated upstream, or (shared) taken from an identical in-flight generation"""
+        if shared:
+            self.avoid("coalesced")
+            return
+        with self._lock:
+            self.calls += 1
+
+    def avoid(self, reason: str):
+        with self._lock:
+            self.avoided[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            avoided = sum(self.avoided.values())
+            total = self.calls + avoided
+            return {
+                "calls": self.calls,
+                "avoided": avoided,
+                **{f"avoided_{reason}": count for reason, count in self.avoided.items()},
+                "avoided_rate": round(avoided / total, 4) if total else 0.0,
+            }
+
+
+_llm_calls = LLMCallCounters()
+
+
+def get_llm_call_counters() -> LLMCallCounters:
+    return _llm_calls
+
+
+class SemanticLookup:
+    """Semantic answer cache state for one request of an opted-in API key"""
+
+    def __init__(self, api_key: APIKey, query_vector: list[float]):
+        self.api_key_id = api_key.id
+        self.cache = get_answer_cache()
+        # Taken before retrieval so an answer built on replaced documents is not stored
+        self.generation = self.cache.generation(api_key.id)
+        self.query_vector = query_vector
+        self.hit = self.cache.lookup(
+            api_key.id,
+            self.query_vector,
+            api_key.semantic_cache_threshold or SEMANTIC_CACHE_THRESHOLD
+        )
+
+    def store(self, chunk_ids: list[str], answer: str):
+        self.cache.put(self.api_key_id, self.query_vector, chunk_ids, answer, self.generation)
+
+
+def _semantic_lookup(api_key: APIKey, query: str) -> Optional[SemanticLookup]:
+    if not api_key.semantic_cache_enabled:
+        return None
+    return SemanticLookup(api_key, embed_query(query))
+
+
+async def _asemantic_lookup(api_key: APIKey, query: str) -> Optional[SemanticLookup]:
+    if not api_key.semantic_cache_enabled:
+        return None
+    return SemanticLookup(api_key, await aembed_query(query))
+
+
+NO_DOCUMENTS = "No documents found. Please upload documents first."
+
+
+def _require_context(chunks: list) -> list:
+    if not chunks:
+        raise HTTPException(status_code=404, detail=NO_DOCUMENTS)
+    return chunks
+
+
+def _retrieve_context(query: str, api_key: APIKey, semantic: Optional[SemanticLookup]):
+    """Retrieve context chunks from THIS API key's knowledge base"""
+    return _require_context(retrieve_chunks(
+        query=query,
+        api_key_id=api_key.id,
+        limit=CONTEXT_CANDIDATES,
+        query_vector=semantic.query_vector if semantic else None,
+        store=vector_store_for(api_key)
+    ))
+
+
+async def _aretrieve_context(query: str, api_key: APIKey, semantic: Optional[SemanticLookup]):
+    return _require_context(await aretrieve_chunks(
+        query=query,
+        api_key_id=api_key.id,
+        limit=CONTEXT_CANDIDATES,
+        query_vector=semantic.query_vector if semantic else None,
+        store=vector_store_for(api_key)
+    ))
+
+
+def _relevant(candidates: list, api_key: APIKey) -> list:
+    """Candidates at or above THIS API key's minimum similarity"""
+    threshold = api_key.min_retrieval_score if api_key.min_retrieval_score is not None else RETRIEVAL_MIN_SCORE
+    return [chunk for chunk in candidates if chunk.score >= threshold]
+
+
+def _assemble(candidates: list, query: str, api_key: APIKey) -> Prompt:
+    """Diverse context within THIS API key's token budget"""
+    return assemble_prompt(candidates, query, api_key.context_token_budget or CONTEXT_TOKEN_BUDGET)
+
+
+async def _aassemble(candidates: list, query: str, api_key: APIKey) -> Prompt:
+    return await aassemble_prompt(candidates, query, api_key.context_token_budget or CONTEXT_TOKEN_BUDGET)
+
+
+def _replay(answer: str) -> Iterator[str]:
+    """Split a cached answer into word-sized pieces for streaming"""
+    return iter(re.findall(r"\s*\S+\s*", answer) or [answer])
+
+
+async def _areplay(answer: str) -> AsyncIterator[str]:
+    for piece in _replay(answer):
+        yield piece
 
 
 @router.post("", response_model=ChatResponse)
 def chat(
     data: ChatRequest,
-    api_key: APIKey = Depends(get_api_key_record),
+    response: Response,
+    # Detached record: no pooled connection stays checked out through
+    # retrieval and generation (the session connects again to charge usage)
+    api_key: APIKey = Depends(aget_api_key_record),
     db: Session = Depends(get_db)
 ):
     if not data.query.strip():
@@ -33,23 +196,31 @@ def chat(
 
     input_chars = len(data.query)
 
-    # Retrieve context from THIS API key's knowledge base
-    context = retrieve_text(
-        query=data.query,
-        api_key_id=api_key.id
-    )
+    semantic = _semantic_lookup(api_key, data.query)
+    if semantic and semantic.hit:
+        answer = semantic.hit.answer
+        _llm_calls.avoid("semantic_cache")
+    else:
+        context = _relevant(_retrieve_context(data.query, api_key, semantic), api_key)
+        prompt = _assemble(context, data.query, api_key) if context else None
+        # Nothing relevant enough, or none of it still stored (e.g. its document
+        # was just deleted): answer without paying for a generation (not charged)
+        if prompt is None or not prompt.chunks:
+            _llm_calls.avoid("no_relevant_context")
+            return {"answer": CHAT_FALLBACK_ANSWER, "fallback": True}
+
+        response.headers["X-Prompt-Tokens"] = str(prompt.tokens)
 
-    if not context:
-        raise HTTPException(
-            status_code=404,
-            detail="No documents found. Please upload documents first."
+        # Generate answer using THIS API key's configured LLM provider
+        llm = get_llm_provider(api_key.llm_provider)
+        # Identical prompts in flight share one generation (each caller is still charged)
+        answer, shared = get_coalescer().run(
+            prompt_key(api_key.llm_provider, llm, prompt.text), lambda: llm.generate(prompt.text)
         )
+        _llm_calls.call(shared)
 
-    prompt = build_prompt(context, data.query)
-
-    # Generate answer using THIS API key's configured LLM provider
-    llm = get_llm_provider(api_key.llm_provider)
-    answer = llm.generate(prompt)
+        if semantic:
+            semantic.store([chunk.id for chunk in prompt.chunks], answer)
 
     output_chars = len(answer)
 
@@ -69,12 +240,12 @@ def chat(
         output_chars=output_chars
     )
 
-    return {"answer": answer}
+    return {"answer": answer, "cached": bool(semantic and semantic.hit)}
 
 @router.post("/stream")
 async def chat_stream(
     data: ChatRequest,
-    api_key: APIKey = Depends(get_api_key_record),
+    api_key: APIKey = Depends(aget_api_key_record),
     db: Session = Depends(get_db)
 ):
     """Streaming chat endpoint for real-time responses"""
@@ -83,39 +254,155 @@ async def chat_stream(
 
     input_chars = len(data.query)
 
-    # Retrieve context from THIS API key's knowledge base
-    context = retrieve_text(
-        query=data.query,
-        api_key_id=api_key.id
-    )
-
-    if not context:
-        raise HTTPException(
-            status_code=404,
-            detail="No documents found. Please upload documents first."
-        )
-
-    prompt = build_prompt(context, data.query)
-
     # Check quota before streaming
-    check_chat_quota(db, api_key.user_id, input_chars=input_chars, output_chars=512)
+    await acheck_chat_quota(db, api_key.user_id, input_chars=input_chars, output_chars=512)
 
-    # Generate streaming response using THIS API key's LLM provider
-    llm = get_llm_provider(api_key.llm_provider)
+    # Everything below awaits: embedding, search, DB and the provider
+    # stream never block the event loop that serves other streams
+    semantic = await _asemantic_lookup(api_key, data.query)
+    prompt = None
+    fallback = False
+    if semantic and semantic.hit:
+        pieces = _areplay(semantic.hit.answer)
+        _llm_calls.avoid("semantic_cache")
+    else:
+        context = _relevant(await _aretrieve_context(data.query, api_key, semantic), api_key)
+        if context:
+            prompt = await _aassemble(context, data.query, api_key)
+        if prompt is None or not prompt.chunks:
+            # Nothing relevant (and still stored): answer without paying for a generation (not charged)
+            prompt, fallback = None, True
+            pieces = _areplay(CHAT_FALLBACK_ANSWER)
+            _llm_calls.avoid("no_relevant_context")
+        else:
+            # Generate streaming response using THIS API key's LLM provider
+            llm = get_llm_provider(api_key.llm_provider)
+            # Subscribers to an identical in-flight prompt get its tokens fanned out
+            pieces, shared = get_coalescer().stream(
+                prompt_key(api_key.llm_provider, llm, prompt.text), lambda: llm.agenerate_stream(prompt.text)
+            )
+            _llm_calls.call(shared)
 
     async def stream_generator():
         full_response = ""
         try:
-            for chunk in llm.generate_stream(prompt):
+            async for chunk in pieces:
                 full_response += chunk
                 yield f"data: {chunk}\n\n"
-            
+
             # Record actual usage after streaming
-            output_chars = len(full_response)
-            record_chat(db, api_key.user_id, input_chars=input_chars, output_chars=output_chars)
-            
+            if not fallback:
+                output_chars = len(full_response)
+                await arecord_chat(db, api_key.user_id, input_chars=input_chars, output_chars=output_chars)
+
+            if semantic and prompt is not None:
+                semantic.store([chunk.id for chunk in prompt.chunks], full_response)
+
             yield "data: [DONE]\n\n"
         except Exception as e:
             yield f"data: [ERROR] {str(e)}\n\n"
 
-    return StreamingResponse(stream_generator(), media_type="text/event-stream")
\ No newline at end of file
+    headers = {"X-Prompt-Tokens": str(prompt.tokens)} if prompt else None
+    if fallback:
+        headers = {"X-Fallback-Answer": "true"}
+    return StreamingResponse(stream_generator(), media_type="text/event-stream", headers=headers)
+
+
+@router.post("/batch", response_model=ChatBatchResponse)
+async def chat_batch(
+    data: ChatBatchRequest,
+    api_key: APIKey = Depends(aget_api_key_record),
+    db: Session = Depends(get_db)
+):
+    """Answer many questions in one request (evaluation jobs, bulk integrations).
+
+    All queries share one embedding pass and one batched vector search; LLM
+    calls run at most CHAT_BATCH_CONCURRENCY at a time. Quota is checked and
+    charged once for the whole batch. A question that fails gets an error
+    in its result instead of failing the batch.
+    """
+    if not data.queries:
+        raise HTTPException(status_code=400, detail="No queries")
+    if len(data.queries) > CHAT_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {CHAT_BATCH_MAX_QUERIES} queries per batch")
+
+    results = [ChatBatchItem() for _ in data.queries]
+    pending = []
+    for i, query in enumerate(data.queries):
+        if query.strip():
+            pending.append(i)
+        else:
+            results[i].error = "Empty query"
+
+    input_chars = sum(len(data.queries[i]) for i in pending)
+    await acheck_chat_quota(db, api_key.user_id, input_chars=input_chars, output_chars=512 * len(pending))
+
+    vectors = dict(zip(pending, await aembed_texts([data.queries[i] for i in pending]))) if pending else {}
+
+    lookups = {}
+    if api_key.semantic_cache_enabled:
+        for i in pending:
+            lookups[i] = SemanticLookup(api_key, vectors[i])
+            if lookups[i].hit:
+                results[i].answer, results[i].cached = lookups[i].hit.answer, True
+                _llm_calls.avoid("semantic_cache")
+
+    misses = [i for i in pending if results[i].answer is None]
+    contexts = await aretrieve_chunks_batch(
+        [data.queries[i] for i in misses],
+        [vectors[i] for i in misses],
+        api_key_id=api_key.id,
+        limit=CONTEXT_CANDIDATES,
+        store=vector_store_for(api_key)
+    ) if misses else []
+
+    llm = get_llm_provider(api_key.llm_provider)
+    semaphore = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+
+    async def answer(i: int, context: list):
+        if not context:
+            results[i].error = NO_DOCUMENTS
+            return
+        context = _relevant(context, api_key)
+        prompt = await _aassemble(context, data.queries[i], api_key) if context else None
+        if prompt is None or not prompt.chunks:
+            results[i].answer, results[i].fallback = CHAT_FALLBACK_ANSWER, True
+            _llm_calls.avoid("no_relevant_context")
+            return
+        results[i].prompt_tokens = prompt.tokens
+        async with semaphore:
+            try:
+                results[i].answer, shared = await get_coalescer().arun(
+                    prompt_key(api_key.llm_provider, llm, prompt.text), lambda: llm.agenerate(prompt.text)
+                )
+            except Exception:
+                _llm_calls.call()
+                raise
+            _llm_calls.call(shared)
+        if i in lookups:
+            lookups[i].store([chunk.id for chunk in prompt.chunks], results[i].answer)
+
+    async def answer_or_error(i: int, context: list):
+        # Any failure (assembly, provider, cache) stays with its question
+        try:
+            await answer(i, context)
+        except Exception as e:
+            results[i].answer, results[i].fallback = None, False
+            results[i].error = str(e)
+
+    await asyncio.gather(
+        *(answer_or_error(i, context) for i, context in zip(misses, contexts)),
+        return_exceptions=True
+    )
+
+    # Only answered questions are charged (not fallbacks), in a single usage update
+    answered = [i for i in pending if results[i].answer is not None and not results[i].fallback]
+    if answered:
+        await arecord_chat(
+            db,
+            api_key.user_id,
+            input_chars=sum(len(data.queries[i]) for i in answered),
+            output_chars=sum(len(results[i].answer) for i in answered)
+        )
+
+    return {"results": results}
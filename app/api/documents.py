@@ -6,7 +6,9 @@ from datetime import datetime
 
 from app.core.deps import get_db, get_current_user
 from app.db.models import Document, APIKey
-from app.rag.store import delete_document_vectors
+from app.rag.purge import get_purger, tombstone_document
+from app.rag.retrieve import invalidate_caches
+from app.rag.vector_store import tenant_lock
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
@@ -52,7 +54,7 @@ def delete_document(
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a document and all its vectors"""
+    """Delete a document; its vectors are purged in the background"""
     # Get document and verify ownership
     document = db.query(Document).filter(Document.id == document_id).first()
     
@@ -68,15 +70,12 @@ def delete_document(
     if not api_key:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    # Delete vectors from Qdrant
-    try:
-        delete_document_vectors(document.id)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete vectors: {str(e)}")
-
-    # Delete document record
-    db.delete(document)
-    db.commit()
+    # Rows go now (hiding the chunks from retrieval); vectors are queued
+    with tenant_lock(api_key.id):
+        tombstone_document(db, api_key, document)
+        db.commit()
+    invalidate_caches(document.api_key_id)
+    get_purger().wake()
 
     return {
         "status": "success",
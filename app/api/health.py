@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from app.core.config import get_client_id
+from app.core.warmup import readiness
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -7,6 +9,15 @@ router = APIRouter(prefix="/health", tags=["Health"])
 def health_check():
     return {"status": "healthy"}
 
+@router.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 only once warm-up checks have passed"""
+    state = readiness()
+    return JSONResponse(
+        status_code=200 if state["ready"] else 503,
+        content={"status": "ready" if state["ready"] else "starting", "checks": state["checks"]}
+    )
+
 @router.get("/secure")
 def secure_health(client_id: str = Depends(get_client_id)):
     return {"status": "ok", "client": client_id}
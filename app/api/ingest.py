@@ -1,15 +1,18 @@
-import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Optional
+
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from fastapi.security import HTTPBearer
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from app.core.config import get_api_key_record, get_client_id
+from app.core.config import aget_api_key_record, get_api_key_record
 from app.core.deps import get_db
-from app.core.usage import check_ingest_quota, record_ingest
-from app.ingest.pdf import extract_text_from_pdf
-from app.ingest.chunk import chunk_text
-from app.rag.store import store_text
-from app.db.models import APIKey, Document
+from app.ingest.jobs import release_ingest_slot, reserve_ingest_slot, submit_ingest_job
+from app.db.models import APIKey, IngestJob
 
 security = HTTPBearer()
 
@@ -19,74 +22,94 @@ router = APIRouter(
     dependencies=[Depends(security)]
 )
 
-# Hard guardrail (prevents abuse)
-MAX_SINGLE_UPLOAD_CHARS = 500_000  # ~125k tokens
+
+class IngestJobResponse(BaseModel):
+    id: int
+    filename: str
+    status: str
+    stage: str
+    progress: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_duplicate: int
+    chunks_near_duplicate: int
+    document_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
 
 
-@router.post("")
+@router.post("", status_code=202)
 def ingest_pdf(
     file: UploadFile = File(...),
-    api_key: APIKey = Depends(get_api_key_record),
+    # Detached record: a burst of uploads can't check out every pooled
+    # connection in the auth dependency and then wait for a worker thread
+    api_key: APIKey = Depends(aget_api_key_record),
     db: Session = Depends(get_db)
 ):
+    """Accept a PDF and queue it for background ingestion"""
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files supported")
 
-    text = extract_text_from_pdf(file.file)
+    # A full queue answers 503 before anything is written to disk
+    reserve_ingest_slot()
+    path = None
+    try:
+        # Spool the upload to disk; the request's file handle closes with the request
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="ingest_")
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(file.file, out)
+
+        job = IngestJob(api_key_id=api_key.id, filename=file.filename)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        submit_ingest_job(job.id, path)
+    except Exception:
+        release_ingest_slot()
+        if path:
+            os.remove(path)
+        raise
 
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Empty PDF")
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        "filename": file.filename
+    }
 
-    char_count = len(text)
-    file_hash = hashlib.md5(text.encode()).hexdigest()
 
-    # Check for duplicate
-    existing = db.query(Document).filter(
-        Document.api_key_id == api_key.id,
-        Document.file_hash == file_hash
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Document already uploaded")
-
-    # Single-file guardrail
-    if char_count > MAX_SINGLE_UPLOAD_CHARS:
-        raise HTTPException(
-            status_code=402,
-            detail="File too large for your current plan"
-        )
-
-    # Enforce quota BEFORE chunking / embedding
-    check_ingest_quota(db, api_key.user_id, char_count)
-
-    chunks = chunk_text(text)
-
-    # Create document record
-    document = Document(
-        api_key_id=api_key.id,
-        filename=file.filename,
-        file_hash=file_hash,
-        char_count=char_count,
-        chunk_count=len(chunks)
+@router.get("/jobs", response_model=List[IngestJobResponse])
+def list_ingest_jobs(
+    api_key: APIKey = Depends(get_api_key_record),
+    db: Session = Depends(get_db)
+):
+    """List recent ingestion jobs for this API key"""
+    return (
+        db.query(IngestJob)
+        .filter(IngestJob.api_key_id == api_key.id)
+        .order_by(IngestJob.created_at.desc())
+        .limit(50)
+        .all()
     )
-    db.add(document)
-    db.commit()
-    db.refresh(document)
 
-    # Store chunks with document_id
-    for chunk in chunks:
-        store_text(
-            text=chunk,
-            api_key_id=api_key.id,
-            document_id=document.id
-        )
 
-    # Record usage AFTER success
-    record_ingest(db, api_key.user_id, char_count)
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+def get_ingest_job(
+    job_id: int,
+    api_key: APIKey = Depends(get_api_key_record),
+    db: Session = Depends(get_db)
+):
+    """Stage, progress and chunk counts for one ingestion job"""
+    job = db.query(IngestJob).filter(
+        IngestJob.id == job_id,
+        IngestJob.api_key_id == api_key.id
+    ).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    return {
-        "status": "success",
-        "document_id": document.id,
-        "filename": file.filename,
-        "chars_added": char_count,
-        "chunks_added": len(chunks)
-    }
+    return job
@@ -1,17 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+from typing import Optional
 
 from app.core.deps import get_current_user, get_db
 from app.db.models import APIKey, Document
 from app.core.apikey import generate_api_key
-from app.rag.store import delete_api_key_vectors
+from app.rag.purge import get_purger, tombstone_api_key
+from app.rag.retrieve import invalidate_caches
 
 router = APIRouter(prefix="/keys", tags=["API Keys"])
 
 
 class CreateKeyRequest(BaseModel):
     llm_provider: str = "groq"
+    semantic_cache: bool = False
+
+
+class SemanticCacheRequest(BaseModel):
+    enabled: bool
+    threshold: Optional[float] = None  # cosine similarity; None = server default
+
+
+class ContextBudgetRequest(BaseModel):
+    tokens: Optional[int] = None  # prompt context size; None = server default
+
+
+class MinScoreRequest(BaseModel):
+    score: Optional[float] = None  # cosine similarity; None = server default
 
 
 @router.post("")
@@ -28,7 +44,8 @@ def create_key(
     record = APIKey(
         key_hash=key_hash,
         user_id=user.id,
-        llm_provider=data.llm_provider
+        llm_provider=data.llm_provider,
+        semantic_cache_enabled=data.semantic_cache
     )
     db.add(record)
     db.commit()
@@ -38,6 +55,7 @@ def create_key(
         "id": record.id,
         "api_key": raw_key,
         "llm_provider": data.llm_provider,
+        "semantic_cache": record.semantic_cache_enabled,
         "message": "Save this key now. You won’t see it again."
     }
 
@@ -57,6 +75,10 @@ def list_keys(
             "id": k.id,
             "is_active": k.is_active,
             "llm_provider": k.llm_provider,
+            "semantic_cache": k.semantic_cache_enabled,
+            "semantic_cache_threshold": k.semantic_cache_threshold,
+            "context_token_budget": k.context_token_budget,
+            "min_retrieval_score": k.min_retrieval_score,
             "document_count": db.query(Document).filter(Document.api_key_id == k.id).count()
         }
         for k in keys
@@ -86,13 +108,92 @@ def toggle_key(
         "is_active": key.is_active
     }
 
+@router.put("/{key_id}/semantic-cache")
+def set_semantic_cache(
+    key_id: int,
+    data: SemanticCacheRequest,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """Opt an API key in or out of the semantic answer cache"""
+    key = (
+        db.query(APIKey)
+        .filter(APIKey.id == key_id, APIKey.user_id == user.id)
+        .first()
+    )
+
+    if not key:
+        raise HTTPException(status_code=404, detail="Key not found")
+
+    if data.threshold is not None and not 0 < data.threshold <= 1:
+        raise HTTPException(status_code=400, detail="Threshold must be in (0, 1]")
+
+    key.semantic_cache_enabled = data.enabled
+    key.semantic_cache_threshold = data.threshold
+    db.commit()
+
+    return {
+        "semantic_cache": key.semantic_cache_enabled,
+        "semantic_cache_threshold": key.semantic_cache_threshold
+    }
+
+@router.put("/{key_id}/context-budget")
+def set_context_budget(
+    key_id: int,
+    data: ContextBudgetRequest,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """Set how many tokens of retrieved context an API key's prompts may use"""
+    key = (
+        db.query(APIKey)
+        .filter(APIKey.id == key_id, APIKey.user_id == user.id)
+        .first()
+    )
+
+    if not key:
+        raise HTTPException(status_code=404, detail="Key not found")
+
+    if data.tokens is not None and data.tokens < 64:
+        raise HTTPException(status_code=400, detail="Context budget must be at least 64 tokens")
+
+    key.context_token_budget = data.tokens
+    db.commit()
+
+    return {"context_token_budget": key.context_token_budget}
+
+@router.put("/{key_id}/min-score")
+def set_min_score(
+    key_id: int,
+    data: MinScoreRequest,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """Set the similarity a chunk needs to be sent to the LLM as context"""
+    key = (
+        db.query(APIKey)
+        .filter(APIKey.id == key_id, APIKey.user_id == user.id)
+        .first()
+    )
+
+    if not key:
+        raise HTTPException(status_code=404, detail="Key not found")
+
+    if data.score is not None and not -1 <= data.score < 1:
+        raise HTTPException(status_code=400, detail="Minimum score must be in [-1, 1)")
+
+    key.min_retrieval_score = data.score
+    db.commit()
+
+    return {"min_retrieval_score": key.min_retrieval_score}
+
 @router.delete("/{key_id}")
 def delete_key(
     key_id: int,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
-    """Permanently delete an API key and all its documents/vectors"""
+    """Permanently delete an API key and all its documents/vectors (purged in the background)"""
     key = (
         db.query(APIKey)
         .filter(APIKey.id == key_id, APIKey.user_id == user.id)
@@ -105,18 +206,11 @@ def delete_key(
     # Count documents before deletion
     doc_count = db.query(Document).filter(Document.api_key_id == key_id).count()
 
-    # Delete all vectors for this API key
-    try:
-        delete_api_key_vectors(key_id)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete vectors: {str(e)}")
-
-    # Delete all documents (cascade)
-    db.query(Document).filter(Document.api_key_id == key_id).delete()
-
-    # Delete the API key
-    db.delete(key)
+    # Delete the key and its documents (cascade); vectors are queued
+    tombstone_api_key(db, key)
     db.commit()
+    invalidate_caches(key_id)
+    get_purger().wake()
 
     return {
         "status": "deleted",
@@ -4,7 +4,9 @@ from dotenv import load_dotenv
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app.core.deps import get_db
 from app.db.base import SessionLocal
 from app.db.models import APIKey
 from app.core.security import hash_api_key
@@ -15,20 +17,174 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 
 # -----------------------
-# DB dependency
+# Embedding & ingestion tuning
 # -----------------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Embedding runtime: torch, torch-int8, onnx, onnx-int8
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Quantized graph to load for onnx-int8 (from the model repo's onnx/ folder)
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx")
+# Chunks per SentenceTransformer.encode forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Points per qdrant.upsert request
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+# Embedding cache: in-memory LRU entries (0 disables) and optional SQLite file
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")
+# Micro-batching of concurrent chat query embeddings
+EMBED_QUERY_BATCHING = os.getenv("EMBED_QUERY_BATCHING", "true").lower() == "true"
+EMBED_QUERY_MAX_BATCH = int(os.getenv("EMBED_QUERY_MAX_BATCH", "32"))
+EMBED_QUERY_MAX_WAIT_MS = float(os.getenv("EMBED_QUERY_MAX_WAIT_MS", "5"))
+# Threads that run query embeddings for async endpoints when batching is off
+EMBED_EXECUTOR_WORKERS = int(os.getenv("EMBED_EXECUTOR_WORKERS", "2"))
+# Chunker: "tokens" (sentence-aligned, sized to the model window) or "words"
+CHUNKER = os.getenv("CHUNKER", "tokens").lower()
+# Max tokens per chunk (0 = model max_seq_length minus special tokens)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Skip chunks that repeat (exactly or nearly) earlier chunks in the same
+# document or the API key's knowledge base
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+# Estimated Jaccard similarity of word shingles at or above which a chunk is a near duplicate
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0.9"))
+# Background ingestion workers and max queued + running jobs per process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+# At startup, queued/running jobs not updated for this long are failed as
+# lost (0 = all of them; raise it above the longest queue wait when several
+# worker processes share the database)
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "0"))
+# Multi-process PDF text extraction (1 = always serial)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# -----------------------
+# Retrieval
+# -----------------------
+# Where tenants' vectors live: "qdrant", "local" (in-process engine over
+# memory-mapped matrices) or "auto" (local until a tenant outgrows
+# LOCAL_VECTOR_MAX_CHUNKS, then Qdrant)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "./vector_data")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")  # or float16
+LOCAL_VECTOR_MAX_CHUNKS = int(os.getenv("LOCAL_VECTOR_MAX_CHUNKS", "5000"))
+# Qdrant collection profile (app.db.qdrant_collection.PROFILES): default,
+# recall, int8 or binary. Apply with: python -m scripts.apply_collection_profile
+QDRANT_COLLECTION_PROFILE = os.getenv("QDRANT_COLLECTION_PROFILE", "default").lower()
+# Per-tenant retrieval result cache: max entries (0 disables) and TTL. Ingest
+# and deletes invalidate a key's entries in this process; the TTL bounds
+# staleness across worker processes.
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "300"))
+# Semantic answer cache (opt-in per API key): default cosine similarity
+# threshold, answers kept per key and their TTL
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_PER_KEY = int(os.getenv("SEMANTIC_CACHE_MAX_PER_KEY", "512"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+# Deleted documents / keys / users: vectors are purged in the background.
+# Purges due per pass, seconds between passes, and retry backoff (doubling
+# from the base delay up to the max) while the backend is failing
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "100"))
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "30"))
+PURGE_RETRY_BASE_SECONDS = float(os.getenv("PURGE_RETRY_BASE_SECONDS", "5"))
+PURGE_RETRY_MAX_SECONDS = float(os.getenv("PURGE_RETRY_MAX_SECONDS", "900"))
+
+# -----------------------
+# Chat
+# -----------------------
+# Prompt context: candidates fetched per question, chunks kept at most, and the
+# default context size in tokens (chars / 4; overridable per API key)
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "3"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Maximal marginal relevance: 1.0 ranks by relevance only, lower values favour
+# chunks unlike those already picked; candidates at least this similar to a
+# picked chunk are dropped as repeats
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.95"))
+# Minimum cosine similarity a chunk needs to be used as context (overridable
+# per API key; ~0.3 suits all-MiniLM-L6-v2). When no candidate clears it, the
+# fallback answer is returned without calling the LLM.
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.0"))
+CHAT_FALLBACK_ANSWER = os.getenv(
+    "CHAT_FALLBACK_ANSWER", "I couldn't find anything about that in the provided documents."
+)
+# POST /chat/batch: max questions per request and concurrent LLM calls per batch
+CHAT_BATCH_MAX_QUERIES = int(os.getenv("CHAT_BATCH_MAX_QUERIES", "256"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+# -----------------------
+# LLM provider clients
+# -----------------------
+# Providers are created once per process (per provider, model and base URL)
+# over a pooled HTTP client: connections are kept alive between chats and
+# multiplexed over HTTP/2 when the h2 package is installed
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+# Between bytes of a response (a slow first token counts against it)
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# -----------------------
+# LLM provider routing
+# -----------------------
+# Optional: route each key's provider through a policy that hedges a slow
+# first token to the next provider in LLM_FALLBACK_PROVIDERS, fails over
+# on errors and skips a provider whose circuit breaker is open
+LLM_ROUTING = os.getenv("LLM_ROUTING", "false").lower() == "true"
+LLM_FALLBACK_PROVIDERS = [
+    name.strip().lower() for name in os.getenv("LLM_FALLBACK_PROVIDERS", "groq,openai").split(",") if name.strip()
+]
+# Rolling window (requests) of time-to-first-token and error rate per provider
+LLM_ROUTING_WINDOW = int(os.getenv("LLM_ROUTING_WINDOW", "200"))
+# Hedge once the primary's first token is later than this percentile of its
+# recent TTFTs (never sooner than LLM_HEDGE_MIN_SECONDS); with fewer than
+# LLM_HEDGE_MIN_SAMPLES samples, after LLM_HEDGE_INITIAL_SECONDS
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.25"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_INITIAL_SECONDS = float(os.getenv("LLM_HEDGE_INITIAL_SECONDS", "2"))
+# Consecutive failures that open a provider's breaker, and how long it stays
+# open before one trial request (at a time) is let through
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+# Concurrent identical prompts (same provider, model and prompt) share one
+# upstream generation, streamed tokens fanned out; each caller is still charged
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+
+# -----------------------
+# Fake LLM provider (load tests)
+# -----------------------
+# llm_provider "fake" answers locally with deterministic text: first token
+# after FAKE_LLM_TTFT_MS, then FAKE_LLM_TOKENS_PER_SECOND, FAKE_LLM_OUTPUT_TOKENS
+# tokens long; FAKE_LLM_ERROR_RATE of calls fail before their first token
+# (a seeded sequence, so runs are repeatable)
+FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "200"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "64"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+# -----------------------
+# Startup warm-up
+# -----------------------
+WARMUP_EMBEDDINGS = os.getenv("WARMUP_EMBEDDINGS", "true").lower() == "true"
+WARMUP_QDRANT = os.getenv("WARMUP_QDRANT", "false").lower() == "true"
+WARMUP_LLM = os.getenv("WARMUP_LLM", "false").lower() == "true"
+# Seconds between retries of failed warm-up checks
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
 
 # -----------------------
 # API Key Security
 # -----------------------
 security = HTTPBearer(auto_error=True)
 
+# get_db is the endpoints' own dependency, so a request authenticates and
+# queries through one session instead of holding two pooled connections
+
 def get_api_key_record(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
@@ -50,6 +206,26 @@ def get_api_key_record(
 
     return record
 
+def _load_api_key_record(api_key: str) -> APIKey:
+    db = SessionLocal()
+    try:
+        record = get_api_key_record(HTTPAuthorizationCredentials(scheme="Bearer", credentials=api_key), db)
+        db.expunge(record)
+        return record
+    finally:
+        db.close()
+
+async def aget_api_key_record(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> APIKey:
+    """get_api_key_record for async endpoints.
+
+    The lookup runs in the threadpool on its own short-lived session, so no
+    pooled connection stays checked out while the request awaits. The record
+    comes back detached: read it, don't modify it.
+    """
+    return await run_in_threadpool(_load_api_key_record, credentials.credentials)
+
 # Backward compatibility - returns user_id (client_id)
 def get_client_id(
     api_key: APIKey = Depends(get_api_key_record),
@@ -1,5 +1,6 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.db.models import Plan, UserPlan, Usage
 
@@ -53,7 +54,22 @@ def check_chat_quota(db: Session, user_id: int, input_chars: int, output_chars:
         )
 
 def record_chat(db: Session, user_id: int, input_chars: int, output_chars: int):
-    usage = db.query(Usage).filter(Usage.user_id == user_id).first()
     tokens = approx_tokens_from_chars(input_chars + output_chars)
-    usage.chat_tokens += tokens
+    # Increment in SQL: streams sharing one generation finish (and charge) together
+    db.query(Usage).filter(Usage.user_id == user_id).update({Usage.chat_tokens: Usage.chat_tokens + tokens})
     db.commit()
+
+# Async variants for streaming endpoints: the sync driver runs in the threadpool.
+# Each call ends its transaction inside the same thread hop, so the session
+# never holds a pooled connection while the request awaits something else.
+async def acheck_chat_quota(db: Session, user_id: int, input_chars: int, output_chars: int):
+    def check():
+        try:
+            check_chat_quota(db, user_id, input_chars, output_chars)
+        finally:
+            db.rollback()
+
+    await run_in_threadpool(check)
+
+async def arecord_chat(db: Session, user_id: int, input_chars: int, output_chars: int):
+    await run_in_threadpool(record_chat, db, user_id, input_chars, output_chars)
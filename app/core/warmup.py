@@ -0,0 +1,95 @@
+"""
+Startup warm-up and readiness.
+
+The lifespan hook in app.main runs warm_up() before the worker starts
+serving, so the first /chat or /ingest after a deploy doesn't pay model
+load and first-inference cost. /health/ready reports whether every enabled
+check has passed; failed checks are retried in the background.
+"""
+import logging
+import threading
+import time
+from typing import Callable
+
+from app.core.config import WARMUP_EMBEDDINGS, WARMUP_QDRANT, WARMUP_LLM, WARMUP_RETRY_SECONDS
+from app.db.qdrant import qdrant
+from app.llm.provider import get_llm_provider
+from app.rag.embeddings import get_model, embed_query
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_embeddings():
+    get_model().encode(["warm up", "first inference"])
+    # Starts the query micro-batching thread
+    embed_query("warm up")
+
+
+def _warm_qdrant():
+    qdrant.get_collections()
+
+
+def _warm_llm():
+    get_llm_provider()
+
+
+def enabled_checks() -> dict[str, Callable[[], None]]:
+    checks = {
+        "embeddings": (WARMUP_EMBEDDINGS, _warm_embeddings),
+        "qdrant": (WARMUP_QDRANT, _warm_qdrant),
+        "llm": (WARMUP_LLM, _warm_llm),
+    }
+    return {name: fn for name, (enabled, fn) in checks.items() if enabled}
+
+
+_status: dict[str, str] = {}
+_warmed = False
+_lock = threading.Lock()
+
+
+def _run(checks: dict[str, Callable[[], None]]) -> dict[str, Callable[[], None]]:
+    """Run checks, returning the ones that failed"""
+    failed = {}
+    for name, fn in checks.items():
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("Warm-up check %s failed: %s", name, e)
+            failed[name] = fn
+            status = f"error: {e}"
+        else:
+            logger.info("Warm-up check %s ok in %.2fs", name, time.perf_counter() - start)
+            status = "ok"
+        with _lock:
+            _status[name] = status
+    return failed
+
+
+def _retry(failed: dict[str, Callable[[], None]]):
+    while failed:
+        time.sleep(WARMUP_RETRY_SECONDS)
+        failed = _run(failed)
+
+
+def warm_up():
+    """Run all enabled checks; keep retrying failures in the background"""
+    global _warmed
+    checks = enabled_checks()
+    with _lock:
+        _status.update({name: "pending" for name in checks})
+
+    failed = _run(checks)
+    _warmed = True
+
+    if failed:
+        threading.Thread(target=_retry, args=(failed,), name="warmup-retry", daemon=True).start()
+
+
+def readiness() -> dict:
+    with _lock:
+        checks = dict(_status)
+    return {
+        "ready": _warmed and all(status == "ok" for status in checks.values()),
+        "checks": checks,
+    }
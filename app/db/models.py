@@ -1,20 +1,29 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, LargeBinary, Float, JSON
 from datetime import datetime
 from app.db.base import Base
 
 
 class APIKey(Base):
     __tablename__ = "api_keys"
+    # Ids are never reused: pending vector purges refer to deleted keys by id
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     key_hash = Column(String, unique=True, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_active = Column(Boolean, default=True)
     llm_provider = Column(String, default="groq", nullable=False)  # groq or openai
+    semantic_cache_enabled = Column(Boolean, default=False, nullable=False)
+    semantic_cache_threshold = Column(Float, nullable=True)  # None = SEMANTIC_CACHE_THRESHOLD
+    vector_backend = Column(String, nullable=True)  # qdrant or local; None until first ingest
+    context_token_budget = Column(Integer, nullable=True)  # None = CONTEXT_TOKEN_BUDGET
+    min_retrieval_score = Column(Float, nullable=True)  # None = RETRIEVAL_MIN_SCORE
 
 
 class Document(Base):
     __tablename__ = "documents"
+    # Ids are never reused: pending vector purges refer to deleted documents by id
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     api_key_id = Column(Integer, ForeignKey("api_keys.id"), nullable=False)
@@ -25,6 +34,61 @@ class Document(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    api_key_id = Column(Integer, ForeignKey("api_keys.id"), nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    status = Column(String, default="queued", nullable=False)  # queued, running, completed, failed
+    stage = Column(String, default="queued", nullable=False)   # queued, extracting, embedding, done
+    progress = Column(Integer, default=0, nullable=False)      # percent complete
+    chunks_total = Column(Integer, default=0, nullable=False)
+    chunks_embedded = Column(Integer, default=0, nullable=False)
+    chunks_duplicate = Column(Integer, default=0, nullable=False)       # exact repeats skipped
+    chunks_near_duplicate = Column(Integer, default=0, nullable=False)  # MinHash near repeats skipped
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ChunkFingerprint(Base):
+    __tablename__ = "chunk_fingerprints"
+
+    id = Column(Integer, primary_key=True)
+    api_key_id = Column(Integer, ForeignKey("api_keys.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    content_hash = Column(String, nullable=False)  # sha256 of normalized text
+    minhash = Column(LargeBinary, nullable=False)  # MinHash signature for near-duplicate checks
+    # Point id of the stored chunk: this document's own, or the chunk of another
+    # document it duplicates (a reference that keeps that chunk alive)
+    chunk_id = Column(String, nullable=True, index=True)
+
+
+class ChunkText(Base):
+    __tablename__ = "chunk_texts"
+
+    id = Column(String, primary_key=True)  # vector point id
+    api_key_id = Column(Integer, ForeignKey("api_keys.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    text = Column(LargeBinary, nullable=False)  # zlib-compressed UTF-8
+
+
+class VectorPurge(Base):
+    __tablename__ = "vector_purges"
+
+    id = Column(Integer, primary_key=True)
+    api_key_id = Column(Integer, nullable=False, index=True)  # no FK: the key may be deleted
+    document_id = Column(Integer, nullable=True)  # None = every vector of the key
+    backend = Column(String, nullable=False)  # where the vectors were when deleted
+    handover = Column(JSON, nullable=True)  # {point id: document id}: chunks other documents still use
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -1,7 +1,23 @@
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import VectorParams, Distance
 from app.core.config import QDRANT_URL, QDRANT_API_KEY
+from app.db.qdrant_collection import COLLECTION_NAME, VECTOR_SIZE
 
-qdrant = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
-)
+# QDRANT_URL=":memory:" runs an embedded, non-persistent Qdrant (tests, benchmarks).
+# It has no async client: an in-memory AsyncQdrantClient would be a separate store.
+if QDRANT_URL == ":memory:":
+    qdrant = QdrantClient(":memory:")
+    async_qdrant = None
+    qdrant.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE)
+    )
+else:
+    qdrant = QdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+    )
+    async_qdrant = AsyncQdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+    )
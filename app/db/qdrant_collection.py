@@ -0,0 +1,223 @@
+"""
+Named Qdrant collection profiles and an idempotent apply step.
+
+A profile fixes how the shared collection stores and indexes vectors:
+
+- HNSW graph: m / ef_construct, and optionally one graph per tenant
+  (m=0, payload_m) since every search filters on api_key_id
+- quantization: none, scalar int8 or binary, kept in RAM, with the original
+  vectors rescoring an oversampled candidate set at search time
+- on-disk original vectors and payloads (memory-mapped)
+- lookup-only integer indexes on api_key_id and document_id
+
+apply_profile() compares the live collection with a profile and only sends
+what differs, so it is safe to run on every deploy.
+"""
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CollectionParamsDiff,
+    Disabled,
+    Distance,
+    HnswConfigDiff,
+    IntegerIndexParams,
+    IntegerIndexType,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
+
+from app.core.config import QDRANT_COLLECTION_PROFILE
+
+COLLECTION_NAME = "chatbot_docs"
+VECTOR_SIZE = 384
+
+# Tenant and document filters are equality matches only: no range index needed
+PAYLOAD_INDEXES = {
+    "api_key_id": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=False),
+    "document_id": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=False),
+}
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    # Search-time beam width (None = server default)
+    hnsw_ef: Optional[int] = None
+    # One HNSW graph per api_key_id instead of a global one
+    tenant_graphs: bool = False
+    # None, "int8" or "binary"
+    quantization: Optional[str] = None
+    # Candidates fetched from the quantized index per result, rescored on originals
+    oversampling: float = 1.0
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+
+
+PROFILES = {
+    # What scripts/create_collection.py has always created
+    "default": CollectionProfile("default"),
+    # Higher recall for large tenants, at more RAM and slower indexing
+    "recall": CollectionProfile("recall", hnsw_m=32, hnsw_ef_construct=256, hnsw_ef=128),
+    # int8 vectors in RAM (4x smaller), originals and payloads on disk
+    "int8": CollectionProfile(
+        "int8", tenant_graphs=True, quantization="int8", oversampling=2.0,
+        on_disk_vectors=True, on_disk_payload=True
+    ),
+    # 1 bit per dimension in RAM (32x smaller); needs heavier rescoring
+    "binary": CollectionProfile(
+        "binary", tenant_graphs=True, quantization="binary", oversampling=4.0,
+        on_disk_vectors=True, on_disk_payload=True
+    ),
+}
+
+
+def get_profile(name: Optional[str] = None) -> CollectionProfile:
+    """A named profile (default: QDRANT_COLLECTION_PROFILE)"""
+    name = name or QDRANT_COLLECTION_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown collection profile: {name}. Choose from: {list(PROFILES.keys())}")
+    return PROFILES[name]
+
+
+def search_params(profile: CollectionProfile) -> Optional[SearchParams]:
+    """Per-query parameters a profile needs (rescoring, beam width)"""
+    if profile.quantization is None and profile.hnsw_ef is None:
+        return None
+    quantization = None
+    if profile.quantization is not None:
+        quantization = QuantizationSearchParams(rescore=True, oversampling=profile.oversampling)
+    return SearchParams(hnsw_ef=profile.hnsw_ef, quantization=quantization)
+
+
+def _hnsw(profile: CollectionProfile) -> HnswConfigDiff:
+    if profile.tenant_graphs:
+        return HnswConfigDiff(m=0, payload_m=profile.hnsw_m, ef_construct=profile.hnsw_ef_construct)
+    return HnswConfigDiff(m=profile.hnsw_m, payload_m=0, ef_construct=profile.hnsw_ef_construct)
+
+
+def _quantization(profile: CollectionProfile):
+    if profile.quantization == "int8":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if profile.quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _quantization_kind(config) -> Optional[str]:
+    if isinstance(config, ScalarQuantization):
+        return "int8"
+    if isinstance(config, BinaryQuantization):
+        return "binary"
+    return None
+
+
+def plan_profile(
+    client: QdrantClient,
+    profile: CollectionProfile,
+    collection_name: str = COLLECTION_NAME,
+    vector_size: int = VECTOR_SIZE
+) -> list[tuple[str, Callable[[], object]]]:
+    """Steps (description, action) that bring a collection in line with a profile"""
+    hnsw, quantization = _hnsw(profile), _quantization(profile)
+    steps = []
+
+    if not client.collection_exists(collection_name):
+        steps.append((
+            f"create collection {collection_name} ({profile.name})",
+            lambda: client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(
+                    size=vector_size, distance=Distance.COSINE, on_disk=profile.on_disk_vectors
+                ),
+                hnsw_config=hnsw,
+                quantization_config=quantization,
+                on_disk_payload=profile.on_disk_payload
+            )
+        ))
+        schema = {}
+    else:
+        info = client.get_collection(collection_name)
+        vectors = info.config.params.vectors
+        if vectors.size != vector_size or vectors.distance != Distance.COSINE:
+            raise ValueError(
+                f"{collection_name} holds {vectors.size}-d {vectors.distance} vectors; "
+                f"expected {vector_size}-d Cosine. Recreate it and re-ingest."
+            )
+
+        current = info.config.hnsw_config
+        if (current.m, current.payload_m or 0, current.ef_construct) != (hnsw.m, hnsw.payload_m, hnsw.ef_construct):
+            steps.append((
+                f"hnsw m={hnsw.m} payload_m={hnsw.payload_m} ef_construct={hnsw.ef_construct}",
+                lambda: client.update_collection(collection_name, hnsw_config=hnsw)
+            ))
+        if _quantization_kind(info.config.quantization_config) != profile.quantization:
+            steps.append((
+                f"quantization {profile.quantization or 'off'}",
+                lambda: client.update_collection(
+                    collection_name, quantization_config=quantization or Disabled.DISABLED
+                )
+            ))
+        if bool(vectors.on_disk) != profile.on_disk_vectors:
+            steps.append((
+                f"vectors on_disk={profile.on_disk_vectors}",
+                lambda: client.update_collection(
+                    collection_name, vectors_config={"": VectorParamsDiff(on_disk=profile.on_disk_vectors)}
+                )
+            ))
+        if bool(info.config.params.on_disk_payload) != profile.on_disk_payload:
+            steps.append((
+                f"payload on_disk={profile.on_disk_payload}",
+                lambda: client.update_collection(
+                    collection_name, collection_params=CollectionParamsDiff(on_disk_payload=profile.on_disk_payload)
+                )
+            ))
+        schema = info.payload_schema or {}
+
+    for field_name, params in PAYLOAD_INDEXES.items():
+        existing = schema.get(field_name)
+        if existing is not None and existing.params == params:
+            continue
+        if existing is not None:
+            steps.append((
+                f"drop index {field_name} ({existing.data_type})",
+                lambda field_name=field_name: client.delete_payload_index(collection_name, field_name)
+            ))
+        steps.append((
+            f"index {field_name} (integer, lookup only)",
+            lambda field_name=field_name, params=params: client.create_payload_index(
+                collection_name, field_name, field_schema=params
+            )
+        ))
+    return steps
+
+
+def apply_profile(
+    client: QdrantClient,
+    profile: CollectionProfile,
+    collection_name: str = COLLECTION_NAME,
+    vector_size: int = VECTOR_SIZE,
+    dry_run: bool = False
+) -> list[str]:
+    """Create or migrate a collection to a profile; returns what changed.
+
+    Idempotent: an up-to-date collection yields no steps. Qdrant rebuilds
+    indexes and quantized copies in the background after an update.
+    """
+    steps = plan_profile(client, profile, collection_name, vector_size)
+    if not dry_run:
+        for _, action in steps:
+            action()
+    return [description for description, _ in steps]
@@ -1,3 +1,8 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50):
     words = text.split()
     chunks = []
@@ -10,3 +15,193 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50):
         start = end - overlap
 
     return chunks
+
+
+def iter_chunks(pages: Iterable[str], chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
+    """Streaming chunk_text over page texts.
+
+    Yields exactly what chunk_text("".join(pages)) returns, but only keeps
+    one window of words (plus the current page) in memory, so overlap is
+    carried across page boundaries.
+    """
+    step = chunk_size - overlap
+    words: list[str] = []
+
+    for page in pages:
+        words.extend(page.split())
+        while len(words) >= chunk_size:
+            yield " ".join(words[:chunk_size])
+            del words[:step]
+
+    while words:
+        yield " ".join(words[:chunk_size])
+        del words[:step]
+
+
+# -----------------------
+# Token-aware chunking
+# -----------------------
+# Sentence ends (., !, ? plus closing quotes/brackets) or blank-line paragraph breaks
+_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\n[ \t]*\n\s*")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A chunk of the document, located by character offsets.
+
+    start/end are offsets into the full document text (pages joined as
+    extract_text_from_pdf returns them). The text is sliced lazily from the
+    page window it was cut from.
+    """
+    start: int
+    end: int
+    token_count: int
+    _window: str = field(repr=False, compare=False)
+    _window_start: int = field(repr=False, compare=False)
+
+    @property
+    def text(self) -> str:
+        return self._window[self.start - self._window_start:self.end - self._window_start]
+
+
+def _trim(text: str, start: int, end: int) -> Optional[tuple[int, int]]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
+
+
+def split_sentences(text: str) -> tuple[list[tuple[int, int]], int]:
+    """Return (spans of complete sentences/paragraphs, start of the unfinished tail)"""
+    spans = []
+    start = 0
+    for match in _BOUNDARY.finditer(text):
+        span = _trim(text, start, match.end())
+        if span:
+            spans.append(span)
+        start = match.end()
+    return spans, start
+
+
+class _Packer:
+    """Greedy sentence packer for one window of text"""
+
+    def __init__(self, window: str, window_start: int, max_tokens: int, overlap_tokens: int, emitted_until: int):
+        self.window = window
+        self.window_start = window_start
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        # Window offset up to which text already went out in an earlier chunk
+        self.emitted_until = emitted_until
+        self.current: list[tuple[int, int, int]] = []  # (start, end, tokens)
+        self.tokens = 0
+        self.chunks: list[Chunk] = []
+
+    def _emit(self, start: int, end: int, tokens: int):
+        self.chunks.append(Chunk(
+            start=self.window_start + start,
+            end=self.window_start + end,
+            token_count=tokens,
+            _window=self.window,
+            _window_start=self.window_start
+        ))
+        self.emitted_until = end
+
+    def has_new_text(self) -> bool:
+        return bool(self.current) and self.current[-1][1] > self.emitted_until
+
+    def flush(self):
+        if self.has_new_text():
+            self._emit(self.current[0][0], self.current[-1][1], self.tokens)
+        # Keep trailing sentences worth <= overlap_tokens for the next chunk
+        kept, kept_tokens = [], 0
+        for sentence in reversed(self.current):
+            if kept_tokens + sentence[2] > self.overlap_tokens:
+                break
+            kept.insert(0, sentence)
+            kept_tokens += sentence[2]
+        self.current, self.tokens = kept, kept_tokens
+
+    def add(self, start: int, end: int, tokens: int, offsets: list[tuple[int, int]]):
+        if tokens > self.max_tokens:
+            self.flush()
+            self.current, self.tokens = [], 0
+            self._split_long(start, tokens, offsets)
+            return
+
+        while self.current and self.tokens + tokens > self.max_tokens:
+            if self.has_new_text():
+                self.flush()
+            else:
+                # Only overlap left and it doesn't fit alongside this sentence
+                _, _, dropped = self.current.pop(0)
+                self.tokens -= dropped
+
+        self.current.append((start, end, tokens))
+        self.tokens += tokens
+
+    def _split_long(self, start: int, tokens: int, offsets: list[tuple[int, int]]):
+        """Cut a sentence longer than the window at token boundaries"""
+        step = max(1, self.max_tokens - self.overlap_tokens)
+        for first in range(0, tokens, step):
+            last = min(first + self.max_tokens, tokens) - 1
+            self._emit(start + offsets[first][0], start + offsets[last][1], last - first + 1)
+            if last == tokens - 1:
+                break
+
+
+def iter_token_chunks(
+    pages: Iterable[str],
+    tokenizer,
+    max_tokens: int,
+    overlap_tokens: int = 32,
+) -> Iterator[Chunk]:
+    """Chunk streamed pages into sentence-aligned chunks of <= max_tokens tokens.
+
+    Lengths are measured with `tokenizer` (a Hugging Face fast tokenizer or
+    anything with the same call signature), one batched call per page.
+    Chunks never split a sentence unless the sentence alone exceeds
+    max_tokens, and consecutive chunks share up to overlap_tokens tokens of
+    whole sentences. Only the unfinished chunk is carried between pages.
+    """
+    max_pending_chars = max_tokens * 16
+    window, window_start, emitted_until = "", 0, 0
+    pages = iter(pages)
+
+    while True:
+        page = next(pages, None)
+        final = page is None
+        if not final:
+            window += page
+
+        spans, tail = split_sentences(window)
+        # The tail may continue on the next page, unless it's runaway text
+        if final or len(window) - tail > max_pending_chars:
+            span = _trim(window, tail, len(window))
+            if span:
+                spans.append(span)
+            tail = len(window)
+
+        packer = _Packer(window, window_start, max_tokens, overlap_tokens, emitted_until)
+        if spans:
+            encoded = tokenizer(
+                [window[s:e] for s, e in spans],
+                add_special_tokens=False,
+                return_offsets_mapping=True
+            )
+            for (s, e), ids, offsets in zip(spans, encoded["input_ids"], encoded["offset_mapping"]):
+                packer.add(s, e, len(ids), offsets)
+
+        if final:
+            packer.flush()
+            yield from packer.chunks
+            return
+
+        yield from packer.chunks
+
+        # Carry the unfinished chunk (including its overlap) and the tail
+        carry_from = packer.current[0][0] if packer.current else tail
+        window = window[carry_from:]
+        window_start += carry_from
+        emitted_until = max(0, packer.emitted_until - carry_from)
@@ -0,0 +1,115 @@
+"""
+Duplicate and near-duplicate chunk elimination.
+
+Support manuals repeat headers, footers, legal notices and tables of
+contents on every page. Chunks are fingerprinted between chunking and
+embedding: a hash of the normalized text catches exact repeats, and a
+MinHash signature over word shingles, bucketed with LSH, catches near
+repeats (page numbers, dates, small edits). Fingerprints of stored chunks
+are kept in the chunk_fingerprints table so a new upload is also checked
+against the API key's existing knowledge base. A fingerprint can carry the
+point id of its stored chunk, so a duplicate can refer to the chunk it
+repeats.
+"""
+import hashlib
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_WORDS = 3
+
+_MERSENNE = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    content_hash: str
+    signature: bytes  # NUM_PERM little-endian uint32 MinHash values
+    chunk_id: Optional[str] = None  # point id of the stored chunk, if known
+
+
+def _words(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def _signature(words: list[str]) -> np.ndarray:
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a*x + b) mod p for every permutation at once; a, x < 2**32 so no overflow
+    permuted = (np.outer(hashes, _A) + _B) % _MERSENNE
+    return permuted.min(axis=0).astype("<u4")
+
+
+def fingerprint(text: str) -> Fingerprint:
+    words = _words(text)
+    content_hash = hashlib.sha256(" ".join(words).encode()).hexdigest()
+    return Fingerprint(content_hash, _signature(words).tobytes())
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """MinHash estimate of the Jaccard similarity of two chunks' shingles"""
+    return float(np.mean(np.frombuffer(a, dtype="<u4") == np.frombuffer(b, dtype="<u4")))
+
+
+class ChunkDeduplicator:
+    """Remembers fingerprints and classifies new chunks as exact/near duplicates"""
+
+    def __init__(self, threshold: float = 0.9, existing: Iterable[Fingerprint] = ()):
+        self.threshold = threshold
+        self._hashes: dict[str, Optional[str]] = {}  # content hash -> chunk id
+        self._signatures: list[bytes] = []
+        self._chunk_ids: list[Optional[str]] = []
+        self._buckets: dict[tuple[int, bytes], list[int]] = {}
+        for fp in existing:
+            self.add(fp)
+
+    def _bands(self, signature: bytes):
+        width = len(signature) // BANDS
+        for band in range(BANDS):
+            yield band, signature[band * width:(band + 1) * width]
+
+    def add(self, fp: Fingerprint):
+        self._hashes.setdefault(fp.content_hash, fp.chunk_id)
+        if len(fp.signature) != NUM_PERM * 4:
+            return
+        index = len(self._signatures)
+        self._signatures.append(fp.signature)
+        self._chunk_ids.append(fp.chunk_id)
+        for key in self._bands(fp.signature):
+            self._buckets.setdefault(key, []).append(index)
+
+    def lookup(self, fp: Fingerprint) -> tuple[Optional[str], Optional[str]]:
+        """Return ("exact" or "near", chunk id of the chunk it repeats), or (None, None)"""
+        if fp.content_hash in self._hashes:
+            return "exact", self._hashes[fp.content_hash]
+        candidates = set()
+        for key in self._bands(fp.signature):
+            candidates.update(self._buckets.get(key, ()))
+        for index in sorted(candidates):
+            if similarity(fp.signature, self._signatures[index]) >= self.threshold:
+                return "near", self._chunk_ids[index]
+        return None, None
+
+    def match(self, fp: Fingerprint) -> Optional[str]:
+        """Return "exact", "near" or None"""
+        return self.lookup(fp)[0]
+
+    def check(self, fp: Fingerprint) -> Optional[str]:
+        """Like match(), but remembers the chunk when it is new"""
+        kind = self.match(fp)
+        if kind is None:
+            self.add(fp)
+        return kind
@@ -0,0 +1,405 @@
+"""
+Background ingestion jobs.
+
+POST /ingest spools the upload to a temp file, records an IngestJob row and
+hands the pipeline to a bounded in-process worker pool. The job row is the
+source of truth for status/progress, so any worker process can serve
+GET /ingest/jobs/{id}. No external broker is needed.
+
+Jobs live in memory, so a restart loses the ones queued or running:
+recover_jobs() (run at startup) marks them failed and discards their
+partial documents, so the uploads can be retried.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import (
+    CHUNKER,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    DEDUP_ENABLED,
+    DEDUP_NEAR_THRESHOLD,
+    INGEST_JOB_STALE_SECONDS,
+    INGEST_WORKERS,
+    INGEST_QUEUE_SIZE,
+    QDRANT_UPSERT_BATCH_SIZE,
+)
+from app.core.usage import check_ingest_quota, record_ingest
+from app.db.base import SessionLocal
+from app.db.models import APIKey, ChunkFingerprint, Document, IngestJob
+from app.ingest.chunk import iter_chunks, iter_token_chunks
+from app.ingest.dedup import ChunkDeduplicator, Fingerprint, fingerprint
+from app.ingest.pdf import iter_pdf_pages
+from app.ingest.pipeline import iter_batches, prefetch
+from app.rag.embeddings import get_max_tokens, get_tokenizer
+from app.rag.purge import get_purger, tombstone_document
+from app.rag.retrieve import invalidate_caches
+from app.rag.store import store_texts
+from app.rag.vector_store import place_tenant, rebalance, tenant_lock
+
+logger = logging.getLogger(__name__)
+
+# Hard guardrail (prevents abuse)
+MAX_SINGLE_UPLOAD_CHARS = 500_000  # ~125k tokens
+
+# Progress (percent) at the start of each stage. Pages are parsed, chunked
+# and embedded concurrently during "embedding", which fills the rest.
+STAGE_PROGRESS = {
+    "queued": 0,
+    "extracting": 2,
+    "embedding": 5,
+    "done": 100,
+}
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_slots = threading.BoundedSemaphore(INGEST_QUEUE_SIZE)
+
+
+class IngestJobError(Exception):
+    """Expected pipeline failure; message is shown to the client"""
+
+
+def reserve_ingest_slot():
+    """Take a place in the queue, or raise 503 if it is full (before spooling the upload)"""
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue is full. Please retry shortly."
+        )
+
+
+def release_ingest_slot():
+    """Give back a slot that was reserved but never submitted"""
+    _slots.release()
+
+
+def submit_ingest_job(job_id: int, path: str):
+    """Hand a job to the worker pool; it takes over the slot from reserve_ingest_slot()"""
+    _executor.submit(_run_job, job_id, path)
+
+
+def _run_job(job_id: int, path: str):
+    try:
+        run_ingest_job(job_id, path)
+    finally:
+        _slots.release()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def chunk_pages(pages: Iterable[str]) -> Iterator[tuple[str, dict]]:
+    """Yield (chunk text, extra payload) using the configured chunker"""
+    if CHUNKER == "words":
+        for text in iter_chunks(pages):
+            yield text, {}
+        return
+
+    max_tokens = CHUNK_MAX_TOKENS or get_max_tokens()
+    for chunk in iter_token_chunks(pages, get_tokenizer(), max_tokens, CHUNK_OVERLAP_TOKENS):
+        yield chunk.text, {"char_start": chunk.start, "char_end": chunk.end}
+
+
+def dedup_chunks(
+    chunks: Iterable[tuple[str, dict]],
+    deduplicator: Optional[ChunkDeduplicator],
+    skipped: dict[str, int]
+) -> Iterator[tuple[str, dict, Fingerprint, Optional[str]]]:
+    """Fingerprint chunks, counting the ones the deduplicator has seen.
+
+    Yields (text, extra, fingerprint, kind). A new chunk has kind None and
+    a fresh chunk id to store it under. A repeat of another document's
+    chunk has kind "exact" or "near" and that chunk's id: it is not stored,
+    but referred to, which keeps the chunk alive if the other document is
+    deleted. Repeats within the upload are dropped.
+    """
+    own = set()
+    for text, extra in chunks:
+        fp = fingerprint(text)
+        kind, chunk_id = deduplicator.lookup(fp) if deduplicator else (None, None)
+        if kind:
+            skipped[kind] += 1
+            if chunk_id not in own:
+                yield text, extra, replace(fp, chunk_id=chunk_id), kind
+            continue
+        fp = replace(fp, chunk_id=str(uuid.uuid4()))
+        if deduplicator:
+            deduplicator.add(fp)
+        own.add(fp.chunk_id)
+        yield text, extra, fp, None
+
+
+def _load_deduplicator(db, api_key_id: int) -> ChunkDeduplicator:
+    """Seed a deduplicator with the fingerprints of the key's stored chunks.
+
+    Fingerprints recorded before chunk ids were kept can't be referred to,
+    so their content is stored again rather than deduplicated.
+    """
+    rows = db.query(ChunkFingerprint.content_hash, ChunkFingerprint.minhash, ChunkFingerprint.chunk_id).filter(
+        ChunkFingerprint.api_key_id == api_key_id,
+        ChunkFingerprint.chunk_id.isnot(None)
+    )
+    return ChunkDeduplicator(
+        threshold=DEDUP_NEAR_THRESHOLD,
+        existing=(Fingerprint(content_hash, minhash, chunk_id) for content_hash, minhash, chunk_id in rows)
+    )
+
+
+def _refer(db, api_key_id: int, document_id: int, references: list[Fingerprint]) -> set[str]:
+    """Record references to other documents' chunks; returns the chunk ids that are gone.
+
+    A chunk is alive while some fingerprint still names it: its owner's,
+    or another reference's (deleting the owner hands it over). Checked and
+    recorded under the tenant lock, so a concurrent delete either sees the
+    reference or has already removed the chunk.
+    """
+    wanted = {fp.chunk_id for fp in references}
+    with tenant_lock(api_key_id):
+        alive = {
+            chunk_id
+            for (chunk_id,) in db.query(ChunkFingerprint.chunk_id).filter(
+                ChunkFingerprint.api_key_id == api_key_id,
+                ChunkFingerprint.chunk_id.in_(wanted)
+            ).distinct()
+        }
+        db.add_all([
+            ChunkFingerprint(
+                api_key_id=api_key_id,
+                document_id=document_id,
+                content_hash=fp.content_hash,
+                minhash=fp.signature,
+                chunk_id=fp.chunk_id
+            )
+            for fp in references
+            if fp.chunk_id in alive
+        ])
+        db.commit()
+    return wanted - alive
+
+
+def _update(db, job: IngestJob, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def _set_stage(db, job: IngestJob, stage: str):
+    _update(db, job, stage=stage, progress=STAGE_PROGRESS[stage])
+
+
+def run_ingest_job(job_id: int, path: str):
+    """Stream pages -> chunks -> embedding batches for one job, recording progress"""
+    db = SessionLocal()
+    api_key = None
+    document = None
+    try:
+        job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+        if not job:
+            return
+
+        api_key = db.query(APIKey).filter(APIKey.id == job.api_key_id).first()
+        if not api_key:
+            raise IngestJobError("API key not found")
+        # Running before the lock is released: rebalance() won't move the
+        # tenant away from `vectors` while this job writes there
+        with tenant_lock(api_key.id):
+            vectors = place_tenant(db, api_key)
+            _update(db, job, status="running")
+        _set_stage(db, job, "extracting")
+
+        # Vectors need a document_id, so the row exists while streaming;
+        # hash and counts are filled in once the whole file has been read.
+        document = Document(
+            api_key_id=api_key.id,
+            filename=job.filename,
+            file_hash="",
+            char_count=0,
+            chunk_count=0
+        )
+        db.add(document)
+        db.flush()
+        # Recorded at once, so a restart mid-ingest can discard it (see recover_jobs)
+        _update(db, job, document_id=document.id)
+        db.refresh(document)
+
+        # Written by the producer thread, read between batches
+        text_hash = hashlib.md5()
+        totals = {"chars": 0, "pages": 0, "pages_total": 0}
+
+        def on_page(done: int, total: int):
+            totals["pages"], totals["pages_total"] = done, total
+
+        def pages(source):
+            for page_text in iter_pdf_pages(source, on_page=on_page):
+                text_hash.update(page_text.encode())
+                totals["chars"] += len(page_text)
+                # Single-file guardrail
+                if totals["chars"] > MAX_SINGLE_UPLOAD_CHARS:
+                    raise IngestJobError("File too large for your current plan")
+                yield page_text
+
+        deduplicator = _load_deduplicator(db, api_key.id) if DEDUP_ENABLED else None
+        skipped = {"exact": 0, "near": 0}
+
+        _set_stage(db, job, "embedding")
+        start = STAGE_PROGRESS["embedding"]
+        stored = 0
+
+        chunks = dedup_chunks(chunk_pages(pages(path)), deduplicator, skipped)
+        for batch in prefetch(iter_batches(chunks, QDRANT_UPSERT_BATCH_SIZE)):
+            # Enforce quota as characters arrive, BEFORE embedding them
+            _check_quota(db, api_key.user_id, totals["chars"])
+
+            new = [(text, extra, fp) for text, extra, fp, kind in batch if kind is None]
+            references = [(text, extra, fp, kind) for text, extra, fp, kind in batch if kind]
+            if references:
+                # A chunk deleted since the deduplicator was seeded is stored after all
+                gone = _refer(db, api_key.id, document.id, [fp for _, _, fp, _ in references])
+                for text, extra, fp, kind in references:
+                    if fp.chunk_id in gone:
+                        skipped[kind] -= 1
+                        new.append((text, extra, replace(fp, chunk_id=str(uuid.uuid4()))))
+
+            stored += store_texts(
+                texts=[text for text, _, _ in new],
+                api_key_id=api_key.id,
+                document_id=document.id,
+                payloads=[extra for _, extra, _ in new],
+                store=vectors,
+                ids=[fp.chunk_id for _, _, fp in new]
+            )
+            db.add_all([
+                ChunkFingerprint(
+                    api_key_id=api_key.id,
+                    document_id=document.id,
+                    content_hash=fp.content_hash,
+                    minhash=fp.signature,
+                    chunk_id=fp.chunk_id
+                )
+                for _, _, fp in new
+            ])
+            pages_total = max(1, totals["pages_total"])
+            _update(
+                db,
+                job,
+                chunks_total=stored + skipped["exact"] + skipped["near"],
+                chunks_embedded=stored,
+                chunks_duplicate=skipped["exact"],
+                chunks_near_duplicate=skipped["near"],
+                progress=start + (99 - start) * totals["pages"] // pages_total
+            )
+
+        char_count = totals["chars"]
+        file_hash = text_hash.hexdigest()
+
+        # Check for duplicate
+        existing = db.query(Document).filter(
+            Document.api_key_id == api_key.id,
+            Document.file_hash == file_hash,
+            Document.id != document.id
+        ).first()
+        if existing:
+            raise IngestJobError("Document already uploaded")
+
+        if stored == 0:
+            if skipped["exact"] or skipped["near"]:
+                raise IngestJobError("No new content: every chunk duplicates your existing documents")
+            raise IngestJobError("Empty PDF")
+
+        _check_quota(db, api_key.user_id, char_count)
+
+        document.file_hash = file_hash
+        document.char_count = char_count
+        document.chunk_count = stored
+        db.commit()
+
+        # Record usage AFTER success
+        record_ingest(db, api_key.user_id, char_count)
+        invalidate_caches(api_key.id)
+
+        _update(
+            db,
+            job,
+            status="completed",
+            chunks_total=stored + skipped["exact"] + skipped["near"],
+            chunks_duplicate=skipped["exact"],
+            chunks_near_duplicate=skipped["near"]
+        )
+        _set_stage(db, job, "done")
+
+    except Exception as e:
+        db.rollback()
+        if not isinstance(e, IngestJobError):
+            logger.exception("Ingest job %s failed", job_id)
+        if document is not None:
+            _discard_document(db, api_key, document)
+        job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+        if job:
+            _update(db, job, status="failed", error=str(e), document_id=None)
+    else:
+        _rebalance(db, api_key)
+    finally:
+        db.close()
+
+
+def _rebalance(db, api_key: APIKey):
+    """Move the tenant to the backend that suits its new size; never fails the finished job"""
+    try:
+        rebalance(db, api_key)
+    except Exception:
+        db.rollback()
+        logger.exception("Rebalancing API key %s failed", api_key.id)
+
+
+def _check_quota(db, user_id: int, chars: int):
+    try:
+        check_ingest_quota(db, user_id, chars)
+    except HTTPException as e:
+        raise IngestJobError(e.detail)
+
+
+def recover_jobs(stale_after: float = INGEST_JOB_STALE_SECONDS) -> int:
+    """Fail queued/running jobs no process is working on; returns how many.
+
+    A job counts as abandoned once it hasn't been updated for stale_after
+    seconds (0 = every unfinished job: right for one worker process at
+    startup). Its partial document is discarded, which also lets
+    rebalance() move the tenant again.
+    """
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        stale = db.query(IngestJob).filter(
+            IngestJob.status.in_(["queued", "running"]),
+            IngestJob.updated_at <= cutoff
+        ).all()
+        for job in stale:
+            document = db.query(Document).filter(Document.id == job.document_id).first() if job.document_id else None
+            if document:
+                api_key = db.query(APIKey).filter(APIKey.id == document.api_key_id).first()
+                _discard_document(db, api_key, document)
+            _update(db, job, status="failed", error="Interrupted by a server restart. Please upload again.", document_id=None)
+            logger.warning("Ingest job %s was interrupted; marked failed", job.id)
+        return len(stale)
+    finally:
+        db.close()
+
+
+def _discard_document(db, api_key: APIKey, document: Document):
+    """Remove a partially ingested document so the upload can be retried"""
+    with tenant_lock(api_key.id):
+        tombstone_document(db, api_key, document)
+        db.commit()
+    invalidate_caches(document.api_key_id)
+    get_purger().wake()
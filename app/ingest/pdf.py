@@ -1,12 +1,101 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, Optional
+
 from pypdf import PdfReader
 
-def extract_text_from_pdf(file) -> str:
+from app.core.config import PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK
+
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        if workers not in _pools:
+            # spawn: forking a threaded server process is not safe
+            _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pools[workers]
+
+
+# Worker-process cache so each range task doesn't re-parse the whole file
+_worker_reader: Optional[tuple[tuple, PdfReader]] = None
+
+
+def _extract_page_range(path: str, start: int, end: int) -> list[str]:
+    """Worker: extract pages [start, end) of the PDF at path"""
+    global _worker_reader
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = (key, PdfReader(path))
+    reader = _worker_reader[1]
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _iter_pages_parallel(path: str, total: int, workers: int, pages_per_task: int) -> Iterator[str]:
+    """Extract page ranges in worker processes, yielding pages in order.
+
+    At most 2 * workers ranges are in flight, so memory stays bounded for
+    very long documents.
+    """
+    pool = _get_pool(workers)
+    ranges = iter([(s, min(s + pages_per_task, total)) for s in range(0, total, pages_per_task)])
+    pending = deque()
+
+    def submit_next() -> bool:
+        page_range = next(ranges, None)
+        if page_range is None:
+            return False
+        pending.append(pool.submit(_extract_page_range, path, *page_range))
+        return True
+
+    try:
+        for _ in range(2 * workers):
+            if not submit_next():
+                break
+        while pending:
+            texts = pending.popleft().result()
+            submit_next()
+            yield from texts
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_pdf_pages(
+    file,
+    on_page: Optional[Callable[[int, int], None]] = None,
+    workers: int = PDF_EXTRACT_WORKERS,
+    min_parallel_pages: int = PDF_PARALLEL_MIN_PAGES,
+) -> Iterator[str]:
+    """Yield page texts one at a time so callers never hold the whole document.
+
+    `file` may be a path or a file object. Paths to documents with at least
+    min_parallel_pages pages are extracted across a process pool; everything
+    else is extracted serially in this process.
+
+    on_page, if given, is called with (pages_done, total_pages) after each page.
+    """
     reader = PdfReader(file)
-    text = ""
+    total = len(reader.pages)
 
-    for page in reader.pages:
-        page_text = page.extract_text()
+    if isinstance(file, (str, os.PathLike)) and workers > 1 and total >= min_parallel_pages:
+        page_texts = _iter_pages_parallel(os.fspath(file), total, workers, PDF_PAGES_PER_TASK)
+    else:
+        page_texts = (page.extract_text() for page in reader.pages)
+
+    for number, page_text in enumerate(page_texts, start=1):
         if page_text:
-            text += page_text + "\n"
+            yield page_text + "\n"
+        if on_page:
+            on_page(number, total)
 
-    return text
+def extract_text_from_pdf(file) -> str:
+    return "".join(iter_pdf_pages(file))
@@ -0,0 +1,67 @@
+"""
+Streaming helpers for the ingestion pipeline.
+
+Pages -> chunks -> fixed-size batches flow through generators, and
+prefetch() moves the producing side to a background thread so PDF parsing
+of later pages overlaps with embedding of earlier batches. Memory stays
+bounded by max_buffered batches regardless of document size.
+"""
+import queue
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+def iter_batches(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Group an iterable into lists of at most `size` items"""
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def prefetch(items: Iterable[T], max_buffered: int = 2) -> Iterator[T]:
+    """Consume `items` in a background thread, at most max_buffered ahead.
+
+    Exceptions raised by the producer are re-raised in the consumer. If the
+    consumer stops early, the producer is signalled and joined.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                if not _put(q, (False, item), stop):
+                    return
+            _put(q, (True, None), stop)
+        except BaseException as e:
+            _put(q, (True, e), stop)
+
+    thread = threading.Thread(target=produce, name="ingest-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            done, value = q.get()
+            if done:
+                if value is not None:
+                    raise value
+                return
+            yield value
+    finally:
+        stop.set()
+        thread.join()
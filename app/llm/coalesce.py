@@ -0,0 +1,193 @@
+"""
+Single-flight coalescing of identical in-flight LLM generations.
+
+When many visitors ask the same question at once, their prompts are
+identical (same context, same query). Instead of one upstream generation
+each, the first caller's generation is shared with everyone who asks for
+the same (provider, model, prompt) while it is still running:
+
+- run(): sync callers (/chat) wait for the leader's answer
+- arun(): async callers (/chat/batch) await one shared task
+- stream(): /chat/stream subscribers each get every token, late joiners
+  first replay what was already generated
+
+A finished generation is forgotten at once, so this only merges concurrent
+requests (repeats later on are the answer cache's job). Callers still
+charge their own usage; `shared` tells them no upstream call was made.
+"""
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.core.config import LLM_COALESCE
+
+
+def prompt_key(provider_name: str, llm, prompt: str) -> tuple:
+    """Generations are shared per (provider, model, prompt hash)"""
+    return provider_name, getattr(llm, "model", None), hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class _Call:
+    """A sync generation other threads can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class _Stream:
+    """A streamed generation fanned out to every subscriber"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.tokens: list[str] = []
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class Coalescer:
+    """In-flight generations by key, with counters of leaders and callers that joined one"""
+
+    def __init__(self, enabled: bool = LLM_COALESCE):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: dict[tuple, _Call] = {}
+        self._tasks: dict[tuple, asyncio.Task] = {}
+        self._streams: dict[tuple, _Stream] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    def _count(self, shared: bool):
+        with self._lock:
+            if shared:
+                self.joined += 1
+            else:
+                self.leaders += 1
+
+    def run(self, key: tuple, generate: Callable[[], str]) -> tuple[str, bool]:
+        """generate(), or the result of the identical call already running; returns (answer, shared)"""
+        if not self.enabled:
+            return generate(), False
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+        self._count(shared)
+
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = generate()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def arun(self, key: tuple, agenerate: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+        """Async run(): every caller awaits one shared task"""
+        if not self.enabled:
+            return await agenerate(), False
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        shared = task is not None and task.get_loop() is loop and not task.done()
+        if not shared:
+            task = self._tasks[key] = loop.create_task(agenerate())
+            task.add_done_callback(lambda done: self._tasks.pop(key, None) if self._tasks.get(key) is done else None)
+        self._count(shared)
+        # One caller giving up doesn't cancel the others' generation
+        return await asyncio.shield(task), shared
+
+    def stream(self, key: tuple, agenerate_stream: Callable[[], AsyncIterator[str]]) -> tuple[AsyncIterator[str], bool]:
+        """Subscribe to the identical stream already running, or start it; returns (tokens, shared).
+
+        Must be called on the event loop. The upstream stream is cancelled
+        once every subscriber has gone.
+        """
+        if not self.enabled:
+            return agenerate_stream(), False
+        flight = self._streams.get(key)
+        shared = flight is not None and flight.loop is asyncio.get_running_loop() and not flight.finished
+        if not shared:
+            flight = self._streams[key] = _Stream()
+            flight.task = flight.loop.create_task(self._pump(key, flight, agenerate_stream))
+        flight.subscribers += 1
+        self._count(shared)
+        return self._follow(key, flight), shared
+
+    async def _pump(self, key: tuple, flight: _Stream, agenerate_stream: Callable[[], AsyncIterator[str]]):
+        stream = agenerate_stream()
+        try:
+            async for token in stream:
+                flight.tokens.append(token)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            await stream.aclose()
+            flight.finished = True
+            self._forget(key, flight)
+            flight.notify()
+
+    async def _follow(self, key: tuple, flight: _Stream) -> AsyncIterator[str]:
+        sent = 0
+        try:
+            while True:
+                if sent < len(flight.tokens):
+                    sent += 1
+                    yield flight.tokens[sent - 1]
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.finished:
+                # Nobody is listening any more: stop the upstream generation
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: tuple, flight: _Stream):
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            leaders, joined, calls = self.leaders, self.joined, len(self._calls)
+        total = leaders + joined
+        return {
+            "enabled": self.enabled,
+            "generations": leaders,
+            "joined": joined,
+            "joined_rate": round(joined / total, 4) if total else 0.0,
+            "in_flight": calls + len(self._tasks) + len(self._streams),
+        }
+
+
+_coalescer = Coalescer()
+
+
+def get_coalescer() -> Coalescer:
+    return _coalescer
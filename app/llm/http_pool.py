@@ -0,0 +1,162 @@
+"""
+Long-lived, tuned HTTP clients for LLM provider SDKs.
+
+Each provider instance owns one pooled client: connections stay open
+between chats (keep-alive), can be multiplexed over HTTP/2, and are bounded
+by LLM_MAX_CONNECTIONS. The client counts requests and the connections it
+had to open, so GET /admin/metrics shows how often TCP+TLS setup was
+skipped.
+
+The Groq and OpenAI SDKs pin different httpx distributions, so the client
+is built from the SDK's own DefaultHttpxClient class with limits and
+timeouts from the same package. Async clients are kept per event loop
+(LoopLocalClients), since an async connection pool belongs to the loop
+that opened its connections.
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import weakref
+from typing import Callable
+
+from app.core.config import (
+    LLM_CONNECT_TIMEOUT_SECONDS,
+    LLM_HTTP2,
+    LLM_KEEPALIVE_EXPIRY_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_READ_TIMEOUT_SECONDS,
+)
+
+try:
+    import h2  # noqa: F401  (httpx's optional HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def _httpx_of(client_class):
+    """The httpx package an SDK's client class is built on"""
+    base = next(cls for cls in client_class.__mro__ if cls.__name__ in ("Client", "AsyncClient"))
+    return importlib.import_module(base.__module__.partition(".")[0])
+
+
+class PooledHTTPClient:
+    """One SDK http_client with a tuned connection pool, plus its counters"""
+
+    def __init__(self, client_class):
+        httpx = _httpx_of(client_class)
+        self.http2 = LLM_HTTP2 and HTTP2_AVAILABLE
+        self.is_async = issubclass(client_class, httpx.AsyncClient)
+        hook = self._on_response
+        if self.is_async:
+            async def hook(response):
+                self._on_response(response)
+        self.client = client_class(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+            event_hooks={"response": [hook]},
+        )
+        self._lock = threading.Lock()
+        self._seen = weakref.WeakSet()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _connections(self) -> list:
+        """The pool's connections, or none if this httpx doesn't expose them the way we expect.
+
+        These are httpx internals: counting must never fail a request or
+        the metrics endpoint.
+        """
+        try:
+            return list(self.client._transport._pool.connections)
+        except Exception as e:
+            logger.debug("LLM connection pool not inspectable: %s", e)
+            return []
+
+    def _on_response(self, response):
+        with self._lock:
+            self.requests += 1
+            try:
+                for connection in self._connections():
+                    if connection not in self._seen:
+                        self._seen.add(connection)
+                        self.connections_opened += 1
+            except Exception as e:
+                logger.debug("Counting LLM connections failed: %s", e)
+
+    def stats(self) -> dict:
+        connections = self._connections()
+        with self._lock:
+            requests, opened = self.requests, self.connections_opened
+        try:
+            idle = sum(1 for c in connections if c.is_idle())
+            http2 = sum(1 for c in connections if "HTTP/2" in c.info())
+        except Exception as e:
+            logger.debug("LLM connection state not readable: %s", e)
+            idle = http2 = 0
+        return {
+            "requests": requests,
+            "connections_opened": opened,
+            "reuse_rate": round(1 - opened / requests, 4) if requests else 0.0,
+            "open": len(connections),
+            "idle": idle,
+            "http2": http2,
+            "max_connections": LLM_MAX_CONNECTIONS,
+        }
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class LoopLocalClients:
+    """An async SDK client (with its own pooled HTTP client) per event loop"""
+
+    def __init__(self, async_client_class, make_client: Callable[[object], object]):
+        self.async_client_class = async_client_class
+        self.make_client = make_client
+        self._clients = weakref.WeakKeyDictionary()  # loop -> (PooledHTTPClient, SDK client)
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The SDK client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            with self._lock:
+                entry = self._clients.get(loop)
+                if entry is None:
+                    http = PooledHTTPClient(self.async_client_class)
+                    entry = self._clients[loop] = (http, self.make_client(http.client))
+        return entry[1]
+
+    def stats(self) -> dict:
+        pools = [http.stats() for http, _ in list(self._clients.values())]
+        totals = {
+            field: sum(pool[field] for pool in pools)
+            for field in ("requests", "connections_opened", "open", "idle", "http2")
+        }
+        requests = totals["requests"]
+        return {
+            **totals,
+            "reuse_rate": round(1 - totals["connections_opened"] / requests, 4) if requests else 0.0,
+            "event_loops": len(pools),
+            "max_connections": LLM_MAX_CONNECTIONS,
+        }
+
+    async def aclose(self):
+        """Close the running loop's client"""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
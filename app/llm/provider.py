@@ -1,13 +1,49 @@
+import asyncio
+import hashlib
+import logging
 import os
+import random
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Iterator
+from collections import deque
+from typing import AsyncIterator, Iterator, Optional
+import anyio
 import requests
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient as GroqAsyncHttpxClient, DefaultHttpxClient as GroqHttpxClient, Groq
 import json
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from app.core.config import (
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_OUTPUT_TOKENS,
+    FAKE_LLM_SEED,
+    FAKE_LLM_TOKENS_PER_SECOND,
+    FAKE_LLM_TTFT_MS,
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_FAILURES,
+    LLM_FALLBACK_PROVIDERS,
+    LLM_HEDGE_INITIAL_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_MIN_SECONDS,
+    LLM_HEDGE_PERCENTILE,
+    LLM_MAX_RETRIES,
+    LLM_ROUTING,
+    LLM_ROUTING_WINDOW,
+)
+from app.llm.http_pool import LoopLocalClients, PooledHTTPClient
+
+logger = logging.getLogger(__name__)
+
+# Raised by anyio.from_thread outside a worker thread (a plain RuntimeError before AnyIO 4.11)
+_NoEventLoopError = getattr(anyio, "NoEventLoopError", RuntimeError)
 
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
+
+    # Set by providers that talk HTTP through a pooled client
+    http: Optional[PooledHTTPClient] = None
     
     @abstractmethod
     def generate(self, prompt: str) -> str:
@@ -19,86 +55,531 @@ class LLMProvider(ABC):
         """Generate a streaming response"""
         pass
 
+    async def agenerate(self, prompt: str) -> str:
+        """Async generate; by default the sync call runs in the threadpool"""
+        return await run_in_threadpool(self.generate, prompt)
 
-class GroqProvider(LLMProvider):
-    def __init__(self):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not set in environment")
-        self.client = Groq(api_key=api_key)
-        self.model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-    
-    def generate(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Async streaming; by default each chunk is pulled from generate_stream in the threadpool"""
+        async for chunk in iterate_in_threadpool(self.generate_stream(prompt)):
+            yield chunk
+
+
+class ChatCompletionsProvider(LLMProvider):
+    """Providers with an OpenAI-style chat completions API, sync and async.
+
+    Subclasses set self.client (sync SDK client) and self.aclients (async
+    SDK clients per event loop). agenerate / agenerate_stream await the
+    async client, so a stream holds no thread while waiting for tokens.
+    """
+
+    model: str
+    aclients: LoopLocalClients
+
+    def _request(self, prompt: str, **kwargs) -> dict:
+        return dict(
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
-            max_tokens=512
+            max_tokens=512,
+            **kwargs
         )
+
+    def generate(self, prompt: str) -> str:
+        response = self.client.chat.completions.create(**self._request(prompt))
         return response.choices[0].message.content
     
     def generate_stream(self, prompt: str) -> Iterator[str]:
-        stream = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=512,
-            stream=True
-        )
+        stream = self.client.chat.completions.create(**self._request(prompt, stream=True))
         
         for chunk in stream:
-            if chunk.choices[0].delta.content:
+            if chunk.choices and chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
 
+    async def agenerate(self, prompt: str) -> str:
+        response = await self.aclients.get().chat.completions.create(**self._request(prompt))
+        return response.choices[0].message.content
 
-class OpenAIProvider(LLMProvider):
-    def __init__(self):
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.aclients.get().chat.completions.create(**self._request(prompt, stream=True))
         try:
-            from openai import OpenAI
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # A client that disconnects mid-stream closes the upstream response too
+            await stream.close()
+
+
+class GroqProvider(ChatCompletionsProvider):
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None):
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY not set in environment")
+        options = dict(api_key=api_key, base_url=base_url, max_retries=LLM_MAX_RETRIES)
+        self.http = PooledHTTPClient(GroqHttpxClient)
+        self.client = Groq(**options, http_client=self.http.client)
+        self.aclients = LoopLocalClients(GroqAsyncHttpxClient, lambda http: AsyncGroq(**options, http_client=http))
+        self.model = model or os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+
+
+class OpenAIProvider(ChatCompletionsProvider):
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None):
+        try:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY not set in environment")
-            self.client = OpenAI(api_key=api_key)
-            self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+            options = dict(api_key=api_key, base_url=base_url, max_retries=LLM_MAX_RETRIES)
+            self.http = PooledHTTPClient(DefaultHttpxClient)
+            self.client = OpenAI(**options, http_client=self.http.client)
+            self.aclients = LoopLocalClients(DefaultAsyncHttpxClient, lambda http: AsyncOpenAI(**options, http_client=http))
+            self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
         except ImportError:
             raise ImportError("openai package not installed. Run: pip install openai")
-    
+
+
+class FakeProviderError(ConnectionError):
+    """An error injected by FakeProvider"""
+
+
+class FakeProvider(LLMProvider):
+    """A local stand-in for a real LLM, for load tests and benchmarks.
+
+    The answer to a prompt is always the same text; the first token comes
+    after ttft_ms and the rest at tokens_per_second. A seeded share of
+    calls (error_rate) fails before the first token, like a provider 5xx.
+    """
+
+    WORDS = (
+        "the office opens at nine and closes at five on weekdays support "
+        "tickets are answered within one business day refunds take a week"
+    ).split()
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        ttft_ms: float = FAKE_LLM_TTFT_MS,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        output_tokens: int = FAKE_LLM_OUTPUT_TOKENS,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        seed: int = FAKE_LLM_SEED
+    ):
+        self.model = model or "fake"
+        self.ttft = ttft_ms / 1000
+        self.token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.seed = seed
+        self._errors = random.Random(seed)
+        self._errors_lock = threading.Lock()
+
+    def tokens(self, prompt: str) -> list[str]:
+        """The (deterministic) answer to a prompt, as streamed tokens"""
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode()).digest()
+        rng = random.Random(digest)
+        return [rng.choice(self.WORDS) + " " for _ in range(self.output_tokens)]
+
+    def _maybe_fail(self):
+        with self._errors_lock:
+            failed = self._errors.random() < self.error_rate
+        if failed:
+            raise FakeProviderError("Injected fake LLM provider error")
+
     def generate(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=512
-        )
-        return response.choices[0].message.content
-    
+        tokens = self.tokens(prompt)
+        self._maybe_fail()
+        time.sleep(self.ttft + self.token_interval * max(len(tokens) - 1, 0))
+        return "".join(tokens)
+
     def generate_stream(self, prompt: str) -> Iterator[str]:
-        stream = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=512,
-            stream=True
-        )
-        
-        for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        self._maybe_fail()
+        time.sleep(self.ttft)
+        for i, token in enumerate(self.tokens(prompt)):
+            if i:
+                time.sleep(self.token_interval)
+            yield token
+
+    async def agenerate(self, prompt: str) -> str:
+        tokens = self.tokens(prompt)
+        self._maybe_fail()
+        await asyncio.sleep(self.ttft + self.token_interval * max(len(tokens) - 1, 0))
+        return "".join(tokens)
+
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        self._maybe_fail()
+        await asyncio.sleep(self.ttft)
+        for i, token in enumerate(self.tokens(prompt)):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield token
 
 
-def get_llm_provider(provider_name: str = None) -> LLMProvider:
-    """Factory function to get the configured LLM provider"""
+class ProviderHealth:
+    """Rolling time-to-first-token and outcomes of one provider, with its circuit breaker.
+
+    The breaker opens after LLM_BREAKER_FAILURES consecutive failures. Once
+    LLM_BREAKER_COOLDOWN_SECONDS have passed it is half-open: one trial
+    request at a time is let through (admit()), and its success closes the
+    breaker, its failure re-opens it. admit() hands out a token, and only
+    the trial's own token ends it: a trial that ends neither way (e.g. a
+    cancelled hedge) frees the slot, and one left hanging for a cooldown
+    gives way to the next.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ttfts = deque(maxlen=LLM_ROUTING_WINDOW)
+        self.outcomes = deque(maxlen=LLM_ROUTING_WINDOW)  # True = success
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe: Optional[object] = None  # token of the half-open trial in flight
+        self.probe_started: Optional[float] = None
+
+    def ttft_percentile(self, percentile: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self.ttfts)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, round(percentile / 100 * (len(ordered) - 1)))]
+
+    def hedge_deadline(self) -> float:
+        """Seconds to wait for a first token before hedging"""
+        if len(self.ttfts) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_INITIAL_SECONDS
+        return max(LLM_HEDGE_MIN_SECONDS, self.ttft_percentile(LLM_HEDGE_PERCENTILE))
+
+    def error_rate(self) -> float:
+        with self._lock:
+            outcomes = list(self.outcomes)
+        return round(outcomes.count(False) / len(outcomes), 4) if outcomes else 0.0
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < LLM_BREAKER_COOLDOWN_SECONDS:
+            return "open"
+        return "half_open"
+
+    def _probing(self) -> bool:
+        return self.probe_started is not None and time.monotonic() - self.probe_started < LLM_BREAKER_COOLDOWN_SECONDS
+
+    def available(self) -> bool:
+        """Whether a request may be sent now (without claiming the half-open trial)"""
+        state = self.state()
+        return state == "closed" or (state == "half_open" and not self._probing())
+
+    def admit(self) -> Optional[object]:
+        """Claim the right to send a request: always while closed, once at a time while half-open.
+
+        Returns a token to pass to release() / record_success() /
+        record_failure() when the request ends, or None if refused.
+        """
+        with self._lock:
+            state = self.state()
+            if state == "closed":
+                return object()
+            if state == "open" or self._probing():
+                return None
+            self.probe, self.probe_started = object(), time.monotonic()
+            return self.probe
+
+    def _end_probe(self, token: Optional[object]):
+        if token is not None and token is self.probe:
+            self.probe = self.probe_started = None
+
+    def release(self, token: Optional[object]):
+        """A request ended without success or failure (e.g. cancelled): free its trial slot"""
+        with self._lock:
+            self._end_probe(token)
+
+    def record_ttft(self, seconds: float):
+        with self._lock:
+            self.ttfts.append(seconds)
+
+    def record_success(self, token: Optional[object] = None):
+        with self._lock:
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._end_probe(token)
+
+    def record_failure(self, token: Optional[object] = None):
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            self._end_probe(token)
+            if self.consecutive_failures >= LLM_BREAKER_FAILURES:
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        p50, p95 = self.ttft_percentile(50), self.ttft_percentile(95)
+        return {
+            "state": self.state(),
+            "ttft_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "ttft_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": self.error_rate(),
+            "requests": len(self.outcomes),
+            "consecutive_failures": self.consecutive_failures,
+            "hedge_deadline_ms": round(self.hedge_deadline() * 1000, 1),
+        }
+
+
+_health: dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+
+
+def provider_health(name: str) -> ProviderHealth:
+    """The shared health record of a provider (by name)"""
+    health = _health.get(name)
+    if health is None:
+        with _health_lock:
+            health = _health.setdefault(name, ProviderHealth())
+    return health
+
+
+class RoutedProvider(LLMProvider):
+    """A primary provider backed by secondaries: hedging, failover and circuit breaking.
+
+    A request goes to the first provider (in order, primary first) whose
+    breaker admits it (closed, or half-open with no trial in flight). If no first token arrives within that provider's
+    hedge deadline, the same prompt is sent to the next one; the first to
+    produce a token wins and the other stream is cancelled. Errors before
+    the first token fail over to the next provider; once tokens have been
+    sent, an error is passed on (it can't be replayed elsewhere).
+    """
+
+    def __init__(self, providers: dict[str, LLMProvider]):
+        self.providers = providers
+        self.primary = next(iter(providers))
+        self.model = getattr(providers[self.primary], "model", None)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        queue = [name for name in self.providers if provider_health(name).available()]
+        # Every breaker open: trying is better than failing outright
+        gated = bool(queue)
+        queue = queue or list(self.providers)
+        attempts: dict[asyncio.Task, tuple[str, AsyncIterator[str], float, object]] = {}
+
+        def launch() -> Optional[tuple[str, float]]:
+            """Start the next candidate that admits a request; returns its name and when to hedge it"""
+            while queue:
+                name = queue.pop(0)
+                # Another request may hold a half-open provider's trial by now: skip it
+                token = provider_health(name).admit()
+                if token is None and gated:
+                    continue
+                stream = self.providers[name].agenerate_stream(prompt)
+                started = time.monotonic()
+                attempts[asyncio.ensure_future(anext(stream))] = (name, stream, started, token)
+                return name, started + provider_health(name).hedge_deadline()
+            return None
+
+        launched = launch()
+        if launched is None:
+            # Every trial was taken meanwhile: as with every breaker open, try anyway
+            gated, queue = False, list(self.providers)
+            launched = launch()
+        _, deadline = launched
+        hedged, hedge = False, None
+        winner, first, error = None, None, None
+        try:
+            while winner is None:
+                if not attempts:
+                    raise error
+                timeout = max(0.0, deadline - time.monotonic()) if queue and not hedged else None
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # First token overdue: hedge on the next provider
+                    hedged = True
+                    launched = launch()
+                    if launched is not None:
+                        self.hedges += 1
+                        hedge, _ = launched
+                    continue
+                for task in done:
+                    name, stream, started, token = attempts.pop(task)
+                    health = provider_health(name)
+                    try:
+                        first_token = task.result()
+                    except StopAsyncIteration:
+                        first_token = ""
+                    except Exception as e:
+                        health.record_failure(token)
+                        logger.warning("LLM provider %s failed before its first token: %s", name, e)
+                        error = e
+                        if queue and not attempts:
+                            launched = launch()
+                            if launched is not None:
+                                self.failovers += 1
+                                _, deadline = launched
+                        continue
+                    if winner is not None:
+                        # Tied with the winner: drop this one
+                        health.release(token)
+                        await stream.aclose()
+                        continue
+                    health.record_ttft(time.monotonic() - started)
+                    winner, first = (name, stream, token), first_token
+                    if hedged and name == hedge:
+                        self.hedge_wins += 1
+        finally:
+            # Cancel the losers; their wait so far is a lower bound on their TTFT
+            for task, (name, stream, started, token) in attempts.items():
+                task.cancel()
+                provider_health(name).record_ttft(time.monotonic() - started)
+                provider_health(name).release(token)
+            await asyncio.gather(*attempts, return_exceptions=True)
+            for name, stream, started, token in attempts.values():
+                await stream.aclose()
+
+        name, stream, token = winner
+        try:
+            if first:
+                yield first
+            async for piece in stream:
+                yield piece
+        except Exception:
+            provider_health(name).record_failure(token)
+            raise
+        except BaseException:
+            # The caller stopped reading (disconnect, cancellation): no verdict
+            provider_health(name).release(token)
+            raise
+        finally:
+            await stream.aclose()
+        provider_health(name).record_success(token)
+
+    async def agenerate(self, prompt: str) -> str:
+        return "".join([token async for token in self.agenerate_stream(prompt)])
+
+    def generate(self, prompt: str) -> str:
+        try:
+            # Sync endpoints run in an AnyIO worker thread: route on the app's event loop
+            return anyio.from_thread.run(self.agenerate, prompt)
+        except _NoEventLoopError:
+            return asyncio.run(self.agenerate(prompt))
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+    def stats(self) -> dict:
+        return {
+            "providers": list(self.providers),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+        }
+
+
+LLM_PROVIDERS = {
+    "groq": GroqProvider,
+    "openai": OpenAIProvider,
+    "fake": FakeProvider
+}
+
+# One long-lived instance per (provider, model, base URL): its HTTP pool
+# keeps connections to the provider warm across requests
+_providers: dict[tuple[str, Optional[str], Optional[str]], LLMProvider] = {}
+_providers_lock = threading.RLock()
+
+
+def _route(primary: str) -> RoutedProvider:
+    providers = {primary: get_llm_provider(primary, routed=False)}
+    for name in LLM_FALLBACK_PROVIDERS:
+        if name in providers or name not in LLM_PROVIDERS:
+            continue
+        try:
+            providers[name] = get_llm_provider(name, routed=False)
+        except (ValueError, ImportError) as e:
+            # Not configured (no API key, SDK missing): not a fallback
+            logger.warning("LLM provider %s unavailable for routing: %s", name, e)
+    return RoutedProvider(providers)
+
+
+def get_llm_provider(
+    provider_name: str = None,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    routed: Optional[bool] = None
+) -> LLMProvider:
+    """The shared instance of an LLM provider (default: LLM_PROVIDER).
+
+    With LLM_ROUTING (or routed=True) a provider on its default model and
+    URL comes wrapped in a RoutedProvider over LLM_FALLBACK_PROVIDERS.
+    """
     if provider_name is None:
         provider_name = os.getenv("LLM_PROVIDER", "groq").lower()
     else:
         provider_name = provider_name.lower()
     
-    providers = {
-        "groq": GroqProvider,
-        "openai": OpenAIProvider
+    if provider_name not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider_name}. Choose from: {list(LLM_PROVIDERS.keys())}")
+
+    if routed is None:
+        routed = LLM_ROUTING and model is None and base_url is None
+
+    key = (f"routed:{provider_name}", None, None) if routed else (provider_name, model, base_url)
+    provider = _providers.get(key)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(key)
+            if provider is None:
+                if routed:
+                    provider = _route(provider_name)
+                else:
+                    provider = LLM_PROVIDERS[provider_name](model=model, base_url=base_url)
+                _providers[key] = provider
+    return provider
+
+
+def llm_pool_stats() -> dict:
+    """Connection pool counters of every provider created in this process"""
+    stats = {}
+    for (name, _, base_url), provider in list(_providers.items()):
+        if provider.http is None:
+            continue
+        pools = {"sync": provider.http.stats()}
+        if isinstance(provider, ChatCompletionsProvider):
+            pools["async"] = provider.aclients.stats()
+        stats[f"{name}:{provider.model}" + (f"@{base_url}" if base_url else "")] = pools
+    return stats
+
+
+def llm_routing_stats() -> dict:
+    """Per-provider TTFT, error rate and breaker state, and each route's hedging counters"""
+    return {
+        "providers": {name: health.stats() for name, health in list(_health.items())},
+        "routes": {
+            name.partition(":")[2]: provider.stats()
+            for (name, _, _), provider in list(_providers.items())
+            if isinstance(provider, RoutedProvider)
+        },
     }
-    
-    if provider_name not in providers:
-        raise ValueError(f"Unknown LLM provider: {provider_name}. Choose from: {list(providers.keys())}")
-    
-    return providers[provider_name]()
+
+
+def _take_providers() -> list[LLMProvider]:
+    with _providers_lock:
+        providers = list(_providers.values())
+        _providers.clear()
+    return providers
+
+
+def close_llm_providers():
+    """Forget every provider and close its sync connections (tests, scripts)"""
+    for provider in _take_providers():
+        if provider.http is not None:
+            provider.http.close()
+
+
+async def aclose_llm_providers():
+    """close_llm_providers(), also closing the running loop's async connections (shutdown)"""
+    for provider in _take_providers():
+        if provider.http is not None:
+            provider.http.close()
+        if isinstance(provider, ChatCompletionsProvider):
+            await provider.aclients.aclose()
@@ -1,4 +1,7 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 
 from app.api.health import router as health_router
 from app.api.chat import router as chat_router
@@ -9,12 +12,31 @@ from app.api.auth import router as auth_router
 from app.api.keys import router as keys_router
 from app.api.documents import router as documents_router
 from app.api import usage, plans, billing, admin
+from app.core.warmup import warm_up
+from app.ingest.jobs import recover_jobs
+from app.llm.provider import aclose_llm_providers
+from app.rag.purge import get_purger
 
 from fastapi.middleware.cors import CORSMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm the embedding model (and optionally Qdrant / LLM
+    # clients) before the worker starts serving requests
+    await run_in_threadpool(warm_up)
+    # Jobs queued or running when the server last stopped will never finish
+    await run_in_threadpool(recover_jobs)
+    # Deletes queue their vectors; purge them (and any left from before a restart)
+    get_purger().start()
+    yield
+    get_purger().stop()
+    await aclose_llm_providers()
+
+
 app = FastAPI(
     title="Multi-Tenant Chatbot API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
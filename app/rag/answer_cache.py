@@ -0,0 +1,135 @@
+"""
+Semantic answer cache.
+
+Opt-in per API key. After a chat answer is generated we keep (query
+embedding, retrieved chunk ids, answer). A later question whose embedding
+has cosine similarity >= the key's threshold with a cached one gets the
+cached answer without an LLM call, as long as the key's knowledge base
+generation is unchanged: ingest and deletes bump it, like the retrieval
+cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    answer: str
+    chunk_ids: tuple
+    similarity: float
+
+
+class _KeyEntries:
+    """One API key's cached answers, with their unit-normalized query vectors stacked"""
+
+    def __init__(self):
+        self.entries: "OrderedDict[int, tuple[np.ndarray, tuple, str, float]]" = OrderedDict()
+        self.next_id = 0
+        self._matrix = None
+        self._ids: list[int] = []
+
+    def matrix(self) -> tuple[list[int], np.ndarray]:
+        if self._matrix is None:
+            self._ids = list(self.entries)
+            self._matrix = np.stack([self.entries[i][0] for i in self._ids])
+        return self._ids, self._matrix
+
+    def changed(self):
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    def __init__(self, max_per_key: int, ttl_seconds: float):
+        self.max_per_key = max_per_key
+        self.ttl = ttl_seconds
+        self._keys: dict[int, _KeyEntries] = {}
+        self._generations: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    def generation(self, api_key_id: int) -> int:
+        with self._lock:
+            return self._generations.get(api_key_id, 0)
+
+    def bump(self, api_key_id: int):
+        """Drop every cached answer for this API key"""
+        with self._lock:
+            self._generations[api_key_id] = self._generations.get(api_key_id, 0) + 1
+            self._keys.pop(api_key_id, None)
+            self.invalidations += 1
+
+    def lookup(self, api_key_id: int, query_vector, threshold: float) -> Optional[CachedAnswer]:
+        query = _unit(query_vector)
+        with self._lock:
+            key = self._keys.get(api_key_id)
+            if key is not None:
+                self._expire(key)
+            if not key or not key.entries:
+                self.misses += 1
+                return None
+
+            ids, matrix = key.matrix()
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < threshold:
+                self.misses += 1
+                return None
+
+            entry_id = ids[best]
+            _, chunk_ids, answer, _ = key.entries[entry_id]
+            key.entries.move_to_end(entry_id)
+            self.hits += 1
+            return CachedAnswer(answer, chunk_ids, float(scores[best]))
+
+    def put(self, api_key_id: int, query_vector, chunk_ids, answer: str, generation: int):
+        """Store an answer generated while the knowledge base was at `generation`"""
+        with self._lock:
+            if generation != self._generations.get(api_key_id, 0):
+                return  # documents changed while answering
+            key = self._keys.setdefault(api_key_id, _KeyEntries())
+            key.entries[key.next_id] = (
+                _unit(query_vector), tuple(chunk_ids), answer, time.monotonic() + self.ttl
+            )
+            key.next_id += 1
+            while len(key.entries) > self.max_per_key:
+                key.entries.popitem(last=False)
+            key.changed()
+            self.stores += 1
+
+    def _expire(self, key: _KeyEntries):
+        now = time.monotonic()
+        expired = [entry_id for entry_id, entry in key.entries.items() if entry[3] <= now]
+        for entry_id in expired:
+            del key.entries[entry_id]
+        if expired:
+            key.changed()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "keys": len(self._keys),
+                "size": sum(len(key.entries) for key in self._keys.values()),
+                "max_per_key": self.max_per_key,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
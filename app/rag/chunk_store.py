@@ -0,0 +1,126 @@
+"""
+Chunk text, stored next to (not inside) the vectors.
+
+Vector payloads only carry ids, offsets and the chunk's length; the text
+itself lives zlib-compressed in the chunk_texts table, keyed by point id.
+Searches stay small on the wire, and retrieval loads text only for the
+chunks that make it into a prompt.
+"""
+import zlib
+from dataclasses import replace
+from typing import Iterable
+
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+
+from app.db.base import SessionLocal
+from app.db.models import ChunkText, Document
+
+COMPRESSION_LEVEL = 6
+
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def put_texts(api_key_id: int, document_id: int, texts: dict[str, str]) -> None:
+    """Store the texts of new points, keyed by point id (one bulk insert)"""
+    if not texts:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(insert(ChunkText), [
+            {"id": point_id, "api_key_id": api_key_id, "document_id": document_id, "text": compress(text)}
+            for point_id, text in texts.items()
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_texts(ids: Iterable[str]) -> dict[str, str]:
+    """Texts of the given point ids; ids without stored text are left out"""
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(ChunkText.id, ChunkText.text).filter(ChunkText.id.in_(ids)).all()
+    finally:
+        db.close()
+    return {point_id: decompress(blob) for point_id, blob in rows}
+
+
+def load_chunks(ids: Iterable[str], document_ids: Iterable[int]) -> tuple[dict[str, str], set[int]]:
+    """get_texts(ids), plus which of document_ids still exist (one session)"""
+    ids, document_ids = list(set(ids)), list(set(document_ids))
+    db = SessionLocal()
+    try:
+        rows = db.query(ChunkText.id, ChunkText.text).filter(ChunkText.id.in_(ids)).all() if ids else []
+        live = {
+            document_id
+            for (document_id,) in db.query(Document.id).filter(Document.id.in_(document_ids))
+        } if document_ids else set()
+    finally:
+        db.close()
+    return {point_id: decompress(blob) for point_id, blob in rows}, live
+
+
+async def aload_chunks(ids: Iterable[str], document_ids: Iterable[int]) -> tuple[dict[str, str], set[int]]:
+    return await run_in_threadpool(load_chunks, list(ids), list(document_ids))
+
+
+def delete_document_texts(api_key_id: int, document_id: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(ChunkText).filter(
+            ChunkText.api_key_id == api_key_id, ChunkText.document_id == document_id
+        ).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def delete_api_key_texts(api_key_id: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(ChunkText).filter(ChunkText.api_key_id == api_key_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def move_payload_texts(store, api_key_id: int, dry_run: bool = False) -> int:
+    """Move text still held in one tenant's vector payloads into the chunk store.
+
+    Points are re-upserted with "chars" in place of "text"; points already
+    moved are skipped, so the move is safe to re-run. Returns how many
+    points carried text.
+    """
+    moved = 0
+    for batch in store.export(api_key_id):
+        legacy = [point for point in batch if "text" in point.payload]
+        if not legacy:
+            continue
+        moved += len(legacy)
+        if dry_run:
+            continue
+        stored = get_texts(point.id for point in legacy)
+        by_document: dict[int, dict[str, str]] = {}
+        for point in legacy:
+            if point.id not in stored:
+                by_document.setdefault(point.payload["document_id"], {})[point.id] = point.payload["text"]
+        for document_id, texts in by_document.items():
+            put_texts(api_key_id, document_id, texts)
+        store.upsert(api_key_id, [
+            replace(point, payload={
+                **{k: v for k, v in point.payload.items() if k != "text"},
+                "chars": len(point.payload["text"])
+            })
+            for point in legacy
+        ])
+    return moved
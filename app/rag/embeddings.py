@@ -1,13 +1,160 @@
+import asyncio
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
 from sentence_transformers import SentenceTransformer
 
+from app.core.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_CACHE_SIZE,
+    EMBED_CACHE_PATH,
+    EMBED_EXECUTOR_WORKERS,
+    EMBED_QUERY_BATCHING,
+    EMBED_QUERY_MAX_BATCH,
+    EMBED_QUERY_MAX_WAIT_MS,
+    EMBEDDING_BACKEND,
+    EMBEDDING_ONNX_INT8_FILE,
+)
+from app.rag.batcher import EmbeddingBatcher
+from app.rag.embedding_cache import EmbeddingCache, cache_key
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# -----------------------
+# Backends
+# -----------------------
+# Every backend yields a SentenceTransformer, so encode(), tokenizer and
+# max_seq_length behave the same whichever runtime does the inference.
+
+def _load_torch() -> SentenceTransformer:
+    return SentenceTransformer(MODEL_NAME)
+
+def _load_torch_int8() -> SentenceTransformer:
+    """PyTorch with Linear layers dynamically quantized to int8"""
+    import torch
+
+    model = SentenceTransformer(MODEL_NAME, device="cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _load_onnx() -> SentenceTransformer:
+    """ONNX Runtime (needs: pip install "sentence-transformers[onnx]")"""
+    return SentenceTransformer(MODEL_NAME, backend="onnx")
+
+def _load_onnx_int8() -> SentenceTransformer:
+    """ONNX Runtime with a dynamically int8-quantized graph"""
+    return SentenceTransformer(
+        MODEL_NAME,
+        backend="onnx",
+        model_kwargs={"file_name": EMBEDDING_ONNX_INT8_FILE}
+    )
+
+EMBEDDING_BACKENDS: dict[str, Callable[[], SentenceTransformer]] = {
+    "torch": _load_torch,
+    "torch-int8": _load_torch_int8,
+    "onnx": _load_onnx,
+    "onnx-int8": _load_onnx_int8,
+}
+
+def load_model(backend: str) -> SentenceTransformer:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend: {backend}. Choose from: {list(EMBEDDING_BACKENDS.keys())}"
+        )
+    return EMBEDDING_BACKENDS[backend]()
+
+# Cache entries are per backend: quantized vectors differ slightly
+_model_id = f"{MODEL_NAME}:{EMBEDDING_BACKEND}"
+
 _model = None
+_cache: Optional[EmbeddingCache] = (
+    EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_PATH or None) if EMBED_CACHE_SIZE > 0 else None
+)
 
 def get_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        _model = load_model(EMBEDDING_BACKEND)
     return _model
 
+_local = threading.local()
+
+def get_tokenizer():
+    """The model's fast tokenizer, one copy per thread.
+
+    Hugging Face fast tokenizers raise "Already borrowed" when one instance
+    is used from several threads while encode() is running.
+    """
+    tokenizer = getattr(_local, "tokenizer", None)
+    if tokenizer is None:
+        tokenizer = _local.tokenizer = copy.deepcopy(get_model().tokenizer)
+    return tokenizer
+
+def get_max_tokens() -> int:
+    """Tokens of text that fit the model window ([CLS] and [SEP] excluded)"""
+    return get_model().max_seq_length - 2
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    return _cache
+
 def embed_text(text: str):
+    return embed_texts([text])[0]
+
+def embed_texts(texts: list[str], batch_size: int = EMBED_BATCH_SIZE):
+    """Embed many texts with batched forward passes (one encode call).
+
+    Texts already in the embedding cache are not re-encoded, and duplicates
+    within the batch are encoded once.
+    """
+    if not texts:
+        return []
     model = get_model()
-    return model.encode(text).tolist()
+
+    if _cache is None:
+        return model.encode(texts, batch_size=batch_size).tolist()
+
+    keys = [cache_key(_model_id, text) for text in texts]
+    vectors = _cache.get_many(set(keys))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in missing:
+            missing[key] = text
+
+    if missing:
+        encoded = model.encode(list(missing.values()), batch_size=batch_size)
+        new = dict(zip(missing.keys(), encoded))
+        _cache.put_many(new)
+        vectors.update(new)
+
+    return [vectors[key].tolist() for key in keys]
+
+
+_query_batcher = EmbeddingBatcher(
+    lambda texts: embed_texts(texts),
+    max_batch=EMBED_QUERY_MAX_BATCH,
+    max_wait_ms=EMBED_QUERY_MAX_WAIT_MS
+)
+
+def get_query_batcher() -> EmbeddingBatcher:
+    return _query_batcher
+
+def embed_query(text: str):
+    """Embed a chat query, micro-batched with concurrent queries when enabled"""
+    if EMBED_QUERY_BATCHING:
+        return _query_batcher.embed(text)
+    return embed_text(text)
+
+# Keeps CPU-bound encodes off the event loop and out of the shared threadpool
+_embed_executor = ThreadPoolExecutor(max_workers=EMBED_EXECUTOR_WORKERS, thread_name_prefix="embed")
+
+async def aembed_query(text: str):
+    """embed_query for async code: awaits the batcher or the embedding executor"""
+    if EMBED_QUERY_BATCHING:
+        return await asyncio.wrap_future(_query_batcher.submit(text))
+    return await asyncio.get_running_loop().run_in_executor(_embed_executor, embed_text, text)
+
+async def aembed_texts(texts: list[str]):
+    """embed_texts for async code: one batched encode on the embedding executor"""
+    return await asyncio.get_running_loop().run_in_executor(_embed_executor, embed_texts, texts)
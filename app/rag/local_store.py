@@ -0,0 +1,359 @@
+"""
+In-process vector engine for small tenants.
+
+Each tenant's vectors live in <LOCAL_VECTOR_DIR>/<api_key_id>/ as a few
+immutable segments: a .npy matrix of unit-normalized rows (float32, or
+float16 to halve memory) that is memory-mapped, plus a JSON list of point
+ids and payloads. A search is one matrix-vector product per segment and an
+argpartition: for a few thousand chunks that is far cheaper than a network
+round trip.
+
+Writes happen under an exclusive file lock and are published by atomically
+replacing manifest.json (the list of live segments), so other worker
+processes see either the old or the new version. Adding points writes them
+as a new segment, merged with the newest segments while those are no
+larger (like a binary counter), so an ingest writes each row O(log n)
+times rather than rewriting the tenant per batch. Replacing, repointing or
+deleting points compacts the tenant into one segment. Readers reload a
+tenant when its manifest changes, reading only segments they don't have
+yet. LOCAL_VECTOR_DIR must be shared by every API worker.
+"""
+import bisect
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+from app.core.config import LOCAL_VECTOR_DIR, LOCAL_VECTOR_DTYPE
+from app.rag.vector_store import VectorStore, VectorPoint, SearchHit
+
+MANIFEST = "manifest.json"
+# Rows converted to float32 at a time when scoring a float16 matrix
+SCORE_BLOCK_ROWS = 8192
+
+
+@dataclass
+class _Segment:
+    name: str
+    ids: list
+    payloads: list
+    matrix: np.ndarray
+
+
+@dataclass
+class _Snapshot:
+    token: tuple
+    segments: list
+    ids: list  # every segment's, in order
+    payloads: list
+    starts: list  # index of each segment's first row
+
+    def row(self, i: int) -> np.ndarray:
+        index = bisect.bisect_right(self.starts, i) - 1
+        return self.segments[index].matrix[i - self.starts[index]]
+
+
+def _snapshot(token: tuple, segments: list) -> _Snapshot:
+    starts, total = [], 0
+    for segment in segments:
+        starts.append(total)
+        total += len(segment.ids)
+    return _Snapshot(
+        token=token,
+        segments=segments,
+        ids=[point_id for segment in segments for point_id in segment.ids],
+        payloads=[payload for segment in segments for payload in segment.payloads],
+        starts=starts
+    )
+
+
+def _score(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    if matrix.dtype == np.float32 or not len(matrix):
+        return np.asarray(matrix, dtype=np.float32) @ queries
+    return np.concatenate([
+        matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ queries
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS)
+    ])
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorStore(VectorStore):
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_VECTOR_DIR, dtype: str = LOCAL_VECTOR_DTYPE):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        self._snapshots: dict[int, _Snapshot] = {}
+        self._lock = threading.Lock()
+        self._tenant_locks: dict[int, threading.Lock] = {}
+
+    def _dir(self, api_key_id: int) -> str:
+        return os.path.join(self.root, str(int(api_key_id)))
+
+    # ---- reading ----
+
+    def _load(self, api_key_id: int) -> Optional[_Snapshot]:
+        directory = self._dir(api_key_id)
+        for _ in range(3):
+            try:
+                st = os.stat(os.path.join(directory, MANIFEST))
+            except FileNotFoundError:
+                with self._lock:
+                    self._snapshots.pop(api_key_id, None)
+                return None
+
+            token = (st.st_ino, st.st_mtime_ns, st.st_size)
+            with self._lock:
+                snapshot = self._snapshots.get(api_key_id)
+            if snapshot is not None and snapshot.token == token:
+                return snapshot
+
+            # Segments never change once written: keep the ones already loaded
+            known = {segment.name: segment for segment in snapshot.segments} if snapshot else {}
+            try:
+                with open(os.path.join(directory, MANIFEST)) as f:
+                    manifest = json.load(f)
+                names = manifest.get("segments") or [manifest["version"]]
+                segments = [known.get(name) or self._load_segment(directory, name) for name in names]
+            except FileNotFoundError:
+                continue  # a writer replaced this version meanwhile; read the new one
+
+            snapshot = _snapshot(token, segments)
+            with self._lock:
+                self._snapshots[api_key_id] = snapshot
+            return snapshot
+        raise RuntimeError(f"Local vector store for API key {api_key_id} kept changing while loading")
+
+    @staticmethod
+    def _load_segment(directory: str, name: str) -> _Segment:
+        matrix = np.load(os.path.join(directory, f"vectors-{name}.npy"), mmap_mode="r")
+        with open(os.path.join(directory, f"points-{name}.json")) as f:
+            points = json.load(f)
+        return _Segment(
+            name=name,
+            ids=[point["id"] for point in points],
+            payloads=[point["payload"] for point in points],
+            matrix=matrix
+        )
+
+    def search(self, api_key_id: int, vector: list[float], limit: int) -> list[SearchHit]:
+        return self.search_batch(api_key_id, [vector], limit)[0]
+
+    def search_batch(self, api_key_id: int, vectors: list[list[float]], limit: int) -> list[list[SearchHit]]:
+        snapshot = self._load(api_key_id)
+        if snapshot is None or not snapshot.ids:
+            return [[] for _ in vectors]
+
+        # One (chunks x queries) product per segment scores the whole batch
+        queries = _unit_rows(vectors).T
+        scores = np.concatenate([_score(segment.matrix, queries) for segment in snapshot.segments])
+
+        k = min(limit, len(scores))
+        results = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top], kind="stable")]
+            results.append([
+                SearchHit(
+                    id=snapshot.ids[i],
+                    score=float(column[i]),
+                    payload=snapshot.payloads[i],
+                    vector=np.asarray(snapshot.row(i), dtype=np.float32)
+                )
+                for i in top
+            ])
+        return results
+
+    def count(self, api_key_id: int) -> int:
+        snapshot = self._load(api_key_id)
+        return len(snapshot.ids) if snapshot else 0
+
+    def api_key_ids(self) -> set[int]:
+        if not os.path.isdir(self.root):
+            return set()
+        return {int(name) for name in os.listdir(self.root) if name.isdigit() and self.count(int(name))}
+
+    def export(self, api_key_id: int, batch_size: int = 256) -> Iterator[list[VectorPoint]]:
+        snapshot = self._load(api_key_id)
+        if snapshot is None:
+            return
+        for segment in snapshot.segments:
+            for start in range(0, len(segment.ids), batch_size):
+                rows = np.asarray(segment.matrix[start:start + batch_size], dtype=np.float32)
+                yield [
+                    VectorPoint(id=point_id, vector=row.tolist(), payload=payload)
+                    for point_id, row, payload in zip(
+                        segment.ids[start:start + batch_size],
+                        rows,
+                        segment.payloads[start:start + batch_size]
+                    )
+                ]
+
+    # ---- writing ----
+
+    @contextmanager
+    def _exclusive(self, api_key_id: int):
+        """Serialize writers to one tenant, across threads and processes"""
+        with self._lock:
+            tenant_lock = self._tenant_locks.setdefault(api_key_id, threading.Lock())
+        directory = self._dir(api_key_id)
+        os.makedirs(directory, exist_ok=True)
+        with tenant_lock, open(os.path.join(directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current(self, api_key_id: int) -> tuple[list, list, np.ndarray]:
+        snapshot = self._load(api_key_id)
+        if snapshot is None or not snapshot.segments:
+            return [], [], np.zeros((0, 0), dtype=np.float32)
+        # A copy: the segments are read-only memory maps, and upserts replace rows in place
+        matrix = np.concatenate([np.asarray(segment.matrix, dtype=np.float32) for segment in snapshot.segments])
+        return list(snapshot.ids), list(snapshot.payloads), matrix
+
+    def _publish(self, api_key_id: int, kept: list, segment: _Segment):
+        """Write a new segment and make the manifest list `kept` + it; drop unlisted files"""
+        directory = self._dir(api_key_id)
+        np.save(os.path.join(directory, f"vectors-{segment.name}.npy"), segment.matrix.astype(self.dtype))
+        with open(os.path.join(directory, f"points-{segment.name}.json"), "w") as f:
+            json.dump([{"id": i, "payload": p} for i, p in zip(segment.ids, segment.payloads)], f)
+
+        names = [s.name for s in kept] + [segment.name]
+        tmp = os.path.join(directory, f"{MANIFEST}.{segment.name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "segments": names,
+                "count": sum(len(s.ids) for s in kept) + len(segment.ids),
+                "dtype": self.dtype.name
+            }, f)
+        os.replace(tmp, os.path.join(directory, MANIFEST))
+
+        live = {f"{prefix}-{name}.{ext}" for name in names for prefix, ext in (("vectors", "npy"), ("points", "json"))}
+        for name in os.listdir(directory):
+            if name.startswith(("vectors-", "points-")) and name not in live:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _write(self, api_key_id: int, ids: list, payloads: list, matrix: np.ndarray):
+        """Compact the tenant into a single segment"""
+        self._publish(api_key_id, [], _Segment(uuid.uuid4().hex, ids, payloads, matrix))
+
+    def _append(self, api_key_id: int, snapshot: Optional[_Snapshot], ids: list, payloads: list, rows: np.ndarray):
+        """Add new points as a segment, merging in the newest segments no larger than it"""
+        kept = list(snapshot.segments) if snapshot else []
+        merged = [_Segment("", ids, payloads, rows.astype(self.dtype))]
+        while kept and len(kept[-1].ids) <= sum(len(s.ids) for s in merged):
+            merged.insert(0, kept.pop())
+        self._publish(api_key_id, kept, _Segment(
+            name=uuid.uuid4().hex,
+            ids=[point_id for s in merged for point_id in s.ids],
+            payloads=[payload for s in merged for payload in s.payloads],
+            matrix=np.concatenate([np.asarray(s.matrix, dtype=self.dtype) for s in merged])
+        ))
+
+    def upsert(self, api_key_id: int, points: list[VectorPoint]) -> None:
+        if not points:
+            return
+        with self._exclusive(api_key_id):
+            snapshot = self._load(api_key_id)
+            existing = set(snapshot.ids) if snapshot else set()
+            rows = _unit_rows([point.vector for point in points])
+
+            if not any(point.id in existing for point in points):
+                # Only new points (an ingest): append, leaving stored rows alone
+                latest = {point.id: (point, row) for point, row in zip(points, rows)}
+                self._append(
+                    api_key_id,
+                    snapshot,
+                    list(latest),
+                    [{**point.payload, "api_key_id": api_key_id} for point, _ in latest.values()],
+                    np.stack([row for _, row in latest.values()])
+                )
+                return
+
+            ids, payloads, matrix = self._current(api_key_id)
+            if matrix.size == 0:
+                matrix = np.zeros((0, rows.shape[1]), dtype=np.float32)
+
+            index = {point_id: i for i, point_id in enumerate(ids)}
+            new_rows = []
+            for point, row in zip(points, rows):
+                payload = {**point.payload, "api_key_id": api_key_id}
+                if point.id in index:
+                    if index[point.id] < len(matrix):
+                        matrix[index[point.id]] = row
+                    else:
+                        new_rows[index[point.id] - len(matrix)] = row
+                    payloads[index[point.id]] = payload
+                else:
+                    index[point.id] = len(ids)
+                    ids.append(point.id)
+                    payloads.append(payload)
+                    new_rows.append(row)
+
+            if new_rows:
+                matrix = np.vstack([matrix, np.stack(new_rows)])
+            self._write(api_key_id, ids, payloads, matrix)
+
+    def delete_document(self, api_key_id: int, document_id: int) -> None:
+        self.delete_documents(api_key_id, [document_id])
+
+    def delete_documents(self, api_key_id: int, document_ids: list[int]) -> None:
+        if not os.path.isdir(self._dir(api_key_id)):
+            return
+        document_ids = set(document_ids)
+        with self._exclusive(api_key_id):
+            ids, payloads, matrix = self._current(api_key_id)
+            keep = [i for i, payload in enumerate(payloads) if payload.get("document_id") not in document_ids]
+            if len(keep) == len(ids):
+                return
+            self._write(
+                api_key_id,
+                [ids[i] for i in keep],
+                [payloads[i] for i in keep],
+                matrix[keep] if keep else matrix[:0]
+            )
+
+    def set_document(self, api_key_id: int, point_ids: list[str], document_id: int) -> None:
+        if not os.path.isdir(self._dir(api_key_id)):
+            return
+        point_ids = set(point_ids)
+        with self._exclusive(api_key_id):
+            ids, payloads, matrix = self._current(api_key_id)
+            moved = [i for i, point_id in enumerate(ids) if point_id in point_ids]
+            if not moved:
+                return
+            for i in moved:
+                payloads[i] = {**payloads[i], "document_id": document_id}
+            self._write(api_key_id, ids, payloads, matrix)
+
+    def delete_api_key(self, api_key_id: int) -> None:
+        directory = self._dir(api_key_id)
+        if not os.path.isdir(directory):
+            return
+        with self._exclusive(api_key_id):
+            for name in os.listdir(directory):
+                if name != ".lock":
+                    os.remove(os.path.join(directory, name))
+        shutil.rmtree(directory, ignore_errors=True)
+        with self._lock:
+            self._snapshots.pop(api_key_id, None)
@@ -1,3 +1,114 @@
+"""
+Prompt assembly.
+
+Retrieval over-fetches candidate chunks (with scores and stored vectors);
+select_context() keeps a diverse, relevant subset that fits a token budget
+using maximal marginal relevance, so overlapping chunks don't repeat the
+same passage in the prompt. Only the chunks it keeps have their text loaded
+from the chunk store. Tokens are estimated as chars / 4, the same estimate
+quota accounting uses.
+"""
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import CONTEXT_DUPLICATE_THRESHOLD, CONTEXT_MAX_CHUNKS, CONTEXT_MMR_LAMBDA
+from app.core.usage import approx_tokens_from_chars
+from app.rag.retrieve import RetrievedChunk, awith_texts, with_texts
+
+
+@dataclass(frozen=True)
+class Prompt:
+    text: str
+    tokens: int
+    chunks: list[RetrievedChunk]  # the context actually used, in prompt order
+
+
+def _unit(vector) -> Optional[np.ndarray]:
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def _trim(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at a word boundary"""
+    cut = text[:max_chars]
+    if len(cut) < len(text) and " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut
+
+
+def select_context(
+    chunks: list[RetrievedChunk],
+    budget_tokens: int,
+    max_chunks: int = CONTEXT_MAX_CHUNKS,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD
+) -> list[RetrievedChunk]:
+    """Pick up to max_chunks chunks by MMR within budget_tokens.
+
+    Each step takes the candidate maximising
+    mmr_lambda * score - (1 - mmr_lambda) * (max cosine to the chunks already
+    picked). Candidates nearly identical to a picked chunk are dropped, and
+    ones that no longer fit the budget are skipped in favour of shorter ones.
+    If even the best chunk is over budget, it is trimmed to fit.
+    """
+    units = [_unit(chunk.vector) for chunk in chunks]
+    remaining = list(range(len(chunks)))
+    selected, picked, used = [], [], 0
+
+    while remaining and len(selected) < max_chunks:
+        def redundancy(i: int) -> float:
+            if units[i] is None or not picked:
+                return 0.0
+            return max(float(units[i] @ unit) for unit in picked)
+
+        best = max(remaining, key=lambda i: mmr_lambda * chunks[i].score - (1 - mmr_lambda) * redundancy(i))
+        remaining.remove(best)
+        if redundancy(best) >= duplicate_threshold:
+            continue
+
+        chunk = chunks[best]
+        cost = approx_tokens_from_chars(chunk.length)
+        if used + cost > budget_tokens:
+            if selected:
+                continue
+            max_chars = budget_tokens * 4
+            text = _trim(chunk.text, max_chars) if chunk.text is not None else None
+            chunk = replace(chunk, text=text, chars=max_chars)
+            cost = budget_tokens
+
+        selected.append(chunk)
+        if units[best] is not None:
+            picked.append(units[best])
+        used += cost
+    return selected
+
+
+def _build(context: list[RetrievedChunk], question: str) -> Prompt:
+    # A chunk trimmed to the budget before its text was loaded is cut now
+    context = [
+        replace(chunk, text=_trim(chunk.text, chunk.chars))
+        if chunk.chars is not None and len(chunk.text) > chunk.chars else chunk
+        for chunk in context
+    ]
+    text = build_prompt([chunk.text for chunk in context], question)
+    return Prompt(text=text, tokens=approx_tokens_from_chars(len(text)), chunks=context)
+
+
+def assemble_prompt(chunks: list[RetrievedChunk], question: str, budget_tokens: int) -> Prompt:
+    """Select context from retrieval candidates and build the prompt around it"""
+    return _build(with_texts(select_context(chunks, budget_tokens)), question)
+
+
+async def aassemble_prompt(chunks: list[RetrievedChunk], question: str, budget_tokens: int) -> Prompt:
+    """assemble_prompt for async code (the chunk store is read in the threadpool)"""
+    return _build(await awith_texts(select_context(chunks, budget_tokens)), question)
+
+
 def build_prompt(context: list[str], question: str) -> str:
     context_text = "\n".join(context)
 
@@ -0,0 +1,300 @@
+"""
+Deferred, batched vector deletion.
+
+Deleting a document, API key or user is a SQL-only change inside the
+request: the rows (documents, fingerprints, chunk texts, keys) go away and a
+VectorPurge row records which vectors are left to delete. Retrieval never
+serves a chunk whose text (or, for legacy points, document row) is gone (see
+retrieve.with_texts), so the content disappears at once even though its
+vectors are still stored.
+
+Deduplication lets a document refer to chunks stored by another one (see
+ingest.jobs.dedup_chunks). Deleting the owner hands such chunks over to a
+document still referring to them instead: their texts move at once, and the
+purge records the handover so the purger repoints their vectors before it
+deletes the rest.
+
+A background VectorPurger then deletes the vectors: due purges are grouped
+per tenant into one filter-delete, and a failing backend is retried with
+exponential backoff instead of failing the request. Purges are idempotent,
+so several processes can run purgers against the same table.
+
+reconcile() finds vectors whose document no longer exists (e.g. from before
+this queue, or a crash mid-ingest) and queues them as well.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func
+
+from app.core.config import (
+    PURGE_BATCH_SIZE,
+    PURGE_INTERVAL_SECONDS,
+    PURGE_RETRY_BASE_SECONDS,
+    PURGE_RETRY_MAX_SECONDS,
+)
+from app.db.base import SessionLocal
+from app.db.models import APIKey, ChunkFingerprint, ChunkText, Document, VectorPurge
+from app.rag.vector_store import default_backend, get_vector_store, rebalance, tenant_lock
+
+logger = logging.getLogger(__name__)
+
+
+# ---- tombstoning (inside the request's transaction) ----
+
+def tombstone_document(db, api_key: APIKey, document: Document) -> None:
+    """Delete a document's rows and queue its vectors; the caller commits.
+
+    Call under tenant_lock(api_key.id), so an ingest can't start referring
+    to the document's chunks while they are being handed over.
+    """
+    # Chunks other documents refer to go to the oldest of them
+    handover = dict(
+        db.query(ChunkFingerprint.chunk_id, func.min(ChunkFingerprint.document_id))
+        .filter(
+            ChunkFingerprint.api_key_id == api_key.id,
+            ChunkFingerprint.document_id != document.id,
+            ChunkFingerprint.chunk_id.in_(
+                db.query(ChunkText.id).filter(ChunkText.document_id == document.id)
+            )
+        )
+        .group_by(ChunkFingerprint.chunk_id)
+    )
+    for heir in set(handover.values()):
+        db.query(ChunkText).filter(
+            ChunkText.id.in_([point_id for point_id, owner in handover.items() if owner == heir])
+        ).update({ChunkText.document_id: heir}, synchronize_session=False)
+
+    db.add(VectorPurge(
+        api_key_id=api_key.id,
+        document_id=document.id,
+        backend=api_key.vector_backend or default_backend(),
+        handover=handover or None
+    ))
+    db.query(ChunkText).filter(ChunkText.document_id == document.id).delete()
+    db.query(ChunkFingerprint).filter(ChunkFingerprint.document_id == document.id).delete()
+    db.delete(document)
+
+
+def tombstone_api_key(db, api_key: APIKey) -> None:
+    """Delete an API key with all its documents and queue its vectors; the caller commits"""
+    db.add(VectorPurge(api_key_id=api_key.id, backend=api_key.vector_backend or default_backend()))
+    db.query(ChunkText).filter(ChunkText.api_key_id == api_key.id).delete()
+    db.query(ChunkFingerprint).filter(ChunkFingerprint.api_key_id == api_key.id).delete()
+    db.query(Document).filter(Document.api_key_id == api_key.id).delete()
+    db.delete(api_key)
+
+
+# ---- purging ----
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(PURGE_RETRY_MAX_SECONDS, PURGE_RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+def _purge_tenant(db, api_key_id: int, backend: str, purges: list[VectorPurge]) -> None:
+    store = get_vector_store(backend)
+    if any(purge.document_id is None for purge in purges):
+        store.delete_api_key(api_key_id)
+        return
+
+    # Repoint handed-over chunks first (later handovers win); a chunk whose
+    # heir has been deleted since is deleted along with its old document
+    handover: dict[str, int] = {}
+    for purge in sorted(purges, key=lambda purge: purge.id):
+        handover.update(purge.handover or {})
+    live = {
+        document_id
+        for (document_id,) in db.query(Document.id).filter(Document.id.in_(set(handover.values())))
+    } if handover else set()
+    heirs: dict[int, list[str]] = {}
+    for point_id, heir in handover.items():
+        if heir in live:
+            heirs.setdefault(heir, []).append(point_id)
+    for heir, point_ids in sorted(heirs.items()):
+        store.set_document(api_key_id, point_ids, heir)
+
+    store.delete_documents(api_key_id, sorted({purge.document_id for purge in purges}))
+
+
+def purge_pending(limit: int = PURGE_BATCH_SIZE) -> int:
+    """Run the purges that are due (one delete per tenant); returns how many completed"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        due = (
+            db.query(VectorPurge)
+            .filter(VectorPurge.next_attempt_at <= now)
+            .order_by(VectorPurge.next_attempt_at)
+            .limit(limit)
+            .all()
+        )
+        if not due:
+            return 0
+
+        # A tenant moved since the delete holds its vectors in its current backend
+        keys = {
+            key.id: key
+            for key in db.query(APIKey).filter(APIKey.id.in_({purge.api_key_id for purge in due}))
+        }
+        groups: dict[tuple[int, str], list[VectorPurge]] = {}
+        for purge in due:
+            key = keys.get(purge.api_key_id)
+            backend = (key.vector_backend or default_backend()) if key else purge.backend
+            groups.setdefault((purge.api_key_id, backend), []).append(purge)
+
+        completed = 0
+        for (api_key_id, backend), purges in groups.items():
+            try:
+                # Not while the tenant is being moved; re-read where it lives once that's done
+                with tenant_lock(api_key_id):
+                    if api_key_id in keys:
+                        db.refresh(keys[api_key_id])
+                        backend = keys[api_key_id].vector_backend or default_backend()
+                    _purge_tenant(db, api_key_id, backend, purges)
+            except Exception as e:
+                logger.warning("Vector purge for API key %s on %s failed: %s", api_key_id, backend, e)
+                for purge in purges:
+                    purge.attempts += 1
+                    purge.next_attempt_at = now + _backoff(purge.attempts)
+                    purge.last_error = str(e)[:500]
+                db.commit()
+                continue
+
+            for purge in purges:
+                db.delete(purge)
+            db.commit()
+            completed += len(purges)
+
+            # A tenant that shrank may now fit the in-process engine
+            if api_key_id in keys:
+                rebalance(db, keys[api_key_id])
+        return completed
+    finally:
+        db.close()
+
+
+def purge_stats() -> dict:
+    db = SessionLocal()
+    try:
+        pending, retrying, oldest = db.query(
+            func.count(VectorPurge.id),
+            func.coalesce(func.sum(case((VectorPurge.attempts > 0, 1), else_=0)), 0),
+            func.min(VectorPurge.created_at)
+        ).one()
+    finally:
+        db.close()
+    return {
+        "pending": pending,
+        "retrying": retrying,
+        "oldest": oldest.isoformat() if oldest else None,
+        **_purger.stats(),
+    }
+
+
+class VectorPurger:
+    """Background thread that runs purge_pending() on an interval, or when woken"""
+
+    def __init__(self, interval: float = PURGE_INTERVAL_SECONDS, batch_size: int = PURGE_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.passes = 0
+        self.purged = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="vector-purger", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        """Purge now rather than at the next interval (no-op until started)"""
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return {"running": self._thread is not None, "passes": self.passes, "purged": self.purged}
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                completed = purge_pending(self.batch_size)
+            except Exception:
+                logger.exception("Vector purge pass failed")
+                completed = 0
+            self.passes += 1
+            self.purged += completed
+            # A full batch means more may be due: go again straight away
+            if completed < self.batch_size:
+                self._wake.wait(self.interval)
+
+
+_purger = VectorPurger()
+
+
+def get_purger() -> VectorPurger:
+    return _purger
+
+
+# ---- reconciliation ----
+
+def reconcile(backend: str, dry_run: bool = False) -> dict[int, Optional[list[int]]]:
+    """Queue purges for vectors in a backend whose document or API key is gone.
+
+    Returns {api_key_id: orphaned document ids}, with None for a deleted
+    key (all its vectors). Documents still being ingested have their row
+    already, so they are never mistaken for orphans. Scans every vector.
+    """
+    store = get_vector_store(backend)
+    db = SessionLocal()
+    try:
+        queued = {
+            (api_key_id, document_id)
+            for api_key_id, document_id in db.query(VectorPurge.api_key_id, VectorPurge.document_id)
+        }
+        live_keys = {key_id for (key_id,) in db.query(APIKey.id)}
+
+        orphans: dict[int, Optional[list[int]]] = {}
+        for api_key_id in sorted(store.api_key_ids()):
+            if api_key_id not in live_keys:
+                if (api_key_id, None) not in queued:
+                    orphans[api_key_id] = None
+                continue
+            stored = {
+                point.payload.get("document_id")
+                for batch in store.export(api_key_id)
+                for point in batch
+            }
+            live = {
+                document_id
+                for (document_id,) in db.query(Document.id).filter(Document.api_key_id == api_key_id)
+            }
+            missing = sorted(
+                document_id for document_id in stored - live
+                if document_id is not None and (api_key_id, document_id) not in queued
+            )
+            if missing:
+                orphans[api_key_id] = missing
+
+        if not dry_run:
+            for api_key_id, document_ids in orphans.items():
+                db.add_all(
+                    [VectorPurge(api_key_id=api_key_id, backend=backend)] if document_ids is None else
+                    [VectorPurge(api_key_id=api_key_id, document_id=d, backend=backend) for d in document_ids]
+                )
+            db.commit()
+        return orphans
+    finally:
+        db.close()
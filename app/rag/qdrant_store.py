@@ -0,0 +1,165 @@
+from typing import Iterator, Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchAny, MatchValue, QueryRequest
+
+from app.db.qdrant import qdrant, async_qdrant
+from app.db.qdrant_collection import COLLECTION_NAME, CollectionProfile, get_profile, search_params
+from app.rag.vector_store import VectorStore, VectorPoint, SearchHit
+
+
+def _match(**fields) -> Filter:
+    return Filter(
+        must=[FieldCondition(key=key, match=MatchValue(value=value)) for key, value in fields.items()]
+    )
+
+
+class QdrantVectorStore(VectorStore):
+    """All tenants in one Qdrant collection, isolated by an api_key_id payload filter"""
+
+    name = "qdrant"
+
+    def __init__(
+        self,
+        client: Optional[QdrantClient] = None,
+        collection_name: str = COLLECTION_NAME,
+        async_client: Optional[AsyncQdrantClient] = None,
+        profile: Optional[CollectionProfile] = None,
+    ):
+        self.client = client or qdrant
+        # The shared async client only talks to the same server as the shared sync one
+        self.async_client = async_client or (async_qdrant if client is None else None)
+        self.collection_name = collection_name
+        # Searches carry the profile's rescoring / beam width settings
+        self.search_params = search_params(profile or get_profile())
+
+    def upsert(self, api_key_id: int, points: list[VectorPoint]) -> None:
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                PointStruct(
+                    id=point.id,
+                    vector=list(point.vector),
+                    payload={**point.payload, "api_key_id": api_key_id}
+                )
+                for point in points
+            ]
+        )
+
+    def _query(self, api_key_id: int, vector: list[float], limit: int) -> dict:
+        return dict(
+            collection_name=self.collection_name,
+            query=list(vector),
+            limit=limit,
+            with_payload=True,
+            with_vectors=True,
+            query_filter=_match(api_key_id=api_key_id),
+            search_params=self.search_params
+        )
+
+    def search(self, api_key_id: int, vector: list[float], limit: int) -> list[SearchHit]:
+        results = self.client.query_points(**self._query(api_key_id, vector, limit))
+        return [SearchHit(id=str(point.id), score=point.score, payload=point.payload, vector=point.vector) for point in results.points]
+
+    async def asearch(self, api_key_id: int, vector: list[float], limit: int) -> list[SearchHit]:
+        if self.async_client is None:
+            return await super().asearch(api_key_id, vector, limit)
+        results = await self.async_client.query_points(**self._query(api_key_id, vector, limit))
+        return [SearchHit(id=str(point.id), score=point.score, payload=point.payload, vector=point.vector) for point in results.points]
+
+    def _requests(self, api_key_id: int, vectors: list[list[float]], limit: int) -> list[QueryRequest]:
+        tenant = _match(api_key_id=api_key_id)
+        return [
+            QueryRequest(
+                query=list(vector), limit=limit, filter=tenant, with_payload=True, with_vector=True,
+                params=self.search_params
+            )
+            for vector in vectors
+        ]
+
+    def search_batch(self, api_key_id: int, vectors: list[list[float]], limit: int) -> list[list[SearchHit]]:
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._requests(api_key_id, vectors, limit)
+        )
+        return [
+            [SearchHit(id=str(point.id), score=point.score, payload=point.payload, vector=point.vector) for point in response.points]
+            for response in responses
+        ]
+
+    async def asearch_batch(self, api_key_id: int, vectors: list[list[float]], limit: int) -> list[list[SearchHit]]:
+        if self.async_client is None:
+            return await super().asearch_batch(api_key_id, vectors, limit)
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._requests(api_key_id, vectors, limit)
+        )
+        return [
+            [SearchHit(id=str(point.id), score=point.score, payload=point.payload, vector=point.vector) for point in response.points]
+            for response in responses
+        ]
+
+    def delete_document(self, api_key_id: int, document_id: int) -> None:
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=_match(api_key_id=api_key_id, document_id=document_id)
+        )
+
+    def delete_documents(self, api_key_id: int, document_ids: list[int]) -> None:
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=Filter(must=[
+                FieldCondition(key="api_key_id", match=MatchValue(value=api_key_id)),
+                FieldCondition(key="document_id", match=MatchAny(any=list(document_ids))),
+            ])
+        )
+
+    def delete_api_key(self, api_key_id: int) -> None:
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=_match(api_key_id=api_key_id)
+        )
+
+    def set_document(self, api_key_id: int, point_ids: list[str], document_id: int) -> None:
+        self.client.set_payload(
+            collection_name=self.collection_name,
+            payload={"document_id": document_id},
+            points=list(point_ids)
+        )
+
+    def count(self, api_key_id: int) -> int:
+        return self.client.count(
+            collection_name=self.collection_name,
+            count_filter=_match(api_key_id=api_key_id),
+            exact=True
+        ).count
+
+    def export(self, api_key_id: int, batch_size: int = 256) -> Iterator[list[VectorPoint]]:
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=_match(api_key_id=api_key_id),
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if records:
+                yield [VectorPoint(id=str(r.id), vector=r.vector, payload=r.payload) for r in records]
+            if offset is None:
+                return
+
+    def api_key_ids(self) -> set[int]:
+        found, offset = set(), None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1024,
+                offset=offset,
+                with_payload=["api_key_id"],
+                with_vectors=False
+            )
+            found.update(r.payload["api_key_id"] for r in records if "api_key_id" in r.payload)
+            if offset is None:
+                return found
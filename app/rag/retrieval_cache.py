@@ -0,0 +1,89 @@
+"""
+Per-tenant retrieval result cache.
+
+Widget traffic is dominated by a few hundred repeated questions per tenant,
+so retrieve_text results are cached by (api_key_id, normalized query,
+limit) in a bounded TTL + LRU map. Each API key has a generation counter
+that is part of the key; ingesting or deleting documents bumps it, so stale
+entries are never served and simply age out of the LRU.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.rag.embedding_cache import normalize_text
+
+
+class RetrievalCache:
+    def __init__(self, max_items: int, ttl_seconds: float):
+        self.max_items = max_items
+        self.ttl = ttl_seconds
+        self._lru: "OrderedDict[tuple, tuple[float, list]]" = OrderedDict()
+        self._generations: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, api_key_id: int) -> int:
+        with self._lock:
+            return self._generations.get(api_key_id, 0)
+
+    def bump(self, api_key_id: int):
+        """Invalidate every cached result for this API key"""
+        with self._lock:
+            self._generations[api_key_id] = self._generations.get(api_key_id, 0) + 1
+            self.invalidations += 1
+
+    def _key(self, api_key_id: int, query: str, limit: int, generation: int) -> tuple:
+        return api_key_id, generation, normalize_text(query), limit
+
+    def get(self, api_key_id: int, query: str, limit: int) -> Optional[list]:
+        with self._lock:
+            key = self._key(api_key_id, query, limit, self._generations.get(api_key_id, 0))
+            entry = self._lru.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._lru[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, api_key_id: int, query: str, limit: int, results: list, generation: int):
+        """Store results computed while the key was at `generation`"""
+        with self._lock:
+            if generation != self._generations.get(api_key_id, 0):
+                return  # documents changed while retrieving
+            key = self._key(api_key_id, query, limit, generation)
+            self._lru[key] = (time.monotonic() + self.ttl, list(results))
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._lru),
+                "max_items": self.max_items,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -1,26 +1,194 @@
-from app.db.qdrant import qdrant
-from app.rag.embeddings import embed_text
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from dataclasses import dataclass, field, replace
+from typing import Optional
 
-COLLECTION_NAME = "chatbot_docs"
+import numpy as np
+from starlette.concurrency import run_in_threadpool
 
-def retrieve_text(query: str, api_key_id: int, limit: int = 3):
-    """Retrieve relevant text chunks for a specific API key's knowledge base"""
-    query_vector = embed_text(query)
-
-    results = qdrant.query_points(
-        collection_name=COLLECTION_NAME,
-        query=query_vector,
-        limit=limit,
-        with_payload=True,
-        query_filter=Filter(
-            must=[
-                FieldCondition(
-                    key="api_key_id",
-                    match=MatchValue(value=api_key_id)
-                )
-            ]
-        )
+from app.core.config import (
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_PER_KEY,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+from app.rag.answer_cache import SemanticAnswerCache
+from app.rag.chunk_store import aload_chunks, load_chunks
+from app.rag.embeddings import aembed_query, embed_query
+from app.rag.retrieval_cache import RetrievalCache
+from app.rag.vector_store import SearchHit, VectorStore, vector_store_for_id
+
+
+@dataclass(frozen=True)
+class RetrievedChunk:
+    id: str
+    # None until loaded from the chunk store (see with_texts)
+    text: Optional[str]
+    score: float
+    # float32 copy of the stored vector (None if the backend returned none)
+    vector: Optional[np.ndarray] = field(default=None, compare=False, repr=False)
+    # Text length, known from the payload before the text is loaded
+    chars: Optional[int] = None
+    document_id: Optional[int] = None
+
+    @property
+    def length(self) -> int:
+        return len(self.text) if self.text is not None else self.chars or 0
+
+
+def _chunk(hit: SearchHit) -> RetrievedChunk:
+    vector = None if hit.vector is None else np.asarray(hit.vector, dtype=np.float32)
+    # Points written before the chunk store still carry their text in the payload
+    return RetrievedChunk(
+        id=hit.id,
+        text=hit.payload.get("text"),
+        score=hit.score,
+        vector=vector,
+        chars=hit.payload.get("chars"),
+        document_id=hit.payload.get("document_id")
     )
 
-    return [point.payload["text"] for point in results.points]
+
+def _wanted(chunks: list[RetrievedChunk]) -> tuple[list[str], list[int]]:
+    missing = [chunk.id for chunk in chunks if chunk.text is None]
+    document_ids = [
+        chunk.document_id for chunk in chunks
+        if chunk.text is not None and chunk.document_id is not None
+    ]
+    return missing, document_ids
+
+
+def _fill(chunks: list[RetrievedChunk], texts: dict[str, str], live: set[int]) -> list[RetrievedChunk]:
+    # A deleted document's vectors outlive it until they are purged; drop
+    # chunks whose text is gone. The text of a chunk handed over to another
+    # document stays, while its payload may still name the deleted one, so
+    # only legacy points (text in the payload) are checked by document row.
+    return [
+        replace(chunk, text=texts[chunk.id]) if chunk.text is None else chunk
+        for chunk in chunks
+        if (chunk.id in texts if chunk.text is None else
+            chunk.document_id is None or chunk.document_id in live)
+    ]
+
+
+def with_texts(chunks: list[RetrievedChunk]) -> list[RetrievedChunk]:
+    """Load the text of chunks that don't have it yet, dropping deleted ones (one session)"""
+    if not chunks:
+        return []
+    return _fill(chunks, *load_chunks(*_wanted(chunks)))
+
+
+async def awith_texts(chunks: list[RetrievedChunk]) -> list[RetrievedChunk]:
+    if not chunks:
+        return []
+    return _fill(chunks, *await aload_chunks(*_wanted(chunks)))
+
+
+_cache: Optional[RetrievalCache] = (
+    RetrievalCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_SECONDS) if RETRIEVAL_CACHE_SIZE > 0 else None
+)
+_answer_cache = SemanticAnswerCache(SEMANTIC_CACHE_MAX_PER_KEY, SEMANTIC_CACHE_TTL_SECONDS)
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    return _cache
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    return _answer_cache
+
+
+def invalidate_caches(api_key_id: int):
+    """Call whenever an API key's documents change"""
+    if _cache is not None:
+        _cache.bump(api_key_id)
+    _answer_cache.bump(api_key_id)
+
+
+def retrieve_chunks(
+    query: str,
+    api_key_id: int,
+    limit: int = 3,
+    query_vector: Optional[list[float]] = None,
+    store: Optional[VectorStore] = None
+) -> list[RetrievedChunk]:
+    """Retrieve the best-matching chunks (id, score, vector) for an API key.
+
+    store defaults to the tenant's backend, looked up by api_key_id. Text is
+    not loaded: pass the chunks you keep to with_texts().
+    """
+    if _cache is not None:
+        cached = _cache.get(api_key_id, query, limit)
+        if cached is not None:
+            return cached
+        generation = _cache.generation(api_key_id)
+
+    if query_vector is None:
+        query_vector = embed_query(query)
+
+    hits = (store or vector_store_for_id(api_key_id)).search(api_key_id, query_vector, limit)
+
+    chunks = [_chunk(hit) for hit in hits]
+    if _cache is not None:
+        _cache.put(api_key_id, query, limit, chunks, generation)
+    return chunks
+
+
+async def aretrieve_chunks(
+    query: str,
+    api_key_id: int,
+    limit: int = 3,
+    query_vector: Optional[list[float]] = None,
+    store: Optional[VectorStore] = None
+) -> list[RetrievedChunk]:
+    """retrieve_chunks for async code: nothing here blocks the event loop"""
+    if _cache is not None:
+        cached = _cache.get(api_key_id, query, limit)
+        if cached is not None:
+            return cached
+        generation = _cache.generation(api_key_id)
+
+    if query_vector is None:
+        query_vector = await aembed_query(query)
+    if store is None:
+        store = await run_in_threadpool(vector_store_for_id, api_key_id)
+
+    hits = await store.asearch(api_key_id, query_vector, limit)
+
+    chunks = [_chunk(hit) for hit in hits]
+    if _cache is not None:
+        _cache.put(api_key_id, query, limit, chunks, generation)
+    return chunks
+
+
+async def aretrieve_chunks_batch(
+    queries: list[str],
+    query_vectors: list[list[float]],
+    api_key_id: int,
+    limit: int = 3,
+    store: Optional[VectorStore] = None
+) -> list[list[RetrievedChunk]]:
+    """aretrieve_chunks for many queries of one API key.
+
+    Cache hits are served per query; all misses go to the store in a single
+    batched search.
+    """
+    results: list[Optional[list[RetrievedChunk]]] = [None] * len(queries)
+    if _cache is not None:
+        generation = _cache.generation(api_key_id)
+        for i, query in enumerate(queries):
+            results[i] = _cache.get(api_key_id, query, limit)
+
+    misses = [i for i, chunks in enumerate(results) if chunks is None]
+    if misses:
+        if store is None:
+            store = await run_in_threadpool(vector_store_for_id, api_key_id)
+        batches = await store.asearch_batch(api_key_id, [query_vectors[i] for i in misses], limit)
+        for i, hits in zip(misses, batches):
+            results[i] = [_chunk(hit) for hit in hits]
+            if _cache is not None:
+                _cache.put(api_key_id, queries[i], limit, results[i], generation)
+    return results
+
+
+def retrieve_text(query: str, api_key_id: int, limit: int = 3):
+    """Retrieve relevant text chunks for a specific API key's knowledge base"""
+    return [chunk.text for chunk in with_texts(retrieve_chunks(query, api_key_id, limit))]
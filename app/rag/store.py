@@ -1,56 +1,86 @@
 import uuid
-from app.db.qdrant import qdrant
-from app.rag.embeddings import embed_text
+from typing import Optional
 
-COLLECTION_NAME = "chatbot_docs"
+from app.core.config import EMBED_BATCH_SIZE, QDRANT_UPSERT_BATCH_SIZE
+from app.rag.chunk_store import delete_api_key_texts, delete_document_texts, put_texts
+from app.rag.embeddings import embed_text, embed_texts
+from app.rag.vector_store import VectorStore, VectorPoint, vector_store_for_id
 
-def store_text(text: str, api_key_id: int, document_id: int):
-    """Store text chunk in Qdrant with api_key_id and document_id for isolation"""
+
+def store_text(text: str, api_key_id: int, document_id: int, store: Optional[VectorStore] = None):
+    """Store text chunk with api_key_id and document_id for isolation"""
     vector = embed_text(text)
+    point_id = str(uuid.uuid4())
 
-    qdrant.upsert(
-        collection_name=COLLECTION_NAME,
-        points=[
-            {
-                "id": str(uuid.uuid4()),
-                "vector": vector,
-                "payload": {
-                    "api_key_id": api_key_id,
+    put_texts(api_key_id, document_id, {point_id: text})
+    (store or vector_store_for_id(api_key_id)).upsert(
+        api_key_id,
+        [
+            VectorPoint(
+                id=point_id,
+                vector=vector,
+                payload={
                     "document_id": document_id,
-                    "text": text
+                    "chars": len(text)
                 }
-            }
+            )
         ]
     )
 
-def delete_document_vectors(document_id: int):
-    """Delete all vectors for a specific document"""
-    from qdrant_client.models import Filter, FieldCondition, MatchValue
-    
-    qdrant.delete(
-        collection_name=COLLECTION_NAME,
-        points_selector=Filter(
-            must=[
-                FieldCondition(
-                    key="document_id",
-                    match=MatchValue(value=document_id)
-                )
-            ]
-        )
-    )
+def store_texts(
+    texts: list[str],
+    api_key_id: int,
+    document_id: int,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    upsert_batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+    payloads: Optional[list[dict]] = None,
+    store: Optional[VectorStore] = None,
+    ids: Optional[list[str]] = None,
+) -> int:
+    """Bulk store chunks: batched encode + one upsert per upsert_batch_size chunks.
+
+    payloads, if given, holds extra payload fields for each text (e.g. offsets).
+    ids, if given, are the point ids to use (new random ones otherwise).
+    store defaults to the tenant's backend, looked up by api_key_id.
+    Texts go to the chunk store, written before their vectors so every
+    searchable point has its text.
+    """
+    store = store or vector_store_for_id(api_key_id)
+    stored = 0
 
-def delete_api_key_vectors(api_key_id: int):
-    """Delete all vectors for a specific API key"""
-    from qdrant_client.models import Filter, FieldCondition, MatchValue
-    
-    qdrant.delete(
-        collection_name=COLLECTION_NAME,
-        points_selector=Filter(
-            must=[
-                FieldCondition(
-                    key="api_key_id",
-                    match=MatchValue(value=api_key_id)
+    for start in range(0, len(texts), upsert_batch_size):
+        batch = texts[start:start + upsert_batch_size]
+        extras = payloads[start:start + upsert_batch_size] if payloads else [{}] * len(batch)
+        vectors = embed_texts(batch, batch_size=embed_batch_size)
+        point_ids = ids[start:start + upsert_batch_size] if ids else [str(uuid.uuid4()) for _ in batch]
+
+        put_texts(api_key_id, document_id, dict(zip(point_ids, batch)))
+        store.upsert(
+            api_key_id,
+            [
+                VectorPoint(
+                    id=point_id,
+                    vector=vector,
+                    payload={
+                        **extra,
+                        "document_id": document_id,
+                        "chars": len(text)
+                    }
                 )
+                for point_id, text, vector, extra in zip(point_ids, batch, vectors, extras)
             ]
         )
-    )
+
+        stored += len(batch)
+
+    return stored
+
+def delete_document_vectors(document_id: int, api_key_id: int, store: Optional[VectorStore] = None):
+    """Delete all vectors (and chunk texts) for a specific document"""
+    (store or vector_store_for_id(api_key_id)).delete_document(api_key_id, document_id)
+    delete_document_texts(api_key_id, document_id)
+
+def delete_api_key_vectors(api_key_id: int, store: Optional[VectorStore] = None):
+    """Delete all vectors (and chunk texts) for a specific API key"""
+    (store or vector_store_for_id(api_key_id)).delete_api_key(api_key_id)
+    delete_api_key_texts(api_key_id)
@@ -0,0 +1,231 @@
+"""
+Vector storage behind a common interface.
+
+Two backends implement VectorStore:
+
+- "qdrant": the shared Qdrant collection (network round trip per call)
+- "local":  an in-process brute-force engine over a memory-mapped
+  float32/float16 matrix per tenant (app.rag.local_store)
+
+Each API key records the backend that holds its vectors
+(APIKey.vector_backend). With VECTOR_BACKEND=auto, new tenants start on the
+local engine and rebalance() moves a tenant to Qdrant once its knowledge
+base outgrows LOCAL_VECTOR_MAX_CHUNKS (and back when it shrinks well below).
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import VECTOR_BACKEND, LOCAL_VECTOR_MAX_CHUNKS
+from app.db.base import SessionLocal
+from app.db.models import APIKey, Document, IngestJob
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class VectorPoint:
+    id: str
+    vector: list[float]
+    payload: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    id: str
+    score: float
+    payload: dict
+    # The stored vector, so callers can compare hits without re-embedding them
+    vector: Optional[list[float]] = field(default=None, compare=False, repr=False)
+
+
+class VectorStore(ABC):
+    """Per-tenant vector storage; every call is scoped to one API key"""
+
+    name: str
+
+    @abstractmethod
+    def upsert(self, api_key_id: int, points: list[VectorPoint]) -> None:
+        """Insert or replace points"""
+
+    @abstractmethod
+    def search(self, api_key_id: int, vector: list[float], limit: int) -> list[SearchHit]:
+        """Top `limit` points by cosine similarity, best first, with their vectors"""
+
+    async def asearch(self, api_key_id: int, vector: list[float], limit: int) -> list[SearchHit]:
+        """search() for async code; backends without an async client use the threadpool"""
+        return await run_in_threadpool(self.search, api_key_id, vector, limit)
+
+    def search_batch(self, api_key_id: int, vectors: list[list[float]], limit: int) -> list[list[SearchHit]]:
+        """search() for many query vectors; backends override it with one round trip"""
+        return [self.search(api_key_id, vector, limit) for vector in vectors]
+
+    async def asearch_batch(self, api_key_id: int, vectors: list[list[float]], limit: int) -> list[list[SearchHit]]:
+        """search_batch() for async code"""
+        return await run_in_threadpool(self.search_batch, api_key_id, vectors, limit)
+
+    @abstractmethod
+    def delete_document(self, api_key_id: int, document_id: int) -> None:
+        """Delete every point of one document"""
+
+    def delete_documents(self, api_key_id: int, document_ids: list[int]) -> None:
+        """Delete every point of several documents; backends override it with one request"""
+        for document_id in document_ids:
+            self.delete_document(api_key_id, document_id)
+
+    @abstractmethod
+    def delete_api_key(self, api_key_id: int) -> None:
+        """Delete every point of one API key"""
+
+    @abstractmethod
+    def set_document(self, api_key_id: int, point_ids: list[str], document_id: int) -> None:
+        """Hand points over to another document (their document_id payload)"""
+
+    @abstractmethod
+    def count(self, api_key_id: int) -> int:
+        """Number of points stored for an API key"""
+
+    @abstractmethod
+    def export(self, api_key_id: int, batch_size: int = 256) -> Iterator[list[VectorPoint]]:
+        """All of an API key's points with vectors, in batches"""
+
+    @abstractmethod
+    def api_key_ids(self) -> set[int]:
+        """Every API key id with points stored (a full scan on some backends)"""
+
+
+def _qdrant_store() -> VectorStore:
+    from app.rag.qdrant_store import QdrantVectorStore
+    return QdrantVectorStore()
+
+
+def _local_store() -> VectorStore:
+    from app.rag.local_store import LocalVectorStore
+    return LocalVectorStore()
+
+
+VECTOR_BACKENDS = {
+    "qdrant": _qdrant_store,
+    "local": _local_store,
+}
+
+_stores: dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(name: Optional[str] = None) -> VectorStore:
+    """Shared instance of a backend (default: the configured one)"""
+    name = name or default_backend()
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend: {name}. Choose from: {list(VECTOR_BACKENDS.keys())}")
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = VECTOR_BACKENDS[name]()
+        return _stores[name]
+
+
+def default_backend() -> str:
+    """Backend for tenants that have not been placed yet"""
+    return "local" if VECTOR_BACKEND == "auto" else VECTOR_BACKEND
+
+
+def vector_store_for(api_key) -> VectorStore:
+    """The backend holding this API key's vectors"""
+    return get_vector_store(api_key.vector_backend or default_backend())
+
+
+def vector_store_for_id(api_key_id: int) -> VectorStore:
+    """vector_store_for() when only the API key id is at hand"""
+    db = SessionLocal()
+    try:
+        backend = db.query(APIKey.vector_backend).filter(APIKey.id == api_key_id).scalar()
+    finally:
+        db.close()
+    return get_vector_store(backend or default_backend())
+
+
+_tenant_locks: dict[int, threading.RLock] = {}
+_tenant_locks_lock = threading.Lock()
+
+
+def tenant_lock(api_key_id: int) -> threading.RLock:
+    """Serialises placing, moving and purging one tenant's vectors (in this process)"""
+    with _tenant_locks_lock:
+        return _tenant_locks.setdefault(api_key_id, threading.RLock())
+
+
+def place_tenant(db, api_key) -> VectorStore:
+    """Record which backend a new tenant's vectors go to, and return it"""
+    if api_key.vector_backend is None:
+        api_key.vector_backend = default_backend()
+        db.commit()
+    return vector_store_for(api_key)
+
+
+def migrate_tenant(api_key_id: int, source: VectorStore, target: VectorStore) -> int:
+    """Copy a tenant's points (vectors included) between backends"""
+    copied = 0
+    for batch in source.export(api_key_id):
+        target.upsert(api_key_id, batch)
+        copied += len(batch)
+    return copied
+
+
+def rebalance(db, api_key) -> Optional[str]:
+    """Move a tenant between backends by size (VECTOR_BACKEND=auto only).
+
+    Returns the new backend name when the tenant was moved. Point ids are
+    kept, so cached retrieval results stay valid. A failed move is logged
+    and leaves the tenant where it was. A tenant with a running ingest job
+    is not moved: the job keeps writing to the backend it started on (the
+    next job to finish rebalances instead).
+    """
+    if VECTOR_BACKEND != "auto":
+        return None
+
+    with tenant_lock(api_key.id):
+        db.refresh(api_key)
+        running = db.query(IngestJob).filter(
+            IngestJob.api_key_id == api_key.id,
+            IngestJob.status == "running"
+        ).count()
+        if running:
+            return None
+        return _move_if_needed(db, api_key)
+
+
+def _move_if_needed(db, api_key) -> Optional[str]:
+    chunks = db.query(func.coalesce(func.sum(Document.chunk_count), 0)).filter(
+        Document.api_key_id == api_key.id
+    ).scalar()
+    current = api_key.vector_backend or default_backend()
+    if current == "local" and chunks > LOCAL_VECTOR_MAX_CHUNKS:
+        target = "qdrant"
+    elif current == "qdrant" and chunks < LOCAL_VECTOR_MAX_CHUNKS // 2:
+        target = "local"
+    else:
+        return None
+
+    source, destination = get_vector_store(current), get_vector_store(target)
+    try:
+        copied = migrate_tenant(api_key.id, source, destination)
+        api_key.vector_backend = target
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to move API key %s from %s to %s", api_key.id, current, target)
+        destination.delete_api_key(api_key.id)
+        return None
+
+    try:
+        source.delete_api_key(api_key.id)
+    except Exception:
+        # The move itself succeeded; the old copy is only unused space
+        logger.exception("Moved API key %s to %s but could not delete its vectors from %s", api_key.id, target, current)
+    logger.info("Moved %s vectors of API key %s from %s to %s", copied, api_key.id, current, target)
+    return target
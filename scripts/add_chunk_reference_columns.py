@@ -0,0 +1,24 @@
+import sqlite3
+
+# NULL chunk_id = fingerprint recorded before references (not deduplicated against)
+COLUMNS = [
+    ("chunk_fingerprints", "chunk_id", "VARCHAR"),
+    ("vector_purges", "handover", "JSON"),
+]
+
+conn = sqlite3.connect('contextapi.db')
+try:
+    for table, column, column_type in COLUMNS:
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+            conn.commit()
+            print(f'Column {column} added successfully')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                print(f'Column {column} already exists')
+            else:
+                print(f'Error: {e}')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_chunk_fingerprints_chunk_id ON chunk_fingerprints (chunk_id)')
+    conn.commit()
+finally:
+    conn.close()
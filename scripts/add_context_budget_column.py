@@ -0,0 +1,15 @@
+import sqlite3
+
+conn = sqlite3.connect('contextapi.db')
+try:
+    # NULL = use the server default (CONTEXT_TOKEN_BUDGET)
+    conn.execute('ALTER TABLE api_keys ADD COLUMN context_token_budget INTEGER')
+    conn.commit()
+    print('Column context_token_budget added successfully')
+except sqlite3.OperationalError as e:
+    if 'duplicate column name' in str(e):
+        print('Column context_token_budget already exists')
+    else:
+        print(f'Error: {e}')
+finally:
+    conn.close()
@@ -0,0 +1,18 @@
+import sqlite3
+
+COLUMNS = ["chunks_duplicate", "chunks_near_duplicate"]
+
+conn = sqlite3.connect('contextapi.db')
+try:
+    for column in COLUMNS:
+        try:
+            conn.execute(f'ALTER TABLE ingest_jobs ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+            conn.commit()
+            print(f'Column {column} added successfully')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                print(f'Column {column} already exists')
+            else:
+                print(f'Error: {e}')
+finally:
+    conn.close()
@@ -0,0 +1,15 @@
+import sqlite3
+
+conn = sqlite3.connect('contextapi.db')
+try:
+    # NULL = use the server default (RETRIEVAL_MIN_SCORE)
+    conn.execute('ALTER TABLE api_keys ADD COLUMN min_retrieval_score FLOAT')
+    conn.commit()
+    print('Column min_retrieval_score added successfully')
+except sqlite3.OperationalError as e:
+    if 'duplicate column name' in str(e):
+        print('Column min_retrieval_score already exists')
+    else:
+        print(f'Error: {e}')
+finally:
+    conn.close()
@@ -0,0 +1,21 @@
+import sqlite3
+
+COLUMNS = {
+    "semantic_cache_enabled": "BOOLEAN NOT NULL DEFAULT 0",
+    "semantic_cache_threshold": "FLOAT",
+}
+
+conn = sqlite3.connect('contextapi.db')
+try:
+    for column, definition in COLUMNS.items():
+        try:
+            conn.execute(f'ALTER TABLE api_keys ADD COLUMN {column} {definition}')
+            conn.commit()
+            print(f'Column {column} added successfully')
+        except sqlite3.OperationalError as e:
+            if 'duplicate column name' in str(e):
+                print(f'Column {column} already exists')
+            else:
+                print(f'Error: {e}')
+finally:
+    conn.close()
@@ -0,0 +1,15 @@
+import sqlite3
+
+conn = sqlite3.connect('contextapi.db')
+try:
+    # Existing keys' vectors are in Qdrant
+    conn.execute('ALTER TABLE api_keys ADD COLUMN vector_backend TEXT DEFAULT "qdrant"')
+    conn.commit()
+    print('Column vector_backend added successfully')
+except sqlite3.OperationalError as e:
+    if 'duplicate column name' in str(e):
+        print('Column vector_backend already exists')
+    else:
+        print(f'Error: {e}')
+finally:
+    conn.close()
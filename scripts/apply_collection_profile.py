@@ -0,0 +1,35 @@
+"""
+Create or migrate the Qdrant collection to a profile (idempotent).
+
+    python -m scripts.apply_collection_profile                 # QDRANT_COLLECTION_PROFILE
+    python -m scripts.apply_collection_profile --profile int8 --dry-run
+
+Only settings that differ are updated; Qdrant re-indexes and re-quantizes
+existing points in the background (collection status turns green when done).
+Searches pick up the profile's rescoring settings once the API restarts with
+the same QDRANT_COLLECTION_PROFILE.
+"""
+import argparse
+
+from app.db.qdrant import qdrant
+from app.db.qdrant_collection import COLLECTION_NAME, PROFILES, apply_profile, get_profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=list(PROFILES.keys()), default=None)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--dry-run", action="store_true", help="print the changes without applying them")
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+    changes = apply_profile(qdrant, profile, args.collection, dry_run=args.dry_run)
+    if not changes:
+        print(f"{args.collection} already matches profile '{profile.name}'")
+        return
+    for change in changes:
+        print(("would apply: " if args.dry_run else "applied: ") + change)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+/chat/stream throughput per worker, by concurrency.
+
+Drives one in-process app (a single event loop, like one uvicorn worker)
+through httpx's ASGI transport. Retrieval uses the in-process vector store
+and the real embedding model; the LLM is a stub that emits --tokens tokens
+--token-ms apart, either by blocking (a sync SDK, bridged through the
+threadpool) or by awaiting (a native async client). The "openai" row runs
+the real OpenAIProvider against a local SSE server pacing tokens the same
+way, so it measures the SDK's native async streaming end to end. httpx's
+ASGI transport buffers the response body, so latency is per complete
+stream.
+
+    python -m scripts.bench_chat_stream --concurrency 1 8 32 128 512 --streams 1024
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench_chat_stream_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_VECTOR_DIR"] = f"{_tmp}/vectors"
+os.environ.setdefault("WARMUP_EMBEDDINGS", "false")
+
+import httpx
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from app.main import app
+from app.api import chat
+from app.core.apikey import generate_api_key
+from app.db.base import SessionLocal
+from app.db.models import APIKey, Plan, Usage, User, UserPlan
+from app.llm.provider import LLMProvider, OpenAIProvider
+from app.rag.embeddings import get_model
+from app.rag.store import store_texts
+from app.rag.vector_store import get_vector_store
+
+
+class BlockingStubLLM(LLMProvider):
+    def __init__(self, tokens: int, token_ms: float):
+        self.tokens, self.delay = tokens, token_ms / 1000
+
+    def generate(self, prompt):
+        return "".join(self.generate_stream(prompt))
+
+    def generate_stream(self, prompt):
+        for i in range(self.tokens):
+            time.sleep(self.delay)
+            yield f"tok{i} "
+
+
+class AsyncStubLLM(BlockingStubLLM):
+    async def agenerate_stream(self, prompt):
+        for i in range(self.tokens):
+            await asyncio.sleep(self.delay)
+            yield f"tok{i} "
+
+
+def start_sse_stub(tokens: int, token_ms: float) -> str:
+    """An OpenAI-compatible streaming /chat/completions on a background uvicorn; returns its base URL"""
+    async def completions(request):
+        await request.body()
+
+        async def events():
+            for i in range(tokens):
+                await asyncio.sleep(token_ms / 1000)
+                chunk = {
+                    "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                    "choices": [{"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(
+        Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])]),
+        log_level="warning",
+        backlog=4096,
+    ))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}/v1"
+
+
+def setup_tenant() -> str:
+    db = SessionLocal()
+    plan = Plan(name="bench", max_ingested_chars=10**12, max_stored_chars=10**12, max_chat_tokens=10**12)
+    user = User(email="bench@example.com", password_hash="x")
+    db.add_all([plan, user])
+    db.commit()
+    db.add_all([UserPlan(user_id=user.id, plan_id=plan.id), Usage(user_id=user.id)])
+    raw_key, key_hash = generate_api_key()
+    key = APIKey(key_hash=key_hash, user_id=user.id, vector_backend="local")
+    db.add(key)
+    db.commit()
+
+    texts = [f"Store {i} is open from {8 + i % 3}am to {5 + i % 4}pm on weekdays." for i in range(500)]
+    store_texts(texts, api_key_id=key.id, document_id=1, store=get_vector_store("local"))
+    db.close()
+    return raw_key
+
+
+async def run(raw_key: str, concurrency: int, streams: int) -> tuple[float, list[float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                async with client.stream(
+                    "POST", "/chat/stream",
+                    json={"query": f"when does store {i} open?"},
+                    headers={"Authorization": f"Bearer {raw_key}"}
+                ) as response:
+                    async for _ in response.aiter_raw():
+                        pass
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(streams)))
+        return streams / (time.perf_counter() - start), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--streams", type=int, default=256)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--token-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    sdk = OpenAIProvider(base_url=start_sse_stub(args.tokens, args.token_ms))
+
+    get_model().encode("warm up")
+    raw_key = setup_tenant()
+
+    print(f"{'provider':>9} {'concurrency':>11} {'streams/s':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, provider in [
+        ("blocking", BlockingStubLLM(args.tokens, args.token_ms)),
+        ("async", AsyncStubLLM(args.tokens, args.token_ms)),
+        ("openai", sdk),
+    ]:
+        chat.get_llm_provider = lambda name, provider=provider: provider
+        for concurrency in args.concurrency:
+            rate, latencies = asyncio.run(run(raw_key, concurrency, args.streams))
+            print(
+                f"{label:>9} {concurrency:>11} {rate:>10.1f} "
+                f"{np.percentile(latencies, 50):>8.1f} {np.percentile(latencies, 95):>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Embedding backend benchmark: single-query latency and batch throughput.
+
+    python -m scripts.bench_embedding_backends
+    python -m scripts.bench_embedding_backends --backends torch onnx-int8 --batch-size 64
+
+Backends whose dependencies are missing are reported and skipped.
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.rag.embeddings import EMBEDDING_BACKENDS, load_model
+
+QUERY = "What is the refund policy for damaged items?"
+CHUNK = (
+    "Customers can request a refund within 30 days of purchase. Items must be "
+    "returned in their original packaging together with the receipt. Damaged "
+    "items are replaced free of charge after inspection by our support team. "
+) * 6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    reference = None
+    print(f"{'backend':<12} {'p50 ms':>8} {'p95 ms':>8} {'chunks/s':>10} {'min cos':>8}")
+    for backend in args.backends:
+        try:
+            model = load_model(backend)
+        except (ImportError, OSError) as e:
+            print(f"{backend:<12} skipped: {e}")
+            continue
+
+        model.encode(QUERY)
+        latencies = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            model.encode(QUERY)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        chunks = [f"{i} {CHUNK}" for i in range(args.chunks)]
+        start = time.perf_counter()
+        vectors = model.encode(chunks, batch_size=args.batch_size)
+        throughput = len(chunks) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = vectors
+        cosine = np.sum(vectors * reference, axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+        )
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(
+            f"{backend:<12} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+            f"{throughput:>10.1f} {cosine.min():>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
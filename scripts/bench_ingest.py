@@ -0,0 +1,98 @@
+"""
+Ingest benchmark: per-chunk store_text vs batched store_texts.
+
+Runs against an in-memory Qdrant by default so only embedding cost is
+measured; pass --qdrant-url to include real network round trips.
+
+    python -m scripts.bench_ingest --chunks 400
+    python -m scripts.bench_ingest --chunks 400 --qdrant-url http://localhost:6333
+"""
+import argparse
+import os
+import random
+import time
+
+# Measure encoding, not cache lookups (both runs embed the same chunks)
+os.environ["EMBED_CACHE_SIZE"] = "0"
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance
+
+from app.ingest.chunk import chunk_text
+from app.rag import store
+from app.rag.embeddings import get_model
+from app.rag.qdrant_store import QdrantVectorStore
+
+BENCH_COLLECTION = "bench_ingest"
+WORDS = (
+    "refund policy support hours customer account invoice shipping order "
+    "warranty device reset password login billing plan upgrade contact email "
+    "phone return replacement battery screen update settings network"
+).split()
+
+
+def make_chunks(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    # chunk_text advances 450 words per chunk
+    text = " ".join(rng.choice(WORDS) for _ in range(n * 450 + 50))
+    return chunk_text(text)[:n]
+
+
+def setup_collection(client: QdrantClient):
+    if client.collection_exists(BENCH_COLLECTION):
+        client.delete_collection(BENCH_COLLECTION)
+    client.create_collection(
+        collection_name=BENCH_COLLECTION,
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+    )
+
+
+def run(label: str, fn, n: int):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.2f}s  {n / elapsed:8.1f} chunks/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--upsert-batch-size", type=int, default=256)
+    parser.add_argument("--qdrant-url", default=None)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:")
+    vectors = QdrantVectorStore(client, BENCH_COLLECTION)
+
+    chunks = make_chunks(args.chunks)
+    get_model().encode("warm up")
+
+    setup_collection(client)
+    before = run(
+        "per-chunk store_text",
+        lambda: [store.store_text(c, api_key_id=1, document_id=1, store=vectors) for c in chunks],
+        len(chunks)
+    )
+
+    setup_collection(client)
+    after = run(
+        "batched store_texts",
+        lambda: store.store_texts(
+            chunks,
+            api_key_id=1,
+            document_id=1,
+            embed_batch_size=args.embed_batch_size,
+            upsert_batch_size=args.upsert_batch_size,
+            store=vectors
+        ),
+        len(chunks)
+    )
+
+    print(f"speedup: {before / after:.2f}x")
+    client.delete_collection(BENCH_COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Latency of per-request LLM clients vs the pooled provider registry.
+
+Starts a local OpenAI-compatible stub server and sends --requests chat
+completions through the real SDK, --concurrency at a time, two ways:
+
+- per-request: a new provider (and HTTP pool) for every call, as /chat
+  used to do
+- pooled: get_llm_provider(), one long-lived provider with a kept-alive pool
+
+The stub is plain HTTP on localhost, so --handshake-ms delays the first
+request of every new connection to stand in for TCP+TLS setup to a real
+provider (a few round trips).
+
+    python -m scripts.bench_llm_clients
+    python -m scripts.bench_llm_clients --provider groq --handshake-ms 60 --concurrency 16
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from app.llm.provider import LLM_PROVIDERS, close_llm_providers, get_llm_provider
+
+
+def make_stub(handshake_ms: float, latency_ms: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def setup(self):
+            super().setup()
+            # Once per connection: the cost a pooled client skips
+            time.sleep(handshake_ms / 1000)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            time.sleep(latency_ms / 1000)
+            payload = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": json.loads(body).get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "We open at 9am."},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def run(call, requests: int, concurrency: int) -> dict:
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "req_per_s": requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=list(LLM_PROVIDERS.keys()), default="openai")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="simulated connection setup per new connection")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="stub time per completion")
+    args = parser.parse_args()
+
+    os.environ.setdefault(f"{args.provider.upper()}_API_KEY", "bench")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub(args.handshake_ms, args.latency_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}" + ("/openai/v1" if args.provider == "groq" else "/v1")
+
+    def per_request():
+        provider = LLM_PROVIDERS[args.provider](base_url=base_url)
+        provider.generate("When do you open?")
+        provider.http.close()
+
+    def pooled():
+        get_llm_provider(args.provider, base_url=base_url).generate("When do you open?")
+
+    pooled()  # first connection(s), as after warm-up
+    print(f"{args.provider}: {args.requests} requests, concurrency {args.concurrency}, handshake {args.handshake_ms}ms")
+    print(f"{'client':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, call in (("per-request", per_request), ("pooled", pooled)):
+        result = run(call, args.requests, args.concurrency)
+        print(f"{name:>12} {result['req_per_s']:>8.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}")
+
+    stats = get_llm_provider(args.provider, base_url=base_url).http.stats()
+    print(f"pooled connections opened: {stats['connections_opened']} for {stats['requests']} requests "
+          f"(reuse {stats['reuse_rate']:.1%})")
+    close_llm_providers()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
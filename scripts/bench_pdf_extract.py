@@ -0,0 +1,103 @@
+"""
+PDF extraction benchmark: serial vs multi-process page extraction.
+
+Generates text-only PDFs with several hundred pages and times
+iter_pdf_pages with different worker counts. Output text is checked to be
+identical across modes.
+
+    python -m scripts.bench_pdf_extract --pages 200 400 600 --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.ingest.pdf import iter_pdf_pages
+
+WORDS = (
+    "device settings reset warranty battery charge screen support contact "
+    "network update firmware account password billing invoice refund order"
+).split()
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0):
+    """Write a minimal text PDF (Helvetica, one content stream per page)"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # pages tree, filled in once page object ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+
+    for number in range(pages):
+        lines = [f"Page {number + 1}"] + [
+            " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)
+        ]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        ops += [f"({line}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode()
+
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def time_extract(path: str, workers: int) -> tuple[float, str]:
+    start = time.perf_counter()
+    text = "".join(iter_pdf_pages(path, workers=workers, min_parallel_pages=1))
+    return time.perf_counter() - start, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 400, 600])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Start worker processes before timing
+        warm = os.path.join(tmp, "warm.pdf")
+        make_pdf(warm, 8)
+        for workers in args.workers:
+            time_extract(warm, workers)
+
+        print(f"{'pages':>6} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+        for pages in args.pages:
+            path = os.path.join(tmp, f"doc_{pages}.pdf")
+            make_pdf(path, pages)
+
+            baseline, expected = None, None
+            for workers in args.workers:
+                elapsed, text = time_extract(path, workers)
+                if expected is None:
+                    baseline, expected = elapsed, text
+                assert text == expected, "parallel extraction changed the text"
+                print(f"{pages:>6} {workers:>8} {elapsed:>9.2f} {pages / elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
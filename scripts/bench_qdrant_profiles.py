@@ -0,0 +1,124 @@
+"""
+Recall vs latency of the Qdrant collection profiles, against a local Qdrant.
+
+Loads the same synthetic corpus (clustered unit vectors, split across
+--tenants API keys) into one collection per profile, waits for indexing,
+then runs tenant-filtered searches through QdrantVectorStore. Recall@k is
+measured against exact brute-force results computed with numpy.
+
+    docker run -p 6333:6333 qdrant/qdrant
+    python -m scripts.bench_qdrant_profiles --points 100000 --tenants 10
+    python -m scripts.bench_qdrant_profiles --profiles default int8 --ef 32 64 128
+
+The indexing threshold is lowered on the bench collections so HNSW graphs
+are built at benchmark scale. Passing --qdrant-url :memory: only smoke-tests
+the script: the embedded engine ignores indexes and quantization.
+"""
+import argparse
+import dataclasses
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import CollectionStatus, OptimizersConfigDiff
+
+from app.db.qdrant_collection import PROFILES, apply_profile
+from app.rag.qdrant_store import QdrantVectorStore
+from app.rag.vector_store import VectorPoint
+
+DIM = 384
+
+
+def make_corpus(n: int, tenants: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(256, DIM))
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.normal(size=(n, DIM))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32), np.arange(n) % tenants + 1
+
+
+def make_queries(vectors: np.ndarray, owners: np.ndarray, count: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(vectors), count)
+    queries = vectors[picks] + 0.2 * rng.normal(size=(count, DIM)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries, owners[picks]
+
+
+def exact_top_k(vectors, owners, query, tenant, k) -> set[int]:
+    ids = np.flatnonzero(owners == tenant)
+    scores = vectors[ids] @ query
+    return set(ids[np.argsort(-scores)[:k]].tolist())
+
+
+def load(client, collection, vectors, owners, batch_size=1024):
+    store = QdrantVectorStore(client, collection)
+    for tenant in np.unique(owners):
+        ids = np.flatnonzero(owners == tenant)
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            store.upsert(int(tenant), [
+                VectorPoint(id=int(i), vector=vectors[i].tolist(), payload={"document_id": 1})
+                for i in batch
+            ])
+
+
+def wait_for_index(client, collection, timeout: float = 600):
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{collection} still indexing after {timeout}s")
+        time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES.keys()), default=list(PROFILES.keys()))
+    parser.add_argument("--ef", type=int, nargs="+", default=None, help="search hnsw_ef values to sweep")
+    parser.add_argument("--keep", action="store_true", help="keep the bench collections")
+    args = parser.parse_args()
+
+    client = QdrantClient(":memory:") if args.qdrant_url == ":memory:" else QdrantClient(url=args.qdrant_url)
+    vectors, owners = make_corpus(args.points, args.tenants)
+    queries, query_tenants = make_queries(vectors, owners, args.queries)
+    truth = [exact_top_k(vectors, owners, q, t, args.limit) for q, t in zip(queries, query_tenants)]
+
+    print(f"{'profile':>8} {'hnsw_ef':>8} {f'recall@{args.limit}':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for name in args.profiles:
+        collection = f"bench_profile_{name}"
+        if client.collection_exists(collection):
+            client.delete_collection(collection)
+        apply_profile(client, PROFILES[name], collection)
+        if args.qdrant_url != ":memory:":
+            client.update_collection(collection, optimizers_config=OptimizersConfigDiff(indexing_threshold=1000))
+        load(client, collection, vectors, owners)
+        wait_for_index(client, collection)
+
+        for ef in args.ef or [PROFILES[name].hnsw_ef]:
+            profile = dataclasses.replace(PROFILES[name], hnsw_ef=ef)
+            store = QdrantVectorStore(client, collection, profile=profile)
+            store.search(int(query_tenants[0]), queries[0].tolist(), args.limit)  # warm up
+
+            latencies, recalls = [], []
+            for query, tenant, expected in zip(queries, query_tenants, truth):
+                start = time.perf_counter()
+                hits = store.search(int(tenant), query.tolist(), args.limit)
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(len({int(hit.id) for hit in hits} & expected) / args.limit)
+
+            print(
+                f"{name:>8} {str(ef or '-'):>8} {np.mean(recalls):>10.3f} "
+                f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}"
+            )
+
+        if not args.keep:
+            client.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Query embedding benchmark: batch-of-1 encode vs micro-batching, by concurrency.
+
+Each worker thread embeds its own stream of unique queries, the way
+concurrent /chat requests do.
+
+    python -m scripts.bench_query_batching --concurrency 1 4 16 64 --queries 512
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Unique queries anyway; keep cache lookups out of the measurement
+os.environ["EMBED_CACHE_SIZE"] = "0"
+
+from app.rag.batcher import EmbeddingBatcher
+from app.rag.embeddings import embed_text, embed_texts, get_model
+
+
+def make_queries(n: int, tag: str) -> list[str]:
+    return [f"what are the opening hours for store {tag}-{i} on holidays?" for i in range(n)]
+
+
+def run(embed, queries: list[str], concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(embed, queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    get_model().encode("warm up")
+    batcher = EmbeddingBatcher(embed_texts, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    print(f"{'concurrency':>11} {'batch-of-1 qps':>15} {'batched qps':>12} {'speedup':>8} {'avg batch':>10}")
+    for concurrency in args.concurrency:
+        single = run(embed_text, make_queries(args.queries, f"s{concurrency}"), concurrency)
+        before = batcher.stats()
+        batched = run(batcher.embed, make_queries(args.queries, f"b{concurrency}"), concurrency)
+        after = batcher.stats()
+        avg = (after["items"] - before["items"]) / max(1, after["batches"] - before["batches"])
+        print(f"{concurrency:>11} {single:>15.1f} {batched:>12.1f} {batched / single:>7.2f}x {avg:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Ingest time and search latency: in-process local store vs Qdrant, by corpus size.
+
+Random unit vectors stand in for chunk embeddings (search cost does not
+depend on the values). Ingest time is the whole corpus loaded in upsert
+batches the size an ingest job uses. The in-memory Qdrant client is a pure-Python
+engine, so pass --qdrant-url to measure a real server with its network
+round trip.
+
+    python -m scripts.bench_vector_store --sizes 1000 5000 20000 100000
+    python -m scripts.bench_vector_store --qdrant-url http://localhost:6333
+"""
+import argparse
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance
+
+from app.core.config import QDRANT_UPSERT_BATCH_SIZE
+from app.rag.local_store import LocalVectorStore
+from app.rag.qdrant_store import QdrantVectorStore
+from app.rag.vector_store import VectorPoint
+
+BENCH_COLLECTION = "bench_vector_store"
+DIM = 384
+
+
+def make_points(n: int, seed: int = 0) -> list[VectorPoint]:
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return [
+        VectorPoint(id=str(uuid.uuid4()), vector=vector, payload={"document_id": 1, "text": f"chunk {i}"})
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def load(store, api_key_id: int, points: list[VectorPoint], batch_size: int = QDRANT_UPSERT_BATCH_SIZE) -> float:
+    """Upsert points batch by batch, as an ingest does; returns seconds taken"""
+    start_time = time.perf_counter()
+    for start in range(0, len(points), batch_size):
+        store.upsert(api_key_id, points[start:start + batch_size])
+    return time.perf_counter() - start_time
+
+
+def measure(store, api_key_id: int, queries: np.ndarray, limit: int) -> tuple[float, float]:
+    store.search(api_key_id, queries[0].tolist(), limit)  # warm up (mmap, connection)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.search(api_key_id, query.tolist(), limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=QDRANT_UPSERT_BATCH_SIZE)
+    parser.add_argument("--qdrant-url", default=None)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:")
+    if client.collection_exists(BENCH_COLLECTION):
+        client.delete_collection(BENCH_COLLECTION)
+    client.create_collection(BENCH_COLLECTION, vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+
+    queries = np.random.default_rng(1).normal(size=(args.queries, DIM)).astype(np.float32)
+    qdrant_label = "qdrant" if args.qdrant_url else "qdrant :memory:"
+
+    print(f"{'chunks':>8} {'backend':>16} {'ingest s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    with tempfile.TemporaryDirectory() as root:
+        stores = [
+            ("local float32", LocalVectorStore(root=f"{root}/f32", dtype="float32")),
+            ("local float16", LocalVectorStore(root=f"{root}/f16", dtype="float16")),
+            (qdrant_label, QdrantVectorStore(client, BENCH_COLLECTION)),
+        ]
+        for tenant, size in enumerate(args.sizes, start=1):
+            points = make_points(size, seed=tenant)
+            for label, store in stores:
+                ingest = load(store, tenant, points, args.batch_size)
+                p50, p95 = measure(store, tenant, queries, args.limit)
+                print(f"{size:>8} {label:>16} {ingest:>9.2f} {p50:>8.3f} {p95:>8.3f}")
+
+    client.delete_collection(BENCH_COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
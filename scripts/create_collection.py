@@ -1,21 +1,14 @@
-from qdrant_client.models import VectorParams, Distance
 from app.db.qdrant import qdrant
+from app.db.qdrant_collection import COLLECTION_NAME, apply_profile, get_profile
 
-COLLECTION_NAME = "chatbot_docs"
-
+# Kept for existing setups; scripts/apply_collection_profile.py does the same
+# and can also migrate an existing collection to another profile
 def create_collection():
-    collections = qdrant.get_collections().collections
-    if any(c.name == COLLECTION_NAME for c in collections):
+    if qdrant.collection_exists(COLLECTION_NAME):
         print(" Collection already exists")
         return
 
-    qdrant.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(
-            size=384,   # embedding size
-            distance=Distance.COSINE
-        )
-    )
+    apply_profile(qdrant, get_profile())
 
     print(" Collection created:", COLLECTION_NAME)
 
@@ -1,23 +1,12 @@
 from app.db.qdrant import qdrant
-
-COLLECTION_NAME = "chatbot_docs"
+from app.db.qdrant_collection import COLLECTION_NAME, PAYLOAD_INDEXES, apply_profile, get_profile
 
 def create_index():
-    # Create index for api_key_id filtering
-    qdrant.create_payload_index(
-        collection_name=COLLECTION_NAME,
-        field_name="api_key_id",
-        field_schema="integer"
-    )
-    
-    # Also create index for document_id for deletion
-    qdrant.create_payload_index(
-        collection_name=COLLECTION_NAME,
-        field_name="document_id",
-        field_schema="integer"
-    )
-    
-    print("Payload indexes created for api_key_id and document_id")
+    # api_key_id (tenant filter) and document_id (deletes); apply_profile
+    # only touches what differs, so an up-to-date collection is left alone
+    apply_profile(qdrant, get_profile(), COLLECTION_NAME)
+
+    print("Payload indexes created for " + " and ".join(PAYLOAD_INDEXES))
 
 if __name__ == "__main__":
     create_index()
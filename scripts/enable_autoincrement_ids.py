@@ -0,0 +1,71 @@
+"""
+Stop SQLite from reusing api_keys and documents ids.
+
+Without AUTOINCREMENT, SQLite hands the id of the last deleted row to the
+next insert, so a vector purge still queued for a deleted document (or key)
+would delete the vectors of whatever reuses its id. This rebuilds both
+tables with AUTOINCREMENT, keeping every row, and starts their id sequence
+after the ids that pending purges still refer to.
+
+    python -m scripts.enable_autoincrement_ids
+
+Tables already rebuilt are skipped. Stop the API (and its purger) first.
+"""
+import sqlite3
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.db.base import Base
+from app.db import models  # noqa: F401 (registers the tables)
+
+# table -> vector_purges column that refers to its ids
+TABLES = {"api_keys": "api_key_id", "documents": "document_id"}
+
+
+def rebuild(conn, name: str, purge_column: str):
+    table = Base.metadata.tables[name]
+    [sql] = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    if "AUTOINCREMENT" in sql.upper():
+        print(f'Table {name} already uses AUTOINCREMENT')
+        return
+
+    old_columns = {row[1] for row in conn.execute(f'PRAGMA table_info({name})')}
+    columns = ", ".join(column.name for column in table.columns if column.name in old_columns)
+    # The old indexes keep their names after the rename and would clash with the new ones
+    for (index,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (name,)
+    ).fetchall():
+        conn.execute(f'DROP INDEX {index}')
+    conn.execute(f'ALTER TABLE {name} RENAME TO _{name}_old')
+    conn.execute(str(CreateTable(table).compile(dialect=sqlite.dialect())))
+    for index in table.indexes:
+        conn.execute(str(CreateIndex(index).compile(dialect=sqlite.dialect())))
+    conn.execute(f'INSERT INTO {name} ({columns}) SELECT {columns} FROM _{name}_old')
+    conn.execute(f'DROP TABLE _{name}_old')
+
+    [last] = conn.execute(f'SELECT MAX(id) FROM {name}').fetchone()
+    # Ids of deleted rows that pending purges still refer to must not come back either
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vector_purges'").fetchone():
+        [purged] = conn.execute(f'SELECT MAX({purge_column}) FROM vector_purges').fetchone()
+        last = max(last or 0, purged or 0)
+    conn.execute('DELETE FROM sqlite_sequence WHERE name = ?', (name,))
+    conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (name, last or 0))
+    print(f'Table {name} rebuilt with AUTOINCREMENT (next id {(last or 0) + 1})')
+
+
+conn = sqlite3.connect('contextapi.db', isolation_level=None)
+try:
+    conn.execute('PRAGMA foreign_keys = OFF')
+    # Keep other tables' foreign keys pointing at the table name, not the renamed old table
+    conn.execute('PRAGMA legacy_alter_table = ON')
+    conn.execute('BEGIN')
+    for name, purge_column in TABLES.items():
+        rebuild(conn, name, purge_column)
+    conn.execute('COMMIT')
+except sqlite3.Error as e:
+    if conn.in_transaction:
+        conn.execute('ROLLBACK')
+    print(f'Error: {e}')
+finally:
+    conn.close()
@@ -0,0 +1,249 @@
+"""
+End-to-end load test of /chat, /chat/stream and /ingest.
+
+Starts the app on uvicorn in this process, against a temporary SQLite
+database and an in-memory Qdrant, for one tenant whose LLM is the fake
+provider: no provider credits are spent and LLM latency is whatever
+--ttft-ms / --tokens-per-second say. A seed PDF is ingested first so chats
+retrieve real context, then each endpoint is driven over HTTP with
+--requests requests at each --concurrency.
+
+Results are JSON, one row per (endpoint, concurrency) with requests/s,
+errors, status codes and p50/p95/p99 latency (plus time to first byte for /chat/stream;
+for /ingest, latency is until the upload is accepted and jobs/s counts
+finished ingestions), so runs can be diffed against each other.
+
+    python -m scripts.loadtest --concurrency 1 16 64 --requests 200 --output before.json
+    python -m scripts.loadtest --endpoints chat_stream --ttft-ms 500 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+ENDPOINTS = {"chat": "/chat", "chat_stream": "/chat/stream", "ingest": "/ingest"}
+
+
+def configure(args):
+    """Point the app at throwaway storage and the fake LLM (before it is imported)"""
+    tmp = tempfile.mkdtemp(prefix="loadtest_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/loadtest.db"
+    os.environ["QDRANT_URL"] = ":memory:"
+    os.environ["VECTOR_BACKEND"] = "qdrant"
+    os.environ["FAKE_LLM_TTFT_MS"] = str(args.ttft_ms)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["FAKE_LLM_OUTPUT_TOKENS"] = str(args.output_tokens)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    return tmp
+
+
+def start_server(app) -> str:
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", backlog=4096))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def setup_tenant() -> str:
+    from app.core.apikey import generate_api_key
+    from app.db.base import SessionLocal
+    from app.db.models import APIKey, Plan, Usage, User, UserPlan
+
+    db = SessionLocal()
+    plan = Plan(name="loadtest", max_ingested_chars=10**12, max_stored_chars=10**12, max_chat_tokens=10**12)
+    user = User(email="loadtest@example.com", password_hash="x")
+    db.add_all([plan, user])
+    db.commit()
+    db.add_all([UserPlan(user_id=user.id, plan_id=plan.id), Usage(user_id=user.id)])
+    raw_key, key_hash = generate_api_key()
+    # Every chat reaches the LLM: no relevance cut-off
+    db.add(APIKey(key_hash=key_hash, user_id=user.id, llm_provider="fake", vector_backend="qdrant", min_retrieval_score=-1.0))
+    db.commit()
+    db.close()
+    return raw_key
+
+
+def make_pdfs(count: int, pages: int, seed: int) -> list[bytes]:
+    """Distinct PDFs (identical uploads would be skipped as duplicates)"""
+    from scripts.bench_pdf_extract import make_pdf
+
+    pdfs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(count):
+            path = os.path.join(tmp, f"{i}.pdf")
+            make_pdf(path, pages=pages, lines_per_page=20, seed=seed + i)
+            with open(path, "rb") as f:
+                pdfs.append(f.read())
+    return pdfs
+
+
+async def wait_for_jobs(client, headers: dict, job_ids: list[int]) -> float:
+    """Poll until every ingest job has finished; returns when the last one did"""
+    pending = set(job_ids)
+    while pending:
+        for job_id in list(pending):
+            job = (await client.get(f"/ingest/jobs/{job_id}", headers=headers)).json()
+            if job["status"] in ("completed", "failed"):
+                pending.discard(job_id)
+        if pending:
+            await asyncio.sleep(0.1)
+    return time.perf_counter()
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return None
+    return {f"p{p}": round(float(np.percentile(values, p)), 2) for p in (50, 95, 99)}
+
+
+async def run_phase(base_url: str, raw_key: str, endpoint: str, concurrency: int, args, pdfs: list[bytes]) -> dict:
+    import httpx
+
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, ttfts, job_ids = [], [], []
+    statuses = Counter()
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        async def one(i: int):
+            nonlocal errors
+            distinct = args.distinct_queries or args.requests
+            query = {"query": f"How long do refunds take for order {i % distinct}?"}
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    if endpoint == "chat_stream":
+                        async with client.stream("POST", "/chat/stream", json=query, headers=headers) as response:
+                            body = b""
+                            async for chunk in response.aiter_raw():
+                                if not body:
+                                    ttfts.append((time.perf_counter() - start) * 1000)
+                                body += chunk
+                        ok = response.status_code == 200 and b"[ERROR]" not in body
+                    elif endpoint == "chat":
+                        response = await client.post("/chat", json=query, headers=headers)
+                        ok = response.status_code == 200
+                    else:
+                        response = await client.post(
+                            "/ingest",
+                            files={"file": (f"load-{concurrency}-{i}.pdf", pdfs[i], "application/pdf")},
+                            headers=headers,
+                        )
+                        ok = response.status_code == 202
+                        if ok:
+                            job_ids.append(response.json()["job_id"])
+                    statuses[str(response.status_code)] += 1
+                except httpx.HTTPError as e:
+                    ok = False
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        row = {
+            "endpoint": ENDPOINTS[endpoint],
+            "concurrency": concurrency,
+            "requests": args.requests,
+            "errors": errors,
+            # e.g. 503s from a full ingestion queue are backpressure, not failures
+            "status_codes": dict(sorted(statuses.items())),
+            "duration_s": round(elapsed, 3),
+            "rps": round(args.requests / elapsed, 2),
+            "latency_ms": percentiles(latencies),
+            "ttft_ms": percentiles(ttfts) if endpoint == "chat_stream" else None,
+        }
+        if endpoint == "ingest":
+            finished = await wait_for_jobs(client, headers, job_ids)
+            row["jobs_per_s"] = round(len(job_ids) / (finished - start), 2)
+        return row
+
+
+async def seed(base_url: str, raw_key: str, args):
+    import httpx
+
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    [pdf] = make_pdfs(1, args.seed_pages, seed=args.seed + 10**6)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        response = await client.post("/ingest", files={"file": ("seed.pdf", pdf, "application/pdf")}, headers=headers)
+        response.raise_for_status()
+        await wait_for_jobs(client, headers, [response.json()["job_id"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint and concurrency")
+    parser.add_argument("--distinct-queries", type=int, default=0,
+                        help="cycle through this many chat questions (0: all distinct)")
+    parser.add_argument("--seed-pages", type=int, default=20, help="pages of the document ingested before the run")
+    parser.add_argument("--ingest-pages", type=int, default=5, help="pages per PDF uploaded to /ingest")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake LLM calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    configure(args)
+    # Imported only now: the app reads its configuration at import time
+    from app.main import app
+
+    base_url = start_server(app)
+    raw_key = setup_tenant()
+    asyncio.run(seed(base_url, raw_key, args))
+    results = []
+    for endpoint in args.endpoints:
+        for concurrency in args.concurrency:
+            pdfs = make_pdfs(args.requests, args.ingest_pages, seed=args.seed + len(results) * args.requests) \
+                if endpoint == "ingest" else []
+            row = asyncio.run(run_phase(base_url, raw_key, endpoint, concurrency, args, pdfs))
+            print(f"{row['endpoint']:<13} c={concurrency:<4} {row['rps']:>8.2f} req/s  "
+                  f"p95 {row['latency_ms']['p95']:>9.1f} ms  errors {row['errors']}", file=sys.stderr)
+            results.append(row)
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "distinct_queries": args.distinct_queries or args.requests,
+            "fake_llm": {
+                "ttft_ms": args.ttft_ms,
+                "tokens_per_second": args.tokens_per_second,
+                "output_tokens": args.output_tokens,
+                "error_rate": args.error_rate,
+                "seed": args.seed,
+            },
+            "database": "sqlite",
+            "vector_store": "qdrant :memory:",
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Move chunk text out of vector payloads into the chunk store.
+
+Points ingested before the chunk store kept their text in the payload.
+This copies that text to the chunk_texts table and rewrites each point
+without it, tenant by tenant. Already-moved points are skipped, so it can
+be re-run (e.g. after an interrupted run). Retrieval reads legacy payload
+text in the meantime, so it can run while the API is serving.
+
+    python -m scripts.migrate_chunk_texts --dry-run
+    python -m scripts.migrate_chunk_texts
+
+Qdrant frees the old payload space once its optimizer vacuums the
+rewritten segments.
+"""
+import argparse
+
+from app.db.base import Base, SessionLocal, engine
+from app.db.models import APIKey
+from app.rag.chunk_store import move_payload_texts
+from app.rag.vector_store import vector_store_for
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only count the points that still carry text")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        api_keys = db.query(APIKey).all()
+    finally:
+        db.close()
+
+    total = 0
+    for api_key in api_keys:
+        moved = move_payload_texts(vector_store_for(api_key), api_key.id, dry_run=args.dry_run)
+        if moved:
+            print(f"api key {api_key.id}: {moved} chunks {'to move' if args.dry_run else 'moved'}")
+        total += moved
+    print(f"{total} chunks {'to move' if args.dry_run else 'moved'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Find vectors whose document (or API key) no longer exists and queue them
+for the background purger.
+
+Such orphans come from deletes made before the purge queue existed, or
+from a process that died mid-ingest. Every stored vector is scanned, so
+run it off-peak.
+
+    python -m scripts.reconcile_vectors --dry-run
+    python -m scripts.reconcile_vectors --backend qdrant --purge
+"""
+import argparse
+
+from app.db.base import Base, engine
+from app.rag.purge import purge_pending, reconcile
+from app.rag.vector_store import VECTOR_BACKENDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=list(VECTOR_BACKENDS.keys()), nargs="+", default=list(VECTOR_BACKENDS.keys()))
+    parser.add_argument("--dry-run", action="store_true", help="only report orphans")
+    parser.add_argument("--purge", action="store_true", help="run the queued purges now instead of leaving them to the API")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    for backend in args.backend:
+        orphans = reconcile(backend, dry_run=args.dry_run)
+        for api_key_id, document_ids in orphans.items():
+            target = "all vectors (key deleted)" if document_ids is None else f"documents {document_ids}"
+            print(f"{backend}: api key {api_key_id}: {target}")
+        print(f"{backend}: {len(orphans)} API keys with orphaned vectors{'' if args.dry_run else ' queued'}")
+
+    if args.purge and not args.dry_run:
+        total = 0
+        while (completed := purge_pending()):
+            total += completed
+        print(f"{total} purges completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Shared fixtures.
+"""
+import asyncio
+import re
+import uuid
+
+import pytest
+
+from app.core.apikey import generate_api_key
+from app.db.base import Base, SessionLocal, engine
+from app.db.models import APIKey, Plan, Usage, User, UserPlan
+from app.llm.provider import LLMProvider
+from app.rag.vector_store import SearchHit
+
+# Tests that don't import app.main still need the schema
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def api_key():
+    """Create a user on a generous plan with one API key."""
+    db = SessionLocal()
+    plan = db.query(Plan).filter(Plan.name == "test").first()
+    if not plan:
+        plan = Plan(name="test", max_ingested_chars=10**9, max_stored_chars=10**9, max_chat_tokens=10**9)
+        db.add(plan)
+        db.commit()
+
+    user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    db.add(UserPlan(user_id=user.id, plan_id=plan.id))
+    db.add(Usage(user_id=user.id))
+
+    raw_key, key_hash = generate_api_key()
+    record = APIKey(key_hash=key_hash, user_id=user.id)
+    db.add(record)
+    db.commit()
+
+    yield raw_key, record.id
+    db.close()
+
+
+@pytest.fixture
+def chat_tokens():
+    """Chat tokens charged so far to the user owning an API key: chat_tokens(api_key_id)."""
+    def tokens(api_key_id):
+        db = SessionLocal()
+        user_id = db.query(APIKey.user_id).filter(APIKey.id == api_key_id).scalar()
+        charged = db.query(Usage.chat_tokens).filter(Usage.user_id == user_id).scalar()
+        db.close()
+        return charged or 0
+
+    return tokens
+
+
+class FakeLLM(LLMProvider):
+    """Answers with `answer` (a string, or a function of the prompt), word by word when streaming.
+
+    Records every prompt, counts upstream streams, cancellations and
+    concurrent async calls; prompts containing `fail_on` raise. With
+    sync=False the sync API is off limits. `delay` is slept before the
+    answer (agenerate) or before each streamed piece (agenerate_stream).
+    """
+
+    model = "fake"
+
+    def __init__(self, answer="9am to 5pm", delay=0.0, fail_on=None, sync=True):
+        self.answer, self.delay, self.fail_on, self.sync = answer, delay, fail_on, sync
+        self.prompts = []
+        self.streams = 0
+        self.cancelled = 0
+        self.running = 0
+        self.max_running = 0
+
+    def _answer(self, prompt):
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("provider timeout")
+        self.prompts.append(prompt)
+        return self.answer(prompt) if callable(self.answer) else self.answer
+
+    def generate(self, prompt):
+        if not self.sync:
+            raise AssertionError("expected the async API")
+        return self._answer(prompt)
+
+    def generate_stream(self, prompt):
+        yield from re.findall(r"\S+\s*", self.generate(prompt))
+
+    async def agenerate(self, prompt):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return self._answer(prompt)
+
+    async def agenerate_stream(self, prompt):
+        self.streams += 1
+        try:
+            for piece in re.findall(r"\S+\s*", self._answer(prompt)):
+                await asyncio.sleep(self.delay)
+                yield piece
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+class FakeStore:
+    """Returns `hits` (a list, or a function of the query vector) to every search; records limits and batch sizes."""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.limits = []
+        self.batches = []
+
+    def _search(self, vector, limit):
+        self.limits.append(limit)
+        return self.hits(vector) if callable(self.hits) else list(self.hits)
+
+    def search(self, api_key_id, vector, limit):
+        return self._search(vector, limit)
+
+    async def asearch(self, api_key_id, vector, limit):
+        return self._search(vector, limit)
+
+    async def asearch_batch(self, api_key_id, vectors, limit):
+        self.batches.append(len(vectors))
+        return [self._search(vector, limit) for vector in vectors]
+
+
+@pytest.fixture
+def fake_llm(request, monkeypatch):
+    """A FakeLLM behind every provider name for the chat endpoints, with fresh LLM call counters.
+
+    Configure it with indirect parametrization, e.g.
+    @pytest.mark.parametrize("fake_llm", [{"answer": "Biscuit"}], indirect=True)
+    """
+    from app.api import chat
+
+    llm = FakeLLM(**getattr(request, "param", {}))
+    monkeypatch.setattr(chat, "get_llm_provider", lambda name: llm)
+    monkeypatch.setattr(chat, "_llm_calls", chat.LLMCallCounters())
+    return llm
+
+
+@pytest.fixture
+def fake_store(request, monkeypatch):
+    """A FakeStore behind every API key for the chat endpoints, with the retrieval cache off.
+
+    Parametrize indirectly with its hits; by default one relevant chunk.
+    Queries embed to [1.0, 0.0] unless `embed` (a function of the text)
+    is also given: {"hits": [...], "embed": ...}.
+    """
+    from app.api import chat
+    from app.rag import retrieve
+
+    param = getattr(request, "param", {})
+    store = FakeStore(param.get("hits", [SearchHit(id="p1", score=0.9, payload={"text": "Open 9am to 5pm."})]))
+    embed = param.get("embed", lambda text: [1.0, 0.0])
+
+    async def aembed_query(text):
+        return embed(text)
+
+    async def aembed_texts(texts):
+        return [embed(text) for text in texts]
+
+    for module in (chat, retrieve):
+        monkeypatch.setattr(module, "embed_query", embed)
+        monkeypatch.setattr(module, "aembed_query", aembed_query)
+    monkeypatch.setattr(chat, "aembed_texts", aembed_texts)
+    monkeypatch.setattr(chat, "vector_store_for", lambda key: store)
+    monkeypatch.setattr(retrieve, "_cache", None)
+    return store
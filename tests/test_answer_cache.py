@@ -0,0 +1,103 @@
+"""
+Tests for the opt-in semantic answer cache and its use by /chat.
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.db.base import SessionLocal
+from app.db.models import APIKey
+from app.rag import retrieve
+from app.rag.answer_cache import SemanticAnswerCache
+
+client = TestClient(app)
+
+
+def test_lookup_uses_cosine_threshold():
+    """Only questions close enough to a cached one are served from the cache."""
+    cache = SemanticAnswerCache(max_per_key=10, ttl_seconds=60)
+    cache.put(1, [1.0, 0.0], ["c1"], "9am to 5pm", generation=0)
+
+    hit = cache.lookup(1, [0.99, 0.05], threshold=0.95)
+    assert hit.answer == "9am to 5pm"
+    assert hit.chunk_ids == ("c1",)
+    assert cache.lookup(1, [0.6, 0.8], threshold=0.95) is None
+    assert cache.lookup(2, [1.0, 0.0], threshold=0.95) is None
+
+
+def test_generation_bump_drops_answers():
+    """A knowledge base change invalidates answers, including ones generated across it."""
+    cache = SemanticAnswerCache(max_per_key=10, ttl_seconds=60)
+    generation = cache.generation(1)
+    cache.put(1, [1.0, 0.0], ["c1"], "old", generation)
+    cache.bump(1)
+    assert cache.lookup(1, [1.0, 0.0], threshold=0.9) is None
+
+    cache.put(1, [1.0, 0.0], ["c1"], "stale", generation)
+    assert cache.lookup(1, [1.0, 0.0], threshold=0.9) is None
+
+
+def test_per_key_bound_and_ttl(monkeypatch):
+    """Each key keeps at most max_per_key answers, and answers expire."""
+    now = [0.0]
+    monkeypatch.setattr("app.rag.answer_cache.time.monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(max_per_key=2, ttl_seconds=30)
+    for i, vector in enumerate(np.eye(3)):
+        cache.put(1, vector, [], f"answer {i}", 0)
+
+    assert cache.lookup(1, [1.0, 0.0, 0.0], threshold=0.9) is None  # oldest dropped
+    assert cache.lookup(1, [0.0, 0.0, 1.0], threshold=0.9).answer == "answer 2"
+    now[0] = 31
+    assert cache.lookup(1, [0.0, 0.0, 1.0], threshold=0.9) is None
+
+
+VECTORS = {
+    "what are your opening hours?": [1.0, 0.0],
+    "What are your opening hours": [0.99, 0.02],
+    "how do I get a refund?": [0.0, 1.0],
+}
+
+
+@pytest.fixture
+def semantic_key(api_key, fake_llm, fake_store, monkeypatch):
+    """An opted-in key with fake embeddings, search and LLM; returns (raw key, LLM prompts)."""
+    raw_key, api_key_id = api_key
+    db = SessionLocal()
+    db.query(APIKey).filter(APIKey.id == api_key_id).update({"semantic_cache_enabled": True})
+    db.commit()
+    db.close()
+
+    fake_llm.answer = lambda prompt: f"answer {len(fake_llm.prompts)}"
+    monkeypatch.setattr(retrieve, "_answer_cache", SemanticAnswerCache(max_per_key=10, ttl_seconds=60))
+    return raw_key, fake_llm.prompts
+
+
+@pytest.mark.parametrize("fake_store", [{"embed": VECTORS.__getitem__}], indirect=True)
+def test_chat_serves_similar_questions_from_cache(semantic_key):
+    """A paraphrase is answered without an LLM call; a different question is not."""
+    raw_key, prompts = semantic_key
+    headers = {"Authorization": f"Bearer {raw_key}"}
+
+    first = client.post("/chat", json={"query": "what are your opening hours?"}, headers=headers).json()
+    second = client.post("/chat", json={"query": "What are your opening hours"}, headers=headers).json()
+    third = client.post("/chat", json={"query": "how do I get a refund?"}, headers=headers).json()
+
+    assert first == {"answer": "answer 1", "cached": False, "fallback": False}
+    assert second == {"answer": "answer 1", "cached": True, "fallback": False}
+    assert third == {"answer": "answer 2", "cached": False, "fallback": False}
+    assert len(prompts) == 2
+
+
+@pytest.mark.parametrize("fake_store", [{"embed": VECTORS.__getitem__}], indirect=True)
+def test_chat_stream_replays_cached_answer(semantic_key):
+    """A cached answer is streamed back as SSE events followed by [DONE]."""
+    raw_key, prompts = semantic_key
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    client.post("/chat", json={"query": "what are your opening hours?"}, headers=headers)
+
+    response = client.post("/chat/stream", json={"query": "What are your opening hours"}, headers=headers)
+    events = [line[len("data: "):] for line in response.text.split("\n\n") if line]
+    assert "".join(events[:-1]) == "answer 1"
+    assert events[-1] == "[DONE]"
+    assert len(prompts) == 1
@@ -4,6 +4,7 @@ Basic API tests for health and authentication endpoints.
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core import warmup
 
 client = TestClient(app)
 
@@ -16,6 +17,30 @@ def test_health_endpoint():
     assert data["status"] == "healthy"
 
 
+def test_ready_endpoint_reports_failed_warmup(monkeypatch):
+    """Readiness is 503 while a warm-up check is failing."""
+    def broken():
+        raise RuntimeError("qdrant unreachable")
+
+    monkeypatch.setattr(warmup, "enabled_checks", lambda: {"embeddings": broken})
+    monkeypatch.setattr(warmup, "_retry", lambda failed: None)
+    warmup.warm_up()
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["embeddings"].startswith("error")
+
+
+def test_ready_endpoint_after_warmup(monkeypatch):
+    """Readiness is 200 once every enabled warm-up check has passed."""
+    monkeypatch.setattr(warmup, "enabled_checks", lambda: {"embeddings": lambda: None})
+    warmup.warm_up()
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "checks": {"embeddings": "ok"}}
+
+
 def test_root_endpoint():
     """Test the root endpoint."""
     response = client.get("/")
@@ -0,0 +1,63 @@
+"""
+Tests for micro-batching of concurrent query embeddings.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.rag.batcher import EmbeddingBatcher
+
+
+def test_concurrent_queries_share_batches():
+    """Queries submitted together are embedded in one call, each getting its own vector."""
+    batch_sizes = []
+    entered, release = threading.Event(), threading.Event()
+
+    def embed(texts):
+        entered.set()
+        release.wait(timeout=5)
+        batch_sizes.append(len(texts))
+        return [[float(len(t))] for t in texts]
+
+    batcher = EmbeddingBatcher(embed, max_batch=8, max_wait_ms=50)
+    first = batcher.submit("warm")          # occupies the worker
+    entered.wait(timeout=5)
+    futures = [batcher.submit("x" * i) for i in range(1, 11)]
+    release.set()
+
+    assert first.result(timeout=5) == [4.0]
+    assert [f.result(timeout=5) for f in futures] == [[float(i)] for i in range(1, 11)]
+    assert batch_sizes[0] == 1
+    assert max(batch_sizes[1:]) == 8        # capped at max_batch
+    assert sum(batch_sizes) == 11
+
+
+def test_single_idle_query_is_not_delayed():
+    """With no concurrent traffic a query is embedded without waiting max_wait_ms."""
+    batcher = EmbeddingBatcher(lambda texts: [[1.0] for _ in texts], max_batch=8, max_wait_ms=10_000)
+    assert batcher.embed("hello") == [1.0]
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    """A failed forward pass fails each waiting future, and the batcher keeps running."""
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("model crashed")
+        return [[0.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(embed, max_batch=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        batcher.embed("a")
+    assert batcher.embed("b") == [0.0]
+
+
+def test_many_threads():
+    """Results map back to the right callers under real thread concurrency."""
+    batcher = EmbeddingBatcher(lambda texts: [[float(t)] for t in texts], max_batch=16, max_wait_ms=2)
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(lambda i: batcher.embed(str(i)), range(200)))
+    assert results == [[float(i)] for i in range(200)]
@@ -0,0 +1,92 @@
+"""
+Tests for the async /chat/stream path: nothing on it may block the event loop.
+"""
+import asyncio
+import time
+
+import httpx
+
+from app.main import app
+from app.api import chat
+from app.llm.provider import LLMProvider
+from app.rag import embeddings, retrieve
+from app.rag.batcher import EmbeddingBatcher
+from app.rag.vector_store import SearchHit
+
+
+class SleepyLLM(LLMProvider):
+    """Sync provider whose stream blocks like a network read (time.sleep)."""
+
+    def generate(self, prompt):
+        return "".join(self.generate_stream(prompt))
+
+    def generate_stream(self, prompt):
+        for token in ["Open ", "9am ", "to ", "5pm."]:
+            time.sleep(0.05)
+            yield token
+
+
+class SlowLocalStore:
+    """CPU-bound search, as in the in-process backend."""
+
+    def search(self, api_key_id, vector, limit):
+        time.sleep(0.05)
+        return [SearchHit(id="p1", score=0.9, payload={"text": "Open 9am to 5pm."})]
+
+    async def asearch(self, api_key_id, vector, limit):
+        return await asyncio.to_thread(self.search, api_key_id, vector, limit)
+
+
+def test_default_agenerate_stream_bridges_sync_stream():
+    """Providers without a native async client still stream asynchronously."""
+    async def collect():
+        return [chunk async for chunk in SleepyLLM().agenerate_stream("q")]
+
+    assert asyncio.run(collect()) == ["Open ", "9am ", "to ", "5pm."]
+
+
+def test_aembed_query_awaits_the_batcher(monkeypatch):
+    """Async query embedding resolves through the micro-batcher without a blocked thread."""
+    monkeypatch.setattr(embeddings, "EMBED_QUERY_BATCHING", True)
+    monkeypatch.setattr(
+        embeddings, "_query_batcher",
+        EmbeddingBatcher(lambda texts: [[float(len(t))] for t in texts], max_batch=8, max_wait_ms=1)
+    )
+
+    async def embed_all():
+        return await asyncio.gather(*(embeddings.aembed_query("x" * i) for i in range(1, 6)))
+
+    assert asyncio.run(embed_all()) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+
+
+def test_concurrent_streams_do_not_block_each_other(api_key, monkeypatch):
+    """Streams overlap on one event loop even with blocking search and provider I/O."""
+    raw_key, _ = api_key
+
+    async def aembed_query(text):
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(retrieve, "_cache", None)
+    monkeypatch.setattr(retrieve, "aembed_query", aembed_query)
+    monkeypatch.setattr(chat, "vector_store_for", lambda key: SlowLocalStore())
+    monkeypatch.setattr(chat, "get_llm_provider", lambda name: SleepyLLM())
+
+    async def run(n):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def one(i):
+                response = await client.post(
+                    "/chat/stream",
+                    json={"query": f"opening hours {i}?"},
+                    headers={"Authorization": f"Bearer {raw_key}"}
+                )
+                return response.text
+
+            start = time.perf_counter()
+            bodies = await asyncio.gather(*(one(i) for i in range(n)))
+            return bodies, time.perf_counter() - start
+
+    bodies, elapsed = asyncio.run(run(8))
+    assert all(body.endswith("data: [DONE]\n\n") and "5pm." in body for body in bodies)
+    # Serialized, 8 streams would take 8 * 0.25s
+    assert elapsed < 1.0
@@ -0,0 +1,87 @@
+"""
+Tests for POST /chat/batch.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api import chat
+from app.core.usage import approx_tokens_from_chars
+from app.rag.vector_store import SearchHit
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def batch_env(api_key, fake_llm, fake_store, monkeypatch):
+    """Fake embeddings, store and LLM that record how they were called."""
+    embedded = []
+
+    async def aembed_texts(texts):
+        embedded.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    fake_store.hits = lambda vector: [] if vector[0] == len("nothing here?") else [
+        SearchHit(id="p1", score=0.9, payload={"text": "Open 9am to 5pm."})
+    ]
+    # Batches must use agenerate
+    fake_llm.sync, fake_llm.delay, fake_llm.fail_on = False, 0.01, "explode"
+    monkeypatch.setattr(chat, "aembed_texts", aembed_texts)
+    monkeypatch.setattr(chat, "CHAT_BATCH_CONCURRENCY", 2)
+    return api_key, {"embed": embedded, "store": fake_store, "llm": fake_llm}
+
+
+def test_batch_returns_per_item_results(batch_env, chat_tokens):
+    """One embed pass and one search for the batch; failures stay per item; usage is charged once."""
+    (raw_key, api_key_id), calls = batch_env
+    queries = ["when do you open?", "", "nothing here?", "please explode", "weekend hours?", "holiday hours?"]
+
+    response = client.post("/chat/batch", json={"queries": queries}, headers={"Authorization": f"Bearer {raw_key}"})
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert [r["answer"] for r in results] == ["9am to 5pm", None, None, None, "9am to 5pm", "9am to 5pm"]
+    assert results[1]["error"] == "Empty query"
+    assert results[2]["error"] == chat.NO_DOCUMENTS
+    assert results[3]["error"] == "provider timeout"
+
+    assert calls["embed"] == [[q for q in queries if q]]
+    assert calls["store"].batches == [5]
+    assert calls["llm"].max_running == 2
+
+    answered = [queries[0], queries[4], queries[5]]
+    assert chat_tokens(api_key_id) == approx_tokens_from_chars(sum(map(len, answered)) + 3 * len("9am to 5pm"))
+
+
+def test_batch_size_is_limited(batch_env, monkeypatch):
+    """Empty and oversized batches are rejected before any work."""
+    (raw_key, _), calls = batch_env
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    monkeypatch.setattr(chat, "CHAT_BATCH_MAX_QUERIES", 3)
+
+    assert client.post("/chat/batch", json={"queries": []}, headers=headers).status_code == 400
+    assert client.post("/chat/batch", json={"queries": ["q"] * 4}, headers=headers).status_code == 400
+    assert calls["embed"] == []
+
+
+def test_batch_item_failing_before_the_llm_keeps_the_others(batch_env, chat_tokens, monkeypatch):
+    """An error assembling one question's prompt fails that item only; the rest are answered and charged."""
+    (raw_key, api_key_id), calls = batch_env
+    assemble = chat._aassemble
+
+    async def flaky_assemble(context, query, api_key):
+        if "broken" in query:
+            raise RuntimeError("chunk store unavailable")
+        return await assemble(context, query, api_key)
+
+    monkeypatch.setattr(chat, "_aassemble", flaky_assemble)
+    before = chat_tokens(api_key_id)
+
+    queries = ["when do you open?", "broken question?"]
+    response = client.post("/chat/batch", json={"queries": queries}, headers={"Authorization": f"Bearer {raw_key}"})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["answer"] == "9am to 5pm"
+    assert results[1]["answer"] is None and results[1]["error"] == "chunk store unavailable"
+
+    assert chat_tokens(api_key_id) - before == approx_tokens_from_chars(len(queries[0]) + len("9am to 5pm"))
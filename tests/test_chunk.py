@@ -0,0 +1,113 @@
+"""
+Tests for chunking and the streaming ingestion helpers.
+"""
+import re
+
+import pytest
+
+from app.ingest.chunk import chunk_text, iter_chunks, iter_token_chunks, split_sentences
+from app.ingest.pipeline import iter_batches, prefetch
+
+
+@pytest.mark.parametrize("n_words", [0, 1, 49, 50, 450, 500, 501, 950, 2345])
+def test_iter_chunks_matches_chunk_text(n_words):
+    """Streaming chunks over pages equal chunking the joined text."""
+    words = [f"w{i}" for i in range(n_words)]
+    # Uneven pages so chunk windows straddle page boundaries
+    pages, i, size = [], 0, 1
+    while i < n_words:
+        pages.append(" ".join(words[i:i + size]) + "\n")
+        i += size
+        size = size * 3 % 211 + 1
+
+    assert list(iter_chunks(pages)) == chunk_text("".join(pages))
+
+
+class WhitespaceTokenizer:
+    """Fast-tokenizer stand-in: one token per whitespace-separated word, with char offsets."""
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True):
+        offsets = [[m.span() for m in re.finditer(r"\S+", text)] for text in texts]
+        return {"input_ids": [list(range(len(o))) for o in offsets], "offset_mapping": offsets}
+
+
+def _document(n_sentences=120):
+    lengths = [3, 5, 8, 12, 20, 70]
+    ends = [". ", "! ", "? ", ".\n\n"]
+    return "".join(
+        " ".join(f"w{i}_{j}" for j in range(lengths[i * 7 % 6])) + ends[i % 4]
+        for i in range(n_sentences)
+    )
+
+
+def _split(text, n_pages):
+    cuts = [0] + [len(text) * k // n_pages for k in range(1, n_pages)] + [len(text)]
+    return [text[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+def test_split_sentences_keeps_unfinished_tail():
+    """Sentence spans (whitespace-trimmed) run up to the last boundary; the rest is the tail."""
+    spans, tail = split_sentences("First one. Second one! Third")
+    assert spans == [(0, 10), (11, 22)]
+    assert tail == 23
+
+
+@pytest.mark.parametrize("n_pages", [1, 3, 17, 90])
+def test_token_chunks_have_offsets_and_respect_limit(n_pages):
+    """Chunks are exact slices of the document, within max_tokens, whatever the page split."""
+    doc = _document()
+    reference = [(c.start, c.end) for c in iter_token_chunks([doc], WhitespaceTokenizer(), 50, 10)]
+    chunks = list(iter_token_chunks(_split(doc, n_pages), WhitespaceTokenizer(), 50, 10))
+
+    assert [(c.start, c.end) for c in chunks] == reference
+    for chunk in chunks:
+        assert chunk.text == doc[chunk.start:chunk.end]
+        assert chunk.token_count == len(chunk.text.split()) <= 50
+
+    covered = {word for chunk in chunks for word in chunk.text.split()}
+    assert covered == set(doc.split())
+
+
+def test_token_chunks_end_on_sentence_boundaries():
+    """Chunks break between sentences; only an oversized sentence is split mid-way."""
+    doc = _document()
+    for chunk in iter_token_chunks([doc], WhitespaceTokenizer(), 50, 10):
+        words = chunk.text.split()
+        # 70-word sentences cannot fit and are the only ones split
+        assert chunk.text.rstrip().endswith((".", "!", "?")) or len(words) == 50
+
+
+def test_iter_batches():
+    """Items are grouped into fixed-size batches with a short tail."""
+    assert list(iter_batches(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_batches([], 3)) == []
+
+
+def test_prefetch_preserves_order_and_errors():
+    """prefetch yields every item in order and re-raises producer errors."""
+    assert list(prefetch(iter(range(100)), max_buffered=2)) == list(range(100))
+
+    def failing():
+        yield 1
+        raise ValueError("bad page")
+
+    with pytest.raises(ValueError, match="bad page"):
+        list(prefetch(failing()))
+
+
+def test_prefetch_stops_producer_on_early_exit():
+    """Abandoning the consumer does not leave the producer thread running."""
+    produced = []
+
+    def endless():
+        i = 0
+        while True:
+            produced.append(i)
+            yield i
+            i += 1
+
+    gen = prefetch(endless(), max_buffered=1)
+    assert next(gen) == 0
+    gen.close()
+    count = len(produced)
+    assert count <= 4
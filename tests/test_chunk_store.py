@@ -0,0 +1,110 @@
+"""
+Tests for the chunk store: text kept out of vector payloads and loaded on demand.
+"""
+import uuid
+
+import numpy as np
+import pytest
+
+from app.db.base import SessionLocal
+from app.db.models import ChunkText, Document
+from app.rag import chunk_store, store as store_module
+from app.rag.chunk_store import move_payload_texts
+from app.rag.local_store import LocalVectorStore
+from app.rag.prompt import assemble_prompt
+from app.rag.retrieve import retrieve_chunks, with_texts
+from app.rag.vector_store import VectorPoint
+
+DIM = 8
+
+
+def _vector(text: str) -> list[float]:
+    return np.random.default_rng(abs(hash(text)) % 2**32).normal(size=DIM).tolist()
+
+
+@pytest.fixture
+def tenant(api_key, monkeypatch, tmp_path):
+    """An API key with one document, a local vector store and deterministic embeddings."""
+    _, api_key_id = api_key
+    db = SessionLocal()
+    document = Document(api_key_id=api_key_id, filename="faq.txt", file_hash=uuid.uuid4().hex, char_count=1, chunk_count=1)
+    db.add(document)
+    db.commit()
+    document_id = document.id
+    db.close()
+
+    monkeypatch.setattr(store_module, "embed_texts", lambda texts, batch_size=None: [_vector(t) for t in texts])
+    monkeypatch.setattr("app.rag.retrieve._cache", None)
+    return api_key_id, document_id, LocalVectorStore(root=str(tmp_path))
+
+
+def test_payloads_hold_lengths_and_text_is_compressed(tenant):
+    """Ingested points carry "chars", not text; the chunk store holds zlib-compressed text."""
+    api_key_id, document_id, store = tenant
+    texts = ["We open at 9am. " * 20, "Refunds take 5 days."]
+    store_module.store_texts(texts, api_key_id, document_id, store=store)
+
+    points = [point for batch in store.export(api_key_id) for point in batch]
+    assert all("text" not in point.payload for point in points)
+    assert sorted(point.payload["chars"] for point in points) == sorted(map(len, texts))
+
+    db = SessionLocal()
+    rows = db.query(ChunkText).filter(ChunkText.document_id == document_id).all()
+    db.close()
+    assert len(rows) == 2
+    assert sorted(chunk_store.decompress(row.text) for row in rows) == sorted(texts)
+    assert min(len(row.text) for row in rows if len(chunk_store.decompress(row.text)) > 100) < 100
+
+
+def test_only_selected_chunks_are_loaded(tenant, monkeypatch):
+    """Search returns lengths only; text is fetched for the chunks the prompt keeps."""
+    api_key_id, document_id, store = tenant
+    texts = [f"passage {i} " + "x" * 200 for i in range(6)]
+    store_module.store_texts(texts, api_key_id, document_id, store=store)
+
+    loaded = []
+    load_chunks = chunk_store.load_chunks
+    monkeypatch.setattr("app.rag.retrieve.load_chunks", lambda ids, documents: loaded.append(ids) or load_chunks(ids, documents))
+
+    candidates = retrieve_chunks("passage", api_key_id, limit=6, query_vector=_vector(texts[0]), store=store)
+    assert len(candidates) == 6
+    assert all(chunk.text is None and chunk.length == len(texts[0]) for chunk in candidates)
+
+    prompt = assemble_prompt(candidates, "which passage?", budget_tokens=120)
+    assert [sorted(ids) for ids in loaded] == [sorted(chunk.id for chunk in prompt.chunks)]
+    assert len(prompt.chunks) == 2
+    assert all(chunk.text in texts for chunk in prompt.chunks)
+
+
+def test_deleting_a_document_removes_its_texts(tenant):
+    """Deleted chunks lose their text, and stale search results are dropped on load."""
+    api_key_id, document_id, store = tenant
+    store_module.store_texts(["a", "b"], api_key_id, document_id, store=store)
+    candidates = retrieve_chunks("a", api_key_id, limit=2, query_vector=_vector("a"), store=store)
+
+    store_module.delete_document_vectors(document_id, api_key_id, store=store)
+    assert store.count(api_key_id) == 0
+    assert chunk_store.get_texts(chunk.id for chunk in candidates) == {}
+    assert with_texts(candidates) == []
+
+
+def test_legacy_payload_text_is_moved(tenant):
+    """The migration moves payload text into the chunk store and is safe to re-run."""
+    api_key_id, document_id, store = tenant
+    store.upsert(api_key_id, [
+        VectorPoint(id=str(uuid.uuid4()), vector=_vector(text), payload={"document_id": document_id, "text": text})
+        for text in ["old one", "old two"]
+    ])
+    legacy = retrieve_chunks("old", api_key_id, limit=2, query_vector=_vector("old one"), store=store)
+    assert {chunk.text for chunk in legacy} == {"old one", "old two"}
+
+    assert move_payload_texts(store, api_key_id, dry_run=True) == 2
+    assert all("text" in p.payload for batch in store.export(api_key_id) for p in batch)
+
+    assert move_payload_texts(store, api_key_id) == 2
+    assert move_payload_texts(store, api_key_id) == 0
+
+    points = [point for batch in store.export(api_key_id) for point in batch]
+    assert [point.payload.get("text") for point in points] == [None, None]
+    moved = with_texts(retrieve_chunks("old", api_key_id, limit=2, query_vector=_vector("old one"), store=store))
+    assert {chunk.text for chunk in moved} == {"old one", "old two"}
@@ -0,0 +1,116 @@
+"""
+Tests for single-flight coalescing of identical in-flight LLM generations.
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.main import app
+from app.api import chat
+from app.llm.coalesce import Coalescer
+
+TOKENS = ["Open ", "9am ", "to ", "5pm."]
+# Streams TOKENS a little apart, counting upstream generations
+streaming_llm = pytest.mark.parametrize("fake_llm", [{"answer": "".join(TOKENS), "delay": 0.02}], indirect=True)
+
+
+@streaming_llm
+def test_stream_subscribers_share_one_generation(fake_llm):
+    """A late subscriber replays the tokens so far; the upstream stream runs once."""
+    llm, coalescer = fake_llm, Coalescer(enabled=True)
+
+    async def subscribe(delay):
+        await asyncio.sleep(delay)
+        tokens, shared = coalescer.stream(("stub", "stub", "h"), lambda: llm.agenerate_stream("q"))
+        return [token async for token in tokens], shared
+
+    async def run():
+        return await asyncio.gather(subscribe(0), subscribe(0.03), subscribe(0.05))
+
+    assert asyncio.run(run()) == [(TOKENS, False), (TOKENS, True), (TOKENS, True)]
+    assert llm.streams == 1
+    assert coalescer.stats() == {"enabled": True, "generations": 1, "joined": 2, "joined_rate": 0.6667, "in_flight": 0}
+
+
+@streaming_llm
+def test_upstream_is_cancelled_when_every_subscriber_leaves(fake_llm):
+    """One subscriber disconnecting keeps the stream going; the last one stops it."""
+    llm, coalescer = fake_llm, Coalescer(enabled=True)
+
+    async def run():
+        first, _ = coalescer.stream(("stub", "stub", "h"), lambda: llm.agenerate_stream("q"))
+        second, shared = coalescer.stream(("stub", "stub", "h"), lambda: llm.agenerate_stream("q"))
+        assert shared
+        assert await anext(first) == await anext(second) == "Open "
+        await first.aclose()
+        assert await anext(second) == "9am "
+        await second.aclose()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert llm.streams == 1 and llm.cancelled == 1
+    assert coalescer.stats()["in_flight"] == 0
+
+
+def test_sync_callers_wait_for_the_leader():
+    """Threads asking the same thing at once get one generation; errors reach every caller."""
+    coalescer = Coalescer(enabled=True)
+    release, calls, results = threading.Event(), [], []
+
+    def generate():
+        calls.append(1)
+        release.wait(5)
+        return "pong"
+
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run("k", generate))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while coalescer.stats()["joined"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("pong", False)] + [("pong", True)] * 3
+
+    def fail():
+        raise ConnectionError("upstream down")
+
+    with pytest.raises(ConnectionError):
+        coalescer.run("k", fail)
+    assert coalescer.stats()["in_flight"] == 0
+
+
+@streaming_llm
+def test_concurrent_identical_streams_are_coalesced_and_charged_each(api_key, fake_llm, fake_store, chat_tokens, monkeypatch):
+    """Identical /chat/stream requests share one upstream stream; every caller pays for its answer."""
+    raw_key, api_key_id = api_key
+    llm = fake_llm
+    monkeypatch.setattr("app.llm.coalesce._coalescer", Coalescer(enabled=True))
+
+    async def run(n):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def one():
+                response = await client.post(
+                    "/chat/stream",
+                    json={"query": "when do you open?"},
+                    headers={"Authorization": f"Bearer {raw_key}"},
+                )
+                return response.text
+            return await asyncio.gather(*(one() for _ in range(n)))
+
+    before = chat_tokens(api_key_id)
+    [single] = asyncio.run(run(1))
+    charge = chat_tokens(api_key_id) - before
+    assert charge > 0 and llm.streams == 1
+
+    bodies = asyncio.run(run(4))
+    assert bodies == [single] * 4
+    assert llm.streams == 2
+    assert chat_tokens(api_key_id) - before == 5 * charge
+    stats = chat.get_llm_call_counters().stats()
+    assert stats["calls"] == 2 and stats["avoided_coalesced"] == 3
@@ -0,0 +1,40 @@
+"""
+Tests for exact and near-duplicate chunk detection.
+"""
+from app.ingest.dedup import ChunkDeduplicator, fingerprint, similarity
+
+FOOTER = "Copyright 2024 Acme Corp. All rights reserved. Unauthorized reproduction of this manual is prohibited. Page 3 of 120"
+
+
+def _paragraph(seed: int, n_words: int = 80) -> str:
+    return " ".join(f"term{(seed * 31 + i * 7) % 997}" for i in range(n_words))
+
+
+def test_exact_duplicates_ignore_case_and_whitespace():
+    """Normalized text equality is an exact duplicate."""
+    dedup = ChunkDeduplicator()
+    assert dedup.check(fingerprint("Reset the router.\n\nHold the button")) is None
+    assert dedup.check(fingerprint("reset the   router. hold the BUTTON")) == "exact"
+
+
+def test_near_duplicates_are_detected():
+    """A repeated footer with a different page number is a near duplicate."""
+    dedup = ChunkDeduplicator(threshold=0.7)
+    body = _paragraph(1)
+    assert dedup.check(fingerprint(body + " " + FOOTER)) is None
+    assert dedup.check(fingerprint(body + " " + FOOTER.replace("Page 3", "Page 4"))) == "near"
+
+
+def test_distinct_chunks_are_kept():
+    """Unrelated chunks are neither exact nor near duplicates."""
+    dedup = ChunkDeduplicator()
+    kinds = [dedup.check(fingerprint(_paragraph(seed))) for seed in range(50)]
+    assert kinds == [None] * 50
+
+
+def test_existing_fingerprints_seed_the_index():
+    """Fingerprints loaded from the knowledge base are matched like in-document ones."""
+    stored = fingerprint(_paragraph(7))
+    dedup = ChunkDeduplicator(existing=[stored])
+    assert dedup.match(fingerprint(_paragraph(7))) == "exact"
+    assert similarity(stored.signature, fingerprint(_paragraph(8)).signature) < 0.5
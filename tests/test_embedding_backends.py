@@ -0,0 +1,62 @@
+"""
+Parity tests: every embedding backend must agree with the PyTorch reference.
+
+Skipped when a backend's optional dependencies or the model weights are
+not available (e.g. offline CI).
+"""
+import numpy as np
+import pytest
+
+from app.rag.embeddings import EMBEDDING_BACKENDS, load_model
+
+SENTENCES = [
+    "What are your opening hours?",
+    "Customers can request a refund within 30 days of purchase.",
+    "To reset the device, hold the power button for ten seconds.",
+    "Support is available Monday to Friday, 9AM to 5PM.",
+    "Invoices are emailed on the first business day of each month.",
+]
+
+# Minimum cosine similarity to the PyTorch vectors
+MIN_COSINE = {
+    "torch-int8": 0.97,
+    "onnx": 0.999,
+    "onnx-int8": 0.97,
+}
+
+
+def _load_or_skip(backend: str):
+    try:
+        return load_model(backend)
+    except ImportError as e:
+        pytest.skip(f"{backend} dependencies not installed: {e}")
+    except OSError as e:
+        pytest.skip(f"model weights unavailable: {e}")
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return _load_or_skip("torch").encode(SENTENCES)
+
+
+def test_every_backend_has_a_threshold():
+    """New backends must declare their parity threshold here."""
+    assert set(EMBEDDING_BACKENDS) - {"torch"} == set(MIN_COSINE)
+
+
+@pytest.mark.parametrize("backend", sorted(MIN_COSINE))
+def test_backend_matches_torch(backend, reference):
+    """Vectors from each backend point the same way as PyTorch's."""
+    vectors = _load_or_skip(backend).encode(SENTENCES)
+
+    assert vectors.shape == reference.shape
+    cosine = np.sum(vectors * reference, axis=1) / (
+        np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+    )
+    assert cosine.min() >= MIN_COSINE[backend]
+
+
+def test_unknown_backend_rejected():
+    """Misconfigured EMBEDDING_BACKEND fails loudly."""
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        load_model("tpu")
@@ -0,0 +1,75 @@
+"""
+Tests for the content-addressed embedding cache.
+"""
+import numpy as np
+import pytest
+
+from app.rag import embeddings
+from app.rag.embedding_cache import EmbeddingCache, cache_key
+
+
+class CountingModel:
+    """Deterministic stand-in for SentenceTransformer that counts encoded texts."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32):
+        self.encoded.extend(texts)
+        return np.array([[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_key_normalizes_whitespace_and_includes_model():
+    """Whitespace-only differences share a key; different models do not."""
+    assert cache_key("m", "hello   world\n") == cache_key("m", " hello world")
+    assert cache_key("m", "hello world") != cache_key("other", "hello world")
+
+
+def test_lru_eviction_and_counters():
+    """The memory tier is bounded and counts hits, misses and evictions."""
+    cache = EmbeddingCache(max_items=2)
+    a, b, c = (cache_key("m", t) for t in "abc")
+
+    cache.put_many({a: np.ones(3), b: np.zeros(3)})
+    assert set(cache.get_many([a])) == {a}  # a becomes most recent
+    cache.put_many({c: np.ones(3)})         # evicts b
+
+    assert set(cache.get_many([a, b, c])) == {a, c}
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Vectors written to the SQLite tier are found by a new cache instance."""
+    path = str(tmp_path / "cache.sqlite")
+    key = cache_key("m", "refund policy")
+
+    EmbeddingCache(max_items=10, disk_path=path).put_many({key: np.arange(4, dtype=np.float32)})
+
+    restarted = EmbeddingCache(max_items=10, disk_path=path)
+    found = restarted.get_many([key])
+    assert np.array_equal(found[key], np.arange(4, dtype=np.float32))
+    assert restarted.stats()["disk_hits"] == 1
+
+
+@pytest.fixture
+def counting_model(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(embeddings, "_model", model)
+    monkeypatch.setattr(embeddings, "_cache", EmbeddingCache(max_items=100))
+    return model
+
+
+def test_embed_texts_skips_cached_and_duplicate_texts(counting_model):
+    """Only texts not seen before are sent to the model, once each."""
+    first = embeddings.embed_texts(["opening hours", "refund policy", "opening hours"])
+    assert counting_model.encoded == ["opening hours", "refund policy"]
+    assert first[0] == first[2]
+
+    second = embeddings.embed_texts(["refund  policy", "shipping"])
+    assert counting_model.encoded == ["opening hours", "refund policy", "shipping"]
+    assert second[0] == first[1]
+    assert embeddings.embed_text("opening hours") == first[0]
@@ -0,0 +1,287 @@
+"""
+Tests for background ingestion jobs and the job status endpoints.
+"""
+import hashlib
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.deps import get_current_user
+from app.db.base import SessionLocal
+from app.db.models import APIKey, ChunkFingerprint, Document, IngestJob, User, VectorPurge
+from app.ingest import jobs
+from app.rag import purge, vector_store
+from app.rag.local_store import LocalVectorStore
+from app.rag.retrieve import retrieve_chunks, with_texts
+from tests.test_chunk import WhitespaceTokenizer
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fake_tokenizer(monkeypatch):
+    """Keep the token-aware chunker off the real embedding model."""
+    monkeypatch.setattr(jobs, "get_tokenizer", WhitespaceTokenizer)
+    monkeypatch.setattr(jobs, "get_max_tokens", lambda: 100)
+
+
+def _fake_pages(*page_texts):
+    def iter_pages(f, on_page=None):
+        for number, text in enumerate(page_texts, start=1):
+            yield text
+            on_page(number, len(page_texts))
+    return iter_pages
+
+
+def _create_job(api_key_id: int) -> int:
+    db = SessionLocal()
+    job = IngestJob(api_key_id=api_key_id, filename="manual.pdf")
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def test_job_endpoints_require_auth():
+    """Job status endpoints reject requests without an API key."""
+    response = client.get("/ingest/jobs")
+    assert response.status_code in (401, 403)
+
+
+def test_unknown_job_returns_404(api_key):
+    """Jobs belonging to nobody (or another key) are not visible."""
+    raw_key, _ = api_key
+    response = client.get("/ingest/jobs/999999", headers={"Authorization": f"Bearer {raw_key}"})
+    assert response.status_code == 404
+
+
+def test_run_ingest_job_completes(api_key, monkeypatch, tmp_path):
+    """A successful run records the document and reports 100% progress."""
+    raw_key, api_key_id = api_key
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF")
+
+    stored = {"count": 0, "payloads": []}
+
+    def fake_store_texts(texts, api_key_id, document_id, payloads=None, **kwargs):
+        stored["count"] += len(texts)
+        stored["payloads"].extend(payloads)
+        return len(texts)
+
+    words = [f"word{i} " for i in range(1200)]
+    monkeypatch.setattr(jobs, "iter_pdf_pages", _fake_pages("".join(words[:600]), "".join(words[600:])))
+    monkeypatch.setattr(jobs, "store_texts", fake_store_texts)
+
+    job_id = _create_job(api_key_id)
+    jobs.run_ingest_job(job_id, str(path))
+
+    response = client.get(f"/ingest/jobs/{job_id}", headers={"Authorization": f"Bearer {raw_key}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "completed"
+    assert data["stage"] == "done"
+    assert data["progress"] == 100
+    assert data["chunks_total"] == stored["count"]
+    assert data["chunks_embedded"] == stored["count"]
+    assert data["document_id"] is not None
+    assert stored["payloads"][0] == {"char_start": 0, "char_end": len("".join(words[:100])) - 1}
+    assert stored["payloads"][-1]["char_end"] == len("".join(words)) - 1
+
+    listed = client.get("/ingest/jobs", headers={"Authorization": f"Bearer {raw_key}"}).json()
+    assert [j["id"] for j in listed] == [job_id]
+
+
+def test_run_ingest_job_failure_cleans_up(api_key, monkeypatch, tmp_path):
+    """A failure during embedding marks the job failed and removes the document."""
+    _, api_key_id = api_key
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF")
+
+    def failing_store_texts(*args, **kwargs):
+        raise RuntimeError("qdrant unavailable")
+
+    monkeypatch.setattr(jobs, "iter_pdf_pages", _fake_pages("word " * 100))
+    monkeypatch.setattr(jobs, "store_texts", failing_store_texts)
+
+    job_id = _create_job(api_key_id)
+    jobs.run_ingest_job(job_id, str(path))
+
+    db = SessionLocal()
+    job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+    assert job.status == "failed"
+    assert "qdrant unavailable" in job.error
+    assert db.query(Document).filter(Document.api_key_id == api_key_id).count() == 0
+    # Any vectors written before the failure are left to the purger
+    assert db.query(VectorPurge).filter(VectorPurge.api_key_id == api_key_id).count() == 1
+    db.close()
+
+
+def test_duplicate_chunks_are_skipped(api_key, monkeypatch, tmp_path):
+    """Repeated pages are embedded once, and a later upload skips chunks already in the KB."""
+    raw_key, api_key_id = api_key
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF")
+    stored = []
+
+    def fake_store_texts(texts, api_key_id, document_id, **kwargs):
+        stored.extend(texts)
+        return len(texts)
+
+    monkeypatch.setattr(jobs, "store_texts", fake_store_texts)
+    monkeypatch.setattr(jobs, "get_max_tokens", lambda: 20)
+    monkeypatch.setattr(jobs, "CHUNK_OVERLAP_TOKENS", 0)
+
+    notice = "Legal notice: this manual may not be copied or distributed without permission. "
+    first = _fake_pages(notice * 2 + "Setup steps are listed below.\n", notice * 2 + "Pair the remote first.\n")
+    monkeypatch.setattr(jobs, "iter_pdf_pages", first)
+    job_id = _create_job(api_key_id)
+    jobs.run_ingest_job(job_id, str(path))
+
+    data = client.get(f"/ingest/jobs/{job_id}", headers={"Authorization": f"Bearer {raw_key}"}).json()
+    assert data["status"] == "completed"
+    assert data["chunks_duplicate"] > 0
+    assert data["chunks_embedded"] == len(stored) == len(set(stored))
+    assert data["chunks_total"] == data["chunks_embedded"] + data["chunks_duplicate"] + data["chunks_near_duplicate"]
+
+    db = SessionLocal()
+    document = db.query(Document).filter(Document.id == data["document_id"]).first()
+    assert document.chunk_count == len(stored)
+    assert db.query(ChunkFingerprint).filter(ChunkFingerprint.document_id == document.id).count() == len(stored)
+    db.close()
+
+    # Only the new sentence of a second manual is embedded
+    stored.clear()
+    new_text = "Charging the remote fully takes about two hours from empty."
+    monkeypatch.setattr(jobs, "iter_pdf_pages", _fake_pages(notice + new_text + "\n"))
+    job_id = _create_job(api_key_id)
+    jobs.run_ingest_job(job_id, str(path))
+
+    data = client.get(f"/ingest/jobs/{job_id}", headers={"Authorization": f"Bearer {raw_key}"}).json()
+    assert data["status"] == "completed"
+    assert data["chunks_duplicate"] == 1
+    assert stored == [new_text]
+
+
+def _vector(text):
+    seed = int(hashlib.md5(text.strip().encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).normal(size=8).tolist()
+
+
+def test_shared_chunks_outlive_the_document_that_stored_them(api_key, monkeypatch, tmp_path):
+    """B refers to chunks A stored; deleting A hands them to B, so B's content stays retrievable."""
+    raw_key, api_key_id = api_key
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF")
+    store = LocalVectorStore(root=str(tmp_path / "vectors"))
+    monkeypatch.setattr(vector_store, "_stores", {"local": store})
+    monkeypatch.setattr("app.rag.retrieve._cache", None)
+    monkeypatch.setattr("app.rag.store.embed_texts", lambda texts, batch_size=None: [_vector(t) for t in texts])
+    monkeypatch.setattr(jobs, "get_max_tokens", lambda: 20)
+    monkeypatch.setattr(jobs, "CHUNK_OVERLAP_TOKENS", 0)
+
+    db = SessionLocal()
+    db.query(VectorPurge).delete()  # left by other tests
+    key = db.query(APIKey).filter(APIKey.id == api_key_id).first()
+    key.vector_backend = "local"
+    db.commit()
+    user = db.query(User).filter(User.id == key.user_id).first()
+    db.expunge(user)
+    db.close()
+
+    shared = "Warranty claims need the receipt and the serial number printed under the battery cover. "
+    documents = []
+    pairing = "Pair the remote with the television before first use by holding both buttons for five seconds."
+    charging = "Charging the remote fully takes about two hours from empty using the supplied cable and adapter."
+    for own in (pairing, charging):
+        monkeypatch.setattr(jobs, "iter_pdf_pages", _fake_pages(shared + own + "\n"))
+        job_id = _create_job(api_key_id)
+        jobs.run_ingest_job(job_id, str(path))
+        data = client.get(f"/ingest/jobs/{job_id}", headers={"Authorization": f"Bearer {raw_key}"}).json()
+        assert data["status"] == "completed"
+        documents.append(data["document_id"])
+    doc_a, doc_b = documents
+    assert data["chunks_duplicate"] == 1
+    assert store.count(api_key_id) == 3
+
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        assert client.delete(f"/documents/{doc_a}", headers={"Authorization": "Bearer x"}).status_code == 200
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def served(text):
+        chunks = retrieve_chunks(text, api_key_id, limit=3, query_vector=_vector(text), store=store)
+        return [chunk.text for chunk in with_texts(chunks)]
+
+    # Served before the purge (the payload still names A) and after it
+    assert shared.strip() in served(shared)
+    assert purge.purge_pending() == 1
+    assert shared.strip() in served(shared)
+    assert store.count(api_key_id) == 2
+    assert {p.payload["document_id"] for batch in store.export(api_key_id) for p in batch} == {doc_b}
+    assert pairing not in served(pairing)
+
+    # Once B goes too, nothing is left behind
+    db = SessionLocal()
+    with vector_store.tenant_lock(api_key_id):
+        key = db.query(APIKey).filter(APIKey.id == api_key_id).first()
+        purge.tombstone_document(db, key, db.query(Document).filter(Document.id == doc_b).first())
+        db.commit()
+    db.close()
+    assert purge.purge_pending() == 1
+    assert store.count(api_key_id) == 0
+
+
+def test_full_queue_rejects_upload_before_spooling(api_key, monkeypatch):
+    """With every slot taken, POST /ingest answers 503 without writing the upload or a job."""
+    raw_key, api_key_id = api_key
+    spooled = []
+    monkeypatch.setattr(jobs, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr("app.api.ingest.tempfile.mkstemp", lambda **kwargs: spooled.append(kwargs))
+    jobs.reserve_ingest_slot()
+
+    response = client.post(
+        "/ingest",
+        files={"file": ("manual.pdf", b"%PDF", "application/pdf")},
+        headers={"Authorization": f"Bearer {raw_key}"}
+    )
+    assert response.status_code == 503
+    assert spooled == []
+    db = SessionLocal()
+    assert db.query(IngestJob).filter(IngestJob.api_key_id == api_key_id).count() == 0
+    db.close()
+
+
+def test_recover_jobs_fails_interrupted_jobs(api_key):
+    """Jobs left queued or running by a restart are failed, and their partial documents discarded."""
+    _, api_key_id = api_key
+    db = SessionLocal()
+    db.query(IngestJob).filter(IngestJob.status.in_(["queued", "running"])).delete()  # left by other tests
+    document = Document(api_key_id=api_key_id, filename="manual.pdf", file_hash="", char_count=0, chunk_count=0)
+    db.add(document)
+    db.commit()
+    running = IngestJob(api_key_id=api_key_id, filename="manual.pdf", status="running", document_id=document.id)
+    queued = IngestJob(api_key_id=api_key_id, filename="other.pdf")
+    completed = IngestJob(api_key_id=api_key_id, filename="done.pdf", status="completed")
+    db.add_all([running, queued, completed])
+    db.commit()
+    job_ids = [running.id, queued.id, completed.id]
+    document_id = document.id
+    db.close()
+
+    # Another process may still be working on recently updated jobs
+    assert jobs.recover_jobs(stale_after=3600) == 0
+    assert jobs.recover_jobs(stale_after=0) == 2
+
+    db = SessionLocal()
+    statuses = [db.query(IngestJob).filter(IngestJob.id == job_id).first() for job_id in job_ids]
+    assert [job.status for job in statuses] == ["failed", "failed", "completed"]
+    assert "restart" in statuses[0].error
+    assert statuses[0].document_id is None
+    assert db.query(Document).filter(Document.id == document_id).count() == 0
+    assert db.query(VectorPurge).filter(VectorPurge.document_id == document_id).count() == 1
+    db.close()
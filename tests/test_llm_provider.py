@@ -0,0 +1,160 @@
+"""
+Tests for the process-wide LLM provider registry and its pooled HTTP clients.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.llm import provider as provider_module
+from app.llm.provider import FakeProvider, FakeProviderError, close_llm_providers, get_llm_provider, llm_pool_stats
+
+
+class CompletionStub(BaseHTTPRequestHandler):
+    """OpenAI-compatible /chat/completions that counts the connections it accepts."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("stream"):
+            content_type, payload = "text/event-stream", "".join(
+                "data: " + json.dumps({
+                    "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }) + "\n\n"
+                for token in ("po", "ng")
+            ).encode() + b"data: [DONE]\n\n"
+        else:
+            content_type, payload = "application/json", json.dumps({
+                "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+            }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    CompletionStub.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    close_llm_providers()
+    server.shutdown()
+
+
+def test_providers_are_created_once_per_configuration(stub_url):
+    """The same provider, model and base URL share one instance (and pool)."""
+    first = get_llm_provider("openai", base_url=f"{stub_url}/v1")
+    assert get_llm_provider("OpenAI", base_url=f"{stub_url}/v1") is first
+    assert get_llm_provider("openai", model="gpt-4o", base_url=f"{stub_url}/v1") is not first
+    assert get_llm_provider("groq", base_url=f"{stub_url}/openai/v1") is not first
+
+    with pytest.raises(ValueError, match="Unknown LLM provider"):
+        get_llm_provider("nope")
+
+    close_llm_providers()
+    assert provider_module._providers == {}
+    assert get_llm_provider("openai", base_url=f"{stub_url}/v1") is not first
+
+
+@pytest.mark.parametrize("name, path", [("openai", "/v1"), ("groq", "/openai/v1")])
+def test_requests_reuse_kept_alive_connections(stub_url, name, path):
+    """Sequential chats go over one connection, and the pool counters say so."""
+    llm = get_llm_provider(name, base_url=stub_url + path)
+    assert [llm.generate("ping") for _ in range(5)] == ["pong"] * 5
+
+    assert CompletionStub.connections == 1
+    stats = llm_pool_stats()[f"{name}:{llm.model}@{stub_url}{path}"]["sync"]
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1
+    assert stats["reuse_rate"] == 0.8
+    assert stats["open"] == stats["idle"] == 1
+
+
+@pytest.mark.parametrize("name, path", [("openai", "/v1"), ("groq", "/openai/v1")])
+def test_async_streams_use_a_native_client_per_event_loop(stub_url, name, path):
+    """agenerate_stream awaits the async SDK; each event loop keeps its own warm pool."""
+    llm = get_llm_provider(name, base_url=stub_url + path)
+
+    async def chats():
+        streams = [[token async for token in llm.agenerate_stream("ping")] for _ in range(3)]
+        return streams, await llm.agenerate("ping")
+
+    for _ in range(2):
+        assert asyncio.run(chats()) == ([["po", "ng"]] * 3, "pong")
+
+    stats = llm_pool_stats()[f"{name}:{llm.model}@{stub_url}{path}"]
+    assert stats["sync"]["requests"] == 0
+    assert stats["async"]["event_loops"] == 2
+    assert stats["async"]["requests"] == 8
+    assert stats["async"]["connections_opened"] == CompletionStub.connections == 2
+
+
+def test_fake_provider_is_deterministic_and_paced():
+    """The fake provider needs no credentials, repeats its answers, keeps its timing and fails on a seeded schedule."""
+    llm = FakeProvider(ttft_ms=50, tokens_per_second=100, output_tokens=6)
+    assert get_llm_provider("fake").model == "fake"
+
+    async def stream():
+        start, arrivals, tokens = time.perf_counter(), [], []
+        async for token in llm.agenerate_stream("when do you open?"):
+            arrivals.append(time.perf_counter() - start)
+            tokens.append(token)
+        return tokens, arrivals
+
+    tokens, arrivals = asyncio.run(stream())
+    assert len(tokens) == 6
+    assert "".join(tokens) == llm.generate("when do you open?") == asyncio.run(llm.agenerate("when do you open?"))
+    assert llm.generate("when do you close?") != llm.generate("when do you open?")
+    assert 0.05 <= arrivals[0] < 0.09
+    assert 0.1 <= arrivals[-1] < 0.2
+
+    def failures(seed):
+        flaky = FakeProvider(ttft_ms=0, tokens_per_second=0, output_tokens=1, error_rate=0.3, seed=seed)
+        outcomes = []
+        for _ in range(40):
+            try:
+                flaky.generate("q")
+                outcomes.append(True)
+            except FakeProviderError:
+                outcomes.append(False)
+        return outcomes
+
+    assert failures(seed=7) == failures(seed=7)
+    assert 4 <= failures(seed=7).count(False) <= 20
+
+
+def test_pool_counters_never_fail_a_request(stub_url, monkeypatch):
+    """If httpx's pool internals can't be read, chats still succeed and only the counts are missing."""
+    llm = get_llm_provider("openai", base_url=f"{stub_url}/v1")
+    pool = llm.http.client._transport._pool
+
+    def moved(self):
+        raise AttributeError("connections")
+
+    monkeypatch.setattr(type(pool), "connections", property(moved))
+
+    assert llm.generate("ping") == "pong"
+    stats = llm_pool_stats()[f"openai:{llm.model}@{stub_url}/v1"]["sync"]
+    assert stats["requests"] == 1
+    assert stats["connections_opened"] == stats["open"] == 0
@@ -0,0 +1,191 @@
+"""
+Tests for latency-aware LLM routing: hedged first tokens, failover and the circuit breaker.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.llm import provider as provider_module
+from app.llm.provider import LLMProvider, RoutedProvider, get_llm_provider, provider_health
+
+
+class StubLLM(LLMProvider):
+    """Streams `tokens` after `ttft` seconds, or fails; counts calls and cancellations."""
+
+    def __init__(self, tokens=("po", "ng"), ttft=0.0, fail=False, model=None, base_url=None):
+        self.tokens, self.ttft, self.fail = tokens, ttft, fail
+        self.model = model or "stub"
+        self.calls = 0
+        self.cancelled = 0
+
+    def generate(self, prompt):
+        return "".join(self.tokens)
+
+    def generate_stream(self, prompt):
+        yield from self.tokens
+
+    async def agenerate_stream(self, prompt):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.ttft)
+            if self.fail:
+                raise ConnectionError("503 Service Unavailable")
+            for token in self.tokens:
+                yield token
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+class UnconfiguredLLM(StubLLM):
+    def __init__(self, model=None, base_url=None):
+        raise ValueError("API key not set")
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    monkeypatch.setattr(provider_module, "_health", {})
+
+
+def test_slow_first_token_is_hedged_and_the_loser_cancelled(monkeypatch):
+    """Past the primary's p95 TTFT the secondary is asked too; the first token wins."""
+    monkeypatch.setattr(provider_module, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(provider_module, "LLM_HEDGE_MIN_SECONDS", 0.01)
+    primary, secondary = StubLLM(ttft=0.02), StubLLM(tokens=("fall", "back"), ttft=0.01)
+    router = RoutedProvider({"primary": primary, "secondary": secondary})
+
+    # Normal latency: answered by the primary, and its p95 becomes the deadline
+    for _ in range(5):
+        assert asyncio.run(router.agenerate("q")) == "pong"
+    deadline = provider_health("primary").hedge_deadline()
+    assert 0.02 <= deadline < 0.1
+    assert secondary.calls == 0
+
+    primary.ttft = 2.0
+    start = time.monotonic()
+    assert asyncio.run(router.agenerate("q")) == "fallback"
+    assert time.monotonic() - start < 0.5
+    assert primary.cancelled == 1 and secondary.cancelled == 0
+    assert router.stats() == {"providers": ["primary", "secondary"], "hedges": 1, "hedge_wins": 1, "failovers": 0}
+    # The loser's wait counts as a (lower bound) TTFT sample; no error recorded
+    assert provider_health("primary").stats()["error_rate"] == 0.0
+    assert max(provider_health("primary").ttfts) >= deadline
+
+
+def test_errors_fail_over_and_trip_the_breaker(monkeypatch):
+    """Failures before the first token go to the next provider; repeated ones open the breaker."""
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_COOLDOWN_SECONDS", 60)
+    primary, secondary = StubLLM(fail=True), StubLLM(tokens=("fall", "back"))
+    router = RoutedProvider({"primary": primary, "secondary": secondary})
+
+    results = [asyncio.run(router.agenerate("q")) for _ in range(3)]
+    assert results == ["fallback"] * 3
+    assert primary.calls == 2  # the breaker opened after two failures
+    assert router.failovers == 2
+    stats = provider_health("primary").stats()
+    assert stats["state"] == "open" and stats["error_rate"] == 1.0
+
+    # After the cooldown requests are let through again; a success closes the breaker
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_COOLDOWN_SECONDS", 0)
+    primary.fail = False
+    assert provider_health("primary").state() == "half_open"
+    assert asyncio.run(router.agenerate("q")) == "pong"
+    assert provider_health("primary").state() == "closed"
+
+
+def test_errors_after_the_first_token_are_not_replayed():
+    """Once tokens were sent, a failing stream raises instead of switching provider."""
+
+    class BrokenMidStream(StubLLM):
+        async def agenerate_stream(self, prompt):
+            yield "po"
+            raise ConnectionError("connection reset")
+
+    secondary = StubLLM()
+    router = RoutedProvider({"primary": BrokenMidStream(), "secondary": secondary})
+
+    async def consume():
+        return [token async for token in router.agenerate_stream("q")]
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert secondary.calls == 0
+    assert provider_health("primary").consecutive_failures == 1
+
+
+def test_routing_wraps_configured_fallbacks(monkeypatch):
+    """With LLM_ROUTING, get_llm_provider routes over the configured fallbacks that can be created."""
+    monkeypatch.setattr(provider_module, "LLM_PROVIDERS", {"a": StubLLM, "b": StubLLM, "c": UnconfiguredLLM})
+    monkeypatch.setattr(provider_module, "LLM_FALLBACK_PROVIDERS", ["a", "b", "c"])
+    monkeypatch.setattr(provider_module, "LLM_ROUTING", True)
+    monkeypatch.setattr(provider_module, "_providers", {})
+
+    router = get_llm_provider("b")
+    assert isinstance(router, RoutedProvider)
+    assert list(router.providers) == ["b", "a"]
+    assert router.providers["b"] is get_llm_provider("b", routed=False)
+    assert get_llm_provider("B") is router
+    assert not isinstance(get_llm_provider("b", model="other"), RoutedProvider)
+
+    # Sync callers outside the event loop (scripts) get the same routing
+    assert router.generate("q") == "pong"
+    assert provider_module.llm_routing_stats()["routes"]["b"]["providers"] == ["b", "a"]
+
+
+def test_half_open_breaker_lets_one_trial_through(monkeypatch):
+    """After the cooldown a single request probes the provider; a failed probe re-opens the breaker."""
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_FAILURES", 1)
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_COOLDOWN_SECONDS", 60)
+    primary, secondary = StubLLM(fail=True, ttft=0.05), StubLLM(tokens=("fall", "back"))
+    router = RoutedProvider({"primary": primary, "secondary": secondary})
+    health = provider_health("primary")
+
+    assert asyncio.run(router.agenerate("q")) == "fallback"
+    assert health.state() == "open" and primary.calls == 1
+
+    # Cooldown over: of two concurrent requests only one is the trial, the other goes straight on
+    health.opened_at -= 61
+    assert health.state() == "half_open"
+
+    async def concurrent():
+        return await asyncio.gather(router.agenerate("q"), router.agenerate("q"))
+
+    assert asyncio.run(concurrent()) == ["fallback", "fallback"]
+    assert primary.calls == 2 and secondary.calls == 3
+    assert health.state() == "open"
+
+    # The next trial succeeds and closes the breaker for everyone
+    health.opened_at -= 61
+    primary.fail = False
+    assert asyncio.run(concurrent()) == ["pong", "fallback"]
+    assert health.state() == "closed"
+    assert asyncio.run(router.agenerate("q")) == "pong"
+
+
+def test_hedge_skips_a_half_open_provider_whose_trial_is_taken(monkeypatch):
+    """A hedge target that went half-open with another request's trial in flight isn't sent a second trial."""
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_FAILURES", 1)
+    monkeypatch.setattr(provider_module, "LLM_BREAKER_COOLDOWN_SECONDS", 60)
+    monkeypatch.setattr(provider_module, "LLM_HEDGE_INITIAL_SECONDS", 0.01)
+    primary, secondary = StubLLM(ttft=0.1), StubLLM(tokens=("fall", "back"))
+    router = RoutedProvider({"primary": primary, "secondary": secondary})
+    health = provider_health("secondary")
+    health.opened_at = time.monotonic() - 61
+    assert health.available()
+
+    async def run():
+        request = asyncio.ensure_future(router.agenerate("q"))
+        await asyncio.sleep(0)  # the request has queued the secondary as its hedge
+        trial = health.admit()  # ...when another request takes its trial
+        return await request, trial
+
+    answer, trial = asyncio.run(run())
+    assert answer == "pong"
+    assert secondary.calls == 0 and router.hedges == 0
+    # Only the trial's own token ends it
+    health.release(object())
+    assert health.probe is trial and not health.available()
+    health.record_failure(trial)
+    assert health.probe is None and health.state() == "open"
@@ -0,0 +1,32 @@
+"""
+Tests for PDF page extraction (serial and multi-process).
+"""
+from app.ingest.pdf import extract_text_from_pdf, iter_pdf_pages
+from scripts.bench_pdf_extract import make_pdf
+
+
+def test_parallel_extraction_matches_serial(tmp_path):
+    """Pages extracted across worker processes come back complete and in order."""
+    path = str(tmp_path / "manual.pdf")
+    make_pdf(path, pages=40, lines_per_page=5)
+
+    serial = list(iter_pdf_pages(path, workers=1))
+    parallel = list(iter_pdf_pages(path, workers=2, min_parallel_pages=1))
+
+    assert len(serial) == 40
+    assert parallel == serial
+    assert [page.split()[:2] for page in parallel[:3]] == [["Page", "1"], ["Page", "2"], ["Page", "3"]]
+
+
+def test_small_file_object_extracts_serially(tmp_path):
+    """File objects and short documents use in-process extraction."""
+    path = tmp_path / "short.pdf"
+    make_pdf(str(path), pages=3, lines_per_page=2)
+
+    progress = []
+    with open(path, "rb") as f:
+        pages = list(iter_pdf_pages(f, on_page=lambda done, total: progress.append((done, total))))
+
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    with open(path, "rb") as f:
+        assert extract_text_from_pdf(f) == "".join(pages)
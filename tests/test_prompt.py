@@ -0,0 +1,79 @@
+"""
+Tests for token-budgeted, MMR-diversified prompt context.
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api import chat
+from app.core.usage import approx_tokens_from_chars
+from app.rag.prompt import assemble_prompt, select_context
+from app.rag.retrieve import RetrievedChunk
+from app.rag.vector_store import SearchHit
+
+client = TestClient(app)
+
+
+def _chunk(id, score, vector, text=None):
+    return RetrievedChunk(id=id, text=text or f"passage {id}", score=score, vector=np.array(vector, dtype=np.float32))
+
+
+def test_mmr_drops_repeated_passages():
+    """A near-copy of a picked chunk is skipped in favour of a different, less relevant one."""
+    chunks = [
+        _chunk("a", 0.90, [1.0, 0.0, 0.0]),
+        _chunk("a-overlap", 0.89, [0.99, 0.1, 0.0]),
+        _chunk("b", 0.70, [0.0, 1.0, 0.0]),
+        _chunk("c", 0.60, [0.0, 0.0, 1.0]),
+    ]
+    picked = select_context(chunks, budget_tokens=1000, max_chunks=3)
+    assert [c.id for c in picked] == ["a", "b", "c"]
+
+    relevance_only = select_context(chunks, budget_tokens=1000, max_chunks=3, mmr_lambda=1.0, duplicate_threshold=1.1)
+    assert [c.id for c in relevance_only] == ["a", "a-overlap", "b"]
+
+
+def test_budget_skips_chunks_that_do_not_fit():
+    """Chunks over the remaining budget are skipped; shorter ones later in the ranking still fit."""
+    chunks = [
+        _chunk("long-1", 0.9, [1, 0, 0, 0], "x" * 400),
+        _chunk("long-2", 0.8, [0, 1, 0, 0], "y" * 400),
+        _chunk("short", 0.7, [0, 0, 1, 0], "z" * 40),
+    ]
+    picked = select_context(chunks, budget_tokens=120, max_chunks=3)
+    assert [c.id for c in picked] == ["long-1", "short"]
+
+
+def test_best_chunk_is_trimmed_to_the_budget():
+    """When nothing fits, the most relevant chunk is cut at a word boundary."""
+    chunks = [_chunk("big", 0.9, [1, 0], "word " * 200)]
+    picked = select_context(chunks, budget_tokens=50)
+    assert len(picked[0].text) <= 200
+    assert not picked[0].text.endswith(" wo")
+
+    prompt = assemble_prompt(chunks, "what?", budget_tokens=50)
+    assert prompt.tokens == approx_tokens_from_chars(len(prompt.text))
+    assert prompt.chunks == picked
+
+
+REPEATED_HITS = [
+    SearchHit(id="1", score=0.9, payload={"text": "We open at 9am."}, vector=[1.0, 0.0]),
+    SearchHit(id="2", score=0.9, payload={"text": "We open at 9am!"}, vector=[1.0, 0.01]),
+    SearchHit(id="3", score=0.5, payload={"text": "Refunds take 5 days."}, vector=[0.0, 1.0]),
+]
+
+
+@pytest.mark.parametrize("fake_store", [{"hits": REPEATED_HITS}], indirect=True)
+def test_chat_sends_deduplicated_context_and_reports_tokens(api_key, fake_llm, fake_store):
+    """/chat over-fetches, keeps one copy of a repeated passage and returns X-Prompt-Tokens."""
+    raw_key, _ = api_key
+    prompts, limits = fake_llm.prompts, fake_store.limits
+
+    response = client.post("/chat", json={"query": "when do you open?"}, headers={"Authorization": f"Bearer {raw_key}"})
+    assert response.status_code == 200
+    assert limits == [chat.CONTEXT_CANDIDATES]
+    assert "We open at 9am." in prompts[0]
+    assert "We open at 9am!" not in prompts[0]
+    assert "Refunds take 5 days." in prompts[0]
+    assert int(response.headers["X-Prompt-Tokens"]) == approx_tokens_from_chars(len(prompts[0]))
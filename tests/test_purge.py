@@ -0,0 +1,192 @@
+"""
+Tests for deferred vector deletion: tombstones, the batched purger and reconciliation.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.deps import get_current_user
+from app.db.base import SessionLocal
+from app.db.models import APIKey, Document, User, VectorPurge
+from app.rag import purge, vector_store
+from app.rag.local_store import LocalVectorStore
+from app.rag.retrieve import retrieve_chunks, with_texts
+from app.rag.vector_store import VectorPoint
+
+client = TestClient(app)
+DIM = 8
+
+
+class FlakyStore(LocalVectorStore):
+    """A local store whose deletes fail while `down` is set, and are recorded."""
+
+    def __init__(self, root):
+        super().__init__(root=root)
+        self.down = False
+        self.deletes = []
+
+    def delete_documents(self, api_key_id, document_ids):
+        if self.down:
+            raise ConnectionError("vector store unavailable")
+        self.deletes.append((api_key_id, list(document_ids)))
+        super().delete_documents(api_key_id, document_ids)
+
+    def delete_api_key(self, api_key_id):
+        if self.down:
+            raise ConnectionError("vector store unavailable")
+        self.deletes.append((api_key_id, None))
+        super().delete_api_key(api_key_id)
+
+
+@pytest.fixture
+def tenant(api_key, monkeypatch, tmp_path):
+    """An API key on a flaky local store, with two documents of legacy (payload text) points."""
+    _, api_key_id = api_key
+    store = FlakyStore(str(tmp_path))
+    monkeypatch.setattr(vector_store, "_stores", {"local": store})
+    monkeypatch.setattr("app.rag.retrieve._cache", None)
+
+    db = SessionLocal()
+    db.query(VectorPurge).delete()  # left by other tests
+    key = db.query(APIKey).filter(APIKey.id == api_key_id).first()
+    key.vector_backend = "local"
+    documents = [
+        Document(api_key_id=api_key_id, filename=f"{name}.pdf", file_hash=uuid.uuid4().hex, char_count=10, chunk_count=2)
+        for name in ("a", "b")
+    ]
+    db.add_all(documents)
+    db.commit()
+    document_ids = [document.id for document in documents]
+    user = db.query(User).filter(User.id == key.user_id).first()
+    db.expunge(user)
+    db.close()
+
+    rng = np.random.default_rng(0)
+    store.upsert(api_key_id, [
+        VectorPoint(id=str(uuid.uuid4()), vector=rng.normal(size=DIM).tolist(), payload={"document_id": d, "text": f"doc {d} part {i}"})
+        for d in document_ids for i in range(2)
+    ])
+
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield api_key_id, document_ids, store
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def _due(db, api_key_id):
+    return db.query(VectorPurge).filter(VectorPurge.api_key_id == api_key_id).all()
+
+
+def _document_ids(chunks):
+    return {chunk.document_id for chunk in chunks}
+
+
+def test_delete_hides_document_at_once_and_survives_store_outage(tenant):
+    """DELETE succeeds with the vector store down; the purge retries with backoff, then completes."""
+    api_key_id, (doc_a, doc_b), store = tenant
+    store.down = True
+
+    response = client.delete(f"/documents/{doc_a}", headers={"Authorization": "Bearer x"})
+    assert response.status_code == 200
+
+    candidates = retrieve_chunks("q", api_key_id, limit=4, query_vector=[1.0] * DIM, store=store)
+    assert _document_ids(candidates) == {doc_a, doc_b}  # vectors still stored...
+    assert _document_ids(with_texts(candidates)) == {doc_b}  # ...but never served
+
+    assert purge.purge_pending() == 0
+    db = SessionLocal()
+    [queued] = _due(db, api_key_id)
+    assert queued.attempts == 1
+    assert "unavailable" in queued.last_error
+    assert queued.next_attempt_at > datetime.utcnow()
+    assert purge.purge_pending() == 0  # not due yet
+
+    store.down = False
+    queued.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert purge.purge_pending() == 1
+    assert _due(db, api_key_id) == []
+    db.close()
+    assert store.deletes == [(api_key_id, [doc_a])]
+    assert store.count(api_key_id) == 2
+
+
+def test_purges_are_batched_per_tenant(tenant):
+    """Several deleted documents of one key are purged with a single delete."""
+    api_key_id, document_ids, store = tenant
+    for document_id in document_ids:
+        assert client.delete(f"/documents/{document_id}", headers={"Authorization": "Bearer x"}).status_code == 200
+
+    assert purge.purge_pending() == 2
+    assert store.deletes == [(api_key_id, sorted(document_ids))]
+    assert store.count(api_key_id) == 0
+
+
+def test_admin_user_delete_purges_vectors(tenant, monkeypatch):
+    """Deleting a user removes their keys and documents, and their vectors via the purger."""
+    api_key_id, _, store = tenant
+    monkeypatch.setattr("app.api.admin.is_admin", lambda user: True)
+    db = SessionLocal()
+    user_id = db.query(APIKey.user_id).filter(APIKey.id == api_key_id).scalar()
+    db.close()
+
+    response = client.delete(f"/admin/users/{user_id}", headers={"Authorization": "Bearer x"})
+    assert response.status_code == 200
+    assert response.json()["api_keys_deleted"] == 1
+
+    db = SessionLocal()
+    assert db.query(APIKey).filter(APIKey.id == api_key_id).count() == 0
+    assert db.query(Document).filter(Document.api_key_id == api_key_id).count() == 0
+    db.close()
+
+    assert purge.purge_pending() == 1
+    assert store.deletes == [(api_key_id, None)]
+    assert store.count(api_key_id) == 0
+
+
+def test_reconcile_queues_orphaned_vectors(tenant):
+    """Vectors of documents (or keys) deleted without a purge are found and queued once."""
+    api_key_id, (doc_a, doc_b), store = tenant
+    db = SessionLocal()
+    db.query(Document).filter(Document.id == doc_a).delete()
+    db.commit()
+    db.close()
+    store.upsert(10**6, [VectorPoint(id=str(uuid.uuid4()), vector=[1.0] * DIM, payload={"document_id": 1})])
+
+    assert purge.reconcile("local", dry_run=True) == {api_key_id: [doc_a], 10**6: None}
+    assert purge.reconcile("local") == {api_key_id: [doc_a], 10**6: None}
+    assert purge.reconcile("local") == {}
+
+    assert purge.purge_pending() == 2
+    assert store.count(10**6) == 0
+    assert _document_ids(retrieve_chunks("q", api_key_id, limit=4, query_vector=[1.0] * DIM, store=store)) == {doc_b}
+
+
+def test_pending_purge_never_hits_a_reuploaded_document(tenant):
+    """A document uploaded after a delete gets a fresh id, so the queued purge leaves its vectors alone."""
+    api_key_id, (doc_a, doc_b), store = tenant
+    store.down = True
+    assert client.delete(f"/documents/{doc_b}", headers={"Authorization": "Bearer x"}).status_code == 200
+
+    db = SessionLocal()
+    document = Document(api_key_id=api_key_id, filename="b.pdf", file_hash=uuid.uuid4().hex, char_count=10, chunk_count=1)
+    db.add(document)
+    db.commit()
+    new_id = document.id
+    assert new_id > doc_b
+    store.upsert(api_key_id, [
+        VectorPoint(id=str(uuid.uuid4()), vector=[1.0] * DIM, payload={"document_id": new_id, "text": "new b"})
+    ])
+
+    store.down = False
+    for queued in _due(db, api_key_id):
+        queued.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert purge.purge_pending() == 1
+    db.close()
+    assert store.deletes == [(api_key_id, [doc_b])]
+    candidates = retrieve_chunks("q", api_key_id, limit=8, query_vector=[1.0] * DIM, store=store)
+    assert _document_ids(candidates) == {doc_a, new_id}
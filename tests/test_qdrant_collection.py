@@ -0,0 +1,139 @@
+"""
+Tests for Qdrant collection profiles and the idempotent apply step.
+
+The embedded Qdrant ignores HNSW, quantization and payload index settings,
+so a small fake client keeps the collection config the way a server reports it.
+"""
+from types import SimpleNamespace
+
+import pytest
+from qdrant_client.models import Disabled, Distance, HnswConfigDiff, VectorParams
+
+from app.db.qdrant_collection import apply_profile, get_profile, search_params
+from app.rag.qdrant_store import QdrantVectorStore
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.collections = {}
+        self.calls = []
+
+    def collection_exists(self, name):
+        return name in self.collections
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+    def create_collection(self, collection_name, vectors_config, hnsw_config, quantization_config, on_disk_payload):
+        self.calls.append("create_collection")
+        self.collections[collection_name] = SimpleNamespace(
+            config=SimpleNamespace(
+                params=SimpleNamespace(vectors=vectors_config, on_disk_payload=on_disk_payload),
+                hnsw_config=hnsw_config,
+                quantization_config=quantization_config,
+            ),
+            payload_schema={},
+        )
+
+    def update_collection(self, name, hnsw_config=None, quantization_config=None, vectors_config=None, collection_params=None):
+        self.calls.append("update_collection")
+        config = self.collections[name].config
+        if hnsw_config is not None:
+            config.hnsw_config = hnsw_config
+        if quantization_config is not None:
+            config.quantization_config = None if quantization_config == Disabled.DISABLED else quantization_config
+        if vectors_config is not None:
+            config.params.vectors = config.params.vectors.model_copy(update={"on_disk": vectors_config[""].on_disk})
+        if collection_params is not None:
+            config.params.on_disk_payload = collection_params.on_disk_payload
+
+    def create_payload_index(self, name, field_name, field_schema):
+        self.calls.append("create_payload_index")
+        self.collections[name].payload_schema[field_name] = SimpleNamespace(data_type="integer", params=field_schema)
+
+    def delete_payload_index(self, name, field_name):
+        self.calls.append("delete_payload_index")
+        del self.collections[name].payload_schema[field_name]
+
+
+def test_apply_creates_collection_then_is_idempotent():
+    client = FakeQdrant()
+
+    changes = apply_profile(client, get_profile("default"))
+    assert changes[0] == "create collection chatbot_docs (default)"
+    assert len(changes) == 3  # collection + api_key_id and document_id indexes
+
+    client.calls.clear()
+    assert apply_profile(client, get_profile("default")) == []
+    assert client.calls == []
+
+
+def test_apply_migrates_between_profiles():
+    client = FakeQdrant()
+    apply_profile(client, get_profile("default"))
+
+    changes = apply_profile(client, get_profile("int8"))
+    assert changes == [
+        "hnsw m=0 payload_m=16 ef_construct=100",
+        "quantization int8",
+        "vectors on_disk=True",
+        "payload on_disk=True",
+    ]
+    config = client.get_collection("chatbot_docs").config
+    assert config.params.vectors.on_disk is True
+    assert config.quantization_config.scalar.always_ram is True
+    assert apply_profile(client, get_profile("int8")) == []
+
+    changes = apply_profile(client, get_profile("default"))
+    assert "quantization off" in changes
+    assert client.get_collection("chatbot_docs").config.quantization_config is None
+
+
+def test_apply_dry_run_changes_nothing():
+    client = FakeQdrant()
+    changes = apply_profile(client, get_profile("binary"), dry_run=True)
+    assert changes[0] == "create collection chatbot_docs (binary)"
+    assert client.calls == []
+
+
+def test_legacy_payload_indexes_are_replaced():
+    client = FakeQdrant()
+    client.create_collection(
+        "chatbot_docs",
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+        hnsw_config=HnswConfigDiff(m=16, ef_construct=100),
+        quantization_config=None,
+        on_disk_payload=None,
+    )
+    for field in ("api_key_id", "document_id"):
+        client.collections["chatbot_docs"].payload_schema[field] = SimpleNamespace(data_type="integer", params=None)
+
+    changes = apply_profile(client, get_profile("default"))
+    assert changes == [
+        "drop index api_key_id (integer)",
+        "index api_key_id (integer, lookup only)",
+        "drop index document_id (integer)",
+        "index document_id (integer, lookup only)",
+    ]
+    assert apply_profile(client, get_profile("default")) == []
+
+
+def test_apply_refuses_incompatible_vectors():
+    client = FakeQdrant()
+    apply_profile(client, get_profile("default"), vector_size=768)
+    with pytest.raises(ValueError, match="768-d"):
+        apply_profile(client, get_profile("default"))
+
+
+def test_quantized_profiles_rescore_searches():
+    assert search_params(get_profile("default")) is None
+    assert search_params(get_profile("recall")).hnsw_ef == 128
+
+    params = search_params(get_profile("binary"))
+    assert params.quantization.rescore is True
+    assert params.quantization.oversampling == 4.0
+
+    captured = {}
+    client = SimpleNamespace(query_points=lambda **kwargs: captured.update(kwargs) or SimpleNamespace(points=[]))
+    QdrantVectorStore(client, "test", profile=get_profile("int8")).search(1, [0.0] * 4, 3)
+    assert captured["search_params"].quantization.oversampling == 2.0
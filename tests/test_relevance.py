@@ -0,0 +1,112 @@
+"""
+Tests for the per-key minimum retrieval score and the no-LLM fallback answer.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api import chat
+from app.db.base import SessionLocal
+from app.db.models import APIKey
+from app.rag.vector_store import SearchHit
+
+client = TestClient(app)
+
+HITS = [
+    SearchHit(id="1", score=0.42, payload={"text": "Our office dog is called Biscuit."}),
+    SearchHit(id="2", score=0.31, payload={"text": "Parking is behind the building."}),
+]
+
+
+@pytest.fixture
+def relevance_env(api_key, fake_llm, fake_store):
+    """Fake store returning weak hits, an LLM that records prompts, fresh counters."""
+    fake_store.hits = HITS
+    fake_llm.answer = "Biscuit"
+    return api_key, fake_llm.prompts
+
+
+def _set_min_score(api_key_id, score):
+    db = SessionLocal()
+    db.query(APIKey).filter(APIKey.id == api_key_id).update({"min_retrieval_score": score})
+    db.commit()
+    db.close()
+
+
+def test_weak_hits_get_the_fallback_without_an_llm_call(relevance_env, chat_tokens):
+    """Below the key's minimum score, /chat answers with the fallback, uncharged."""
+    (raw_key, api_key_id), prompts = relevance_env
+    headers = {"Authorization": f"Bearer {raw_key}"}
+    _set_min_score(api_key_id, 0.5)
+
+    response = client.post("/chat", json={"query": "what is the dog called?"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"answer": chat.CHAT_FALLBACK_ANSWER, "cached": False, "fallback": True}
+    assert prompts == []
+    assert chat_tokens(api_key_id) == 0
+
+    _set_min_score(api_key_id, 0.4)
+    response = client.post("/chat", json={"query": "what is the dog called?"}, headers=headers)
+    assert response.json()["answer"] == "Biscuit"
+    assert "Biscuit." in prompts[0] and "Parking" not in prompts[0]
+
+    assert chat.get_llm_call_counters().stats() == {
+        "calls": 1,
+        "avoided": 1,
+        "avoided_semantic_cache": 0,
+        "avoided_no_relevant_context": 1,
+        "avoided_coalesced": 0,
+        "avoided_rate": 0.5,
+    }
+
+
+def test_stream_fallback(relevance_env, chat_tokens):
+    """/chat/stream streams the fallback and flags it in a header."""
+    (raw_key, api_key_id), prompts = relevance_env
+    _set_min_score(api_key_id, 0.9)
+
+    response = client.post("/chat/stream", json={"query": "dog?"}, headers={"Authorization": f"Bearer {raw_key}"})
+    assert response.status_code == 200
+    assert response.headers["X-Fallback-Answer"] == "true"
+    pieces = [line[len("data: "):] for line in response.text.split("\n\n") if line.startswith("data: ")]
+    assert pieces[-1] == "[DONE]"
+    assert "".join(pieces[:-1]) == chat.CHAT_FALLBACK_ANSWER
+    assert prompts == []
+    assert chat_tokens(api_key_id) == 0
+
+
+def test_server_default_applies_without_a_key_setting(relevance_env, monkeypatch):
+    """Keys without their own cut-off use RETRIEVAL_MIN_SCORE; batch items fall back per question."""
+    (raw_key, _), prompts = relevance_env
+    monkeypatch.setattr(chat, "RETRIEVAL_MIN_SCORE", 0.45)
+
+    response = client.post("/chat/batch", json={"queries": ["dog?", "parking?"]}, headers={"Authorization": f"Bearer {raw_key}"})
+    results = response.json()["results"]
+    assert [r["fallback"] for r in results] == [True, True]
+    assert [r["answer"] for r in results] == [chat.CHAT_FALLBACK_ANSWER] * 2
+    assert prompts == []
+    assert chat.get_llm_call_counters().stats()["avoided_no_relevant_context"] == 2
+
+
+def test_fallback_when_no_relevant_chunk_is_still_stored(relevance_env, chat_tokens, monkeypatch):
+    """Hits whose documents were deleted meanwhile leave an empty prompt: every endpoint falls back."""
+    (raw_key, api_key_id), prompts = relevance_env
+    _set_min_score(api_key_id, 0.0)
+
+    async def awith_texts(chunks):
+        return []
+
+    monkeypatch.setattr("app.rag.prompt.with_texts", lambda chunks: [])
+    monkeypatch.setattr("app.rag.prompt.awith_texts", awith_texts)
+    headers = {"Authorization": f"Bearer {raw_key}"}
+
+    assert client.post("/chat", json={"query": "dog?"}, headers=headers).json()["fallback"] is True
+    response = client.post("/chat/stream", json={"query": "dog?"}, headers=headers)
+    assert response.headers["X-Fallback-Answer"] == "true"
+    assert chat.CHAT_FALLBACK_ANSWER.split()[0] in response.text
+    results = client.post("/chat/batch", json={"queries": ["dog?"]}, headers=headers).json()["results"]
+    assert results[0]["fallback"] is True and results[0]["answer"] == chat.CHAT_FALLBACK_ANSWER
+
+    assert prompts == []
+    assert chat_tokens(api_key_id) == 0
+    assert chat.get_llm_call_counters().stats()["avoided_no_relevant_context"] == 3
@@ -0,0 +1,81 @@
+"""
+Tests for the per-tenant retrieval result cache.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.rag import retrieve
+from app.rag.retrieval_cache import RetrievalCache
+from app.rag.vector_store import SearchHit
+
+
+def test_hits_are_per_key_query_and_limit():
+    """Results are shared across whitespace variants but not across keys or limits."""
+    cache = RetrievalCache(max_items=10, ttl_seconds=60)
+    cache.put(1, "opening hours", 3, ["a", "b"], generation=0)
+
+    assert cache.get(1, "  opening   hours ", 3) == ["a", "b"]
+    assert cache.get(2, "opening hours", 3) is None
+    assert cache.get(1, "opening hours", 5) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_bump_invalidates_only_that_key():
+    """A generation bump hides the key's old entries and ignores results computed before it."""
+    cache = RetrievalCache(max_items=10, ttl_seconds=60)
+    cache.put(1, "q", 3, ["old"], generation=0)
+    cache.put(2, "q", 3, ["other"], generation=0)
+
+    before = cache.generation(1)
+    cache.bump(1)
+    assert cache.get(1, "q", 3) is None
+    assert cache.get(2, "q", 3) == ["other"]
+
+    cache.put(1, "q", 3, ["stale"], generation=before)  # raced with the bump
+    assert cache.get(1, "q", 3) is None
+
+
+def test_ttl_and_lru_bounds(monkeypatch):
+    """Entries expire after the TTL and the least recently used entry is evicted first."""
+    now = [1000.0]
+    monkeypatch.setattr("app.rag.retrieval_cache.time.monotonic", lambda: now[0])
+    cache = RetrievalCache(max_items=2, ttl_seconds=30)
+
+    cache.put(1, "a", 3, ["a"], 0)
+    cache.put(1, "b", 3, ["b"], 0)
+    cache.get(1, "a", 3)
+    cache.put(1, "c", 3, ["c"], 0)  # evicts b
+    assert cache.get(1, "b", 3) is None
+
+    now[0] += 31
+    assert cache.get(1, "a", 3) is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expired"] == 1
+
+
+@pytest.fixture
+def counting_store(monkeypatch):
+    calls = []
+
+    def search(api_key_id, vector, limit):
+        calls.append(api_key_id)
+        return [SearchHit(id="1", score=0.9, payload={"text": f"chunk {len(calls)}"})]
+
+    monkeypatch.setattr(retrieve, "_cache", RetrievalCache(max_items=10, ttl_seconds=60))
+    monkeypatch.setattr(retrieve, "embed_query", lambda text: [0.0])
+    monkeypatch.setattr(retrieve, "vector_store_for_id", lambda api_key_id: SimpleNamespace(search=search))
+    return calls
+
+
+def test_retrieve_text_uses_cache_until_invalidated(counting_store):
+    """Repeated questions skip embedding and search until the key's documents change."""
+    assert retrieve.retrieve_text("refund policy?", api_key_id=7) == ["chunk 1"]
+    assert retrieve.retrieve_text("refund  policy?", api_key_id=7) == ["chunk 1"]
+    assert len(counting_store) == 1
+
+    retrieve.invalidate_caches(7)
+    assert retrieve.retrieve_text("refund policy?", api_key_id=7) == ["chunk 2"]
+    assert len(counting_store) == 2
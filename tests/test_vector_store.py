@@ -0,0 +1,202 @@
+"""
+Tests for the VectorStore backends and size-based tenant routing.
+"""
+import os
+import uuid
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance
+
+from app.db.base import SessionLocal
+from app.db.models import APIKey, Document, IngestJob
+from app.rag import vector_store
+from app.rag.local_store import LocalVectorStore
+from app.rag.qdrant_store import QdrantVectorStore
+from app.rag.vector_store import VectorPoint
+
+DIM = 16
+
+
+def _qdrant_memory_store() -> QdrantVectorStore:
+    client = QdrantClient(":memory:")
+    client.create_collection("test", vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+    return QdrantVectorStore(client, "test")
+
+
+def _points(n: int, document_id: int = 1, seed: int = 0) -> list[VectorPoint]:
+    rng = np.random.default_rng(seed)
+    return [
+        VectorPoint(id=str(uuid.uuid4()), vector=rng.normal(size=DIM).tolist(), payload={"document_id": document_id, "text": f"d{document_id}-{i}"})
+        for i in range(n)
+    ]
+
+
+@pytest.fixture(params=["local", "local-float16", "qdrant"])
+def store(request, tmp_path):
+    if request.param == "qdrant":
+        return _qdrant_memory_store()
+    dtype = "float16" if request.param == "local-float16" else "float32"
+    return LocalVectorStore(root=str(tmp_path), dtype=dtype)
+
+
+def test_search_matches_brute_force_cosine(store):
+    """Results are the true top-k by cosine similarity, best first, and isolated per key."""
+    points = _points(200)
+    store.upsert(1, points)
+    store.upsert(2, _points(50, seed=1))
+    query = np.random.default_rng(9).normal(size=DIM)
+
+    matrix = np.array([p.vector for p in points])
+    cosine = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    expected = [points[i].id for i in np.argsort(-cosine)[:5]]
+
+    hits = store.search(1, query.tolist(), limit=5)
+    assert [hit.id for hit in hits] == expected
+    assert hits[0].score == pytest.approx(cosine.max(), abs=1e-2)
+    assert all(hit.payload["api_key_id"] == 1 for hit in hits)
+    assert store.count(1) == 200
+    assert store.count(2) == 50
+
+
+def test_search_batch_matches_single_searches(store):
+    """One batched call returns the same hits as one search per query."""
+    store.upsert(1, _points(100))
+    queries = np.random.default_rng(4).normal(size=(4, DIM)).tolist()
+
+    batched = store.search_batch(1, queries, limit=3)
+    assert [[h.id for h in hits] for hits in batched] == [[h.id for h in store.search(1, q, 3)] for q in queries]
+    assert store.search_batch(2, queries[:2], limit=3) == [[], []]
+
+
+def test_delete_document_and_api_key(store):
+    """Deletes remove exactly the targeted points."""
+    store.upsert(1, _points(10, document_id=1) + _points(5, document_id=2, seed=1))
+    store.upsert(2, _points(3, seed=2))
+
+    store.delete_document(1, 1)
+    assert store.count(1) == 5
+    assert {hit.payload["document_id"] for hit in store.search(1, [1.0] * DIM, limit=20)} == {2}
+
+    store.delete_api_key(1)
+    assert store.count(1) == 0
+    assert store.search(1, [1.0] * DIM, limit=3) == []
+    assert store.count(2) == 3
+
+
+def test_export_round_trips_between_backends(store, tmp_path):
+    """Exported points (with vectors) can be loaded into another backend unchanged."""
+    points = _points(300)
+    store.upsert(1, points)
+
+    target = LocalVectorStore(root=str(tmp_path / "copy"))
+    assert vector_store.migrate_tenant(1, store, target) == 300
+
+    query = np.random.default_rng(3).normal(size=DIM).tolist()
+    assert [h.id for h in target.search(1, query, 10)] == [h.id for h in store.search(1, query, 10)]
+
+
+def test_local_store_is_shared_across_instances(tmp_path):
+    """A second instance (another worker process) sees writes made by the first."""
+    writer = LocalVectorStore(root=str(tmp_path))
+    reader = LocalVectorStore(root=str(tmp_path))
+    writer.upsert(1, _points(5))
+    assert reader.count(1) == 5
+
+    writer.upsert(1, _points(5, seed=1))
+    assert reader.count(1) == 10
+
+
+def test_set_document_repoints_only_the_given_points(store):
+    """Handed-over points move to the new document; a delete of the old one leaves them."""
+    points = _points(6, document_id=1)
+    store.upsert(1, points)
+    store.set_document(1, [p.id for p in points[:2]], 2)
+
+    store.delete_document(1, 1)
+    hits = store.search(1, [1.0] * DIM, limit=10)
+    assert sorted(hit.id for hit in hits) == sorted(p.id for p in points[:2])
+    assert {hit.payload["document_id"] for hit in hits} == {2}
+
+
+def test_local_store_appends_segments_and_compacts_on_delete(tmp_path):
+    """Batch upserts add a few merged segments instead of rewriting the tenant; a delete compacts."""
+    writer = LocalVectorStore(root=str(tmp_path))
+    reader = LocalVectorStore(root=str(tmp_path))
+    batches = [_points(10, document_id=d, seed=d) for d in range(1, 12)]
+    for batch in batches:
+        writer.upsert(1, batch)
+        assert reader.count(1) == sum(len(b) for b in batches[:batches.index(batch) + 1])
+
+    segments = reader._load(1).segments
+    assert [len(segment.ids) for segment in segments] == [80, 20, 10]  # 11 batches, binary-counter merges
+    assert len([n for n in os.listdir(tmp_path / "1") if n.endswith(".npy")]) == 3
+
+    points = [p for batch in batches for p in batch]
+    query = np.random.default_rng(5).normal(size=DIM)
+    matrix = np.array([p.vector for p in points])
+    cosine = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    hits = reader.search(1, query.tolist(), limit=5)
+    assert [hit.id for hit in hits] == [points[i].id for i in np.argsort(-cosine)[:5]]
+    assert np.allclose(hits[0].vector, matrix[np.argmax(cosine)] / np.linalg.norm(matrix[np.argmax(cosine)]), atol=1e-6)
+
+    writer.delete_document(1, 3)
+    assert [len(segment.ids) for segment in reader._load(1).segments] == [100]
+    assert len([n for n in os.listdir(tmp_path / "1") if n.endswith(".npy")]) == 1
+
+
+def test_auto_routing_moves_growing_tenant_to_qdrant(api_key, tmp_path, monkeypatch):
+    """New tenants start local; one that outgrows the limit is moved to Qdrant with its vectors."""
+    _, api_key_id = api_key
+    local, qdrant = LocalVectorStore(root=str(tmp_path)), _qdrant_memory_store()
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "auto")
+    monkeypatch.setattr(vector_store, "LOCAL_VECTOR_MAX_CHUNKS", 100)
+    monkeypatch.setattr(vector_store, "_stores", {"local": local, "qdrant": qdrant})
+
+    db = SessionLocal()
+    key = db.query(APIKey).filter(APIKey.id == api_key_id).first()
+    assert vector_store.place_tenant(db, key) is local
+    assert key.vector_backend == "local"
+
+    local.upsert(api_key_id, _points(150))
+    db.add(Document(api_key_id=api_key_id, filename="a.pdf", file_hash="x", char_count=1, chunk_count=150))
+    db.commit()
+
+    assert vector_store.rebalance(db, key) == "qdrant"
+    assert key.vector_backend == "qdrant"
+    assert vector_store.vector_store_for(key) is qdrant
+    assert qdrant.count(api_key_id) == 150
+    assert local.count(api_key_id) == 0
+    db.close()
+
+
+def test_rebalance_waits_for_running_jobs_and_survives_cleanup_errors(api_key, tmp_path, monkeypatch):
+    """No move while another ingest job writes to the current backend; a failed source cleanup keeps the move."""
+    _, api_key_id = api_key
+
+    class UndeletableStore(LocalVectorStore):
+        def delete_api_key(self, api_key_id):
+            raise ConnectionError("backend unavailable")
+
+    local, qdrant = UndeletableStore(root=str(tmp_path)), _qdrant_memory_store()
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "auto")
+    monkeypatch.setattr(vector_store, "LOCAL_VECTOR_MAX_CHUNKS", 100)
+    monkeypatch.setattr(vector_store, "_stores", {"local": local, "qdrant": qdrant})
+
+    db = SessionLocal()
+    key = db.query(APIKey).filter(APIKey.id == api_key_id).first()
+    vector_store.place_tenant(db, key)
+    local.upsert(api_key_id, _points(150))
+    job = IngestJob(api_key_id=api_key_id, filename="b.pdf", status="running")
+    db.add_all([job, Document(api_key_id=api_key_id, filename="a.pdf", file_hash="x", char_count=1, chunk_count=150)])
+    db.commit()
+
+    assert vector_store.rebalance(db, key) is None
+    assert key.vector_backend == "local"
+
+    job.status = "completed"
+    db.commit()
+    assert vector_store.rebalance(db, key) == "qdrant"
+    assert qdrant.count(api_key_id) == 150
+    db.close()